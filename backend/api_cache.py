@@ -0,0 +1,127 @@
+"""
+说明：BilibiliApi 响应缓存
+
+用于变化很少的接口 (分区列表、uid -> 直播间号、用户信息、粉丝数等)，按 接口 + 参数 + 账户 缓存成功的响应 (code == 0)。
+每个接口有各自的有效期；标记为持久化的接口退出时保存到磁盘，下次启动时加载。
+同一个 key 同时只发起一个请求 (single-flight)，并发的调用方等待并共享这次请求的结果。
+返回值是缓存内容的副本，调用方可以随意修改。
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger("ApiCache")
+
+
+class ResponseCache:
+    def __init__(self, policies, path=None, wait_timeout=30):
+        """
+        :param policies: {接口名: (有效期秒数, 是否持久化)}，不在其中的接口不缓存
+        :param path: 持久化文件路径，None 表示不保存
+        :param wait_timeout: 等待其他线程正在进行的同一请求的最长时间 (秒)
+        """
+        self.policies = policies
+        self.path = path
+        self.wait_timeout = wait_timeout
+        self.lock = threading.Lock()
+        self._entries = {}  # key -> (过期时间 time.time(), 接口名, 账户, (success, res))
+        self._inflight = {}  # key -> Future
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(endpoint, params, account):
+        return f"{endpoint}|{account}|{json.dumps(params, sort_keys=True, ensure_ascii=False)}"
+
+    def get_or_fetch(self, endpoint, params, account, fetch, force=False):
+        """
+        返回缓存的 (success, res)，没有或已过期时调用 fetch() 获取
+        :param force: 忽略缓存重新获取 (已有相同请求在进行时仍等待它的结果)
+        """
+        policy = self.policies.get(endpoint)
+        if policy is None:
+            return fetch()
+        key = self.make_key(endpoint, params, account)
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry and not force and entry[0] > time.time():
+                self.stats["hits"] += 1
+                return copy.deepcopy(entry[3])
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(timeout=self.wait_timeout))
+            except Exception:
+                return fetch()
+
+        try:
+            result = fetch()
+        except Exception as e:
+            result = (False, {"code": -1, "msg": str(e)})
+        with self.lock:
+            success, res = result
+            if success and isinstance(res, dict) and res.get('code') == 0:
+                self._entries[key] = (time.time() + policy[0], endpoint, account, result)
+                self.dirty = self.dirty or policy[1]
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return copy.deepcopy(result)
+
+    def invalidate(self, endpoint=None, account=None):
+        """删除缓存：按接口和 / 或账户筛选，都为 None 时清空"""
+        with self.lock:
+            keys = [key for key, (_, ep, acc, _) in self._entries.items()
+                    if (endpoint is None or ep == endpoint) and (account is None or acc == account)]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self.stats["invalidations"] += len(keys)
+                self.dirty = True
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            with self.lock:
+                for key, (expires_at, endpoint, account, res) in data.items():
+                    policy = self.policies.get(endpoint)
+                    if policy and policy[1] and expires_at > now:
+                        self._entries[key] = (expires_at, endpoint, account, (True, res))
+            logger.info(f"Loaded {len(self._entries)} cached API responses")
+        except Exception as e:
+            logger.error(f"Load API cache failed: {e}")
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        try:
+            now = time.time()
+            with self.lock:
+                data = {key: [expires_at, endpoint, account, result[1]]
+                        for key, (expires_at, endpoint, account, result) in self._entries.items()
+                        if self.policies[endpoint][1] and expires_at > now}
+                self.dirty = False
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Save API cache failed: {e}")
+
+    def get_stats(self):
+        return dict(self.stats, size=len(self._entries), inflight=len(self._inflight))
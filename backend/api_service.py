@@ -1,14 +1,19 @@
+import os
 import logging
 import asyncio
 import threading
 from backend.bilibili_api import BilibiliApi
-from backend.config import Config
+from backend.config import Config, get_app_path
 from backend.state import SessionState
 from backend.services.window_service import WindowService
 from backend.services.user_service import UserService
 from backend.services.live_service import LiveService
 from backend.services.auth_service import AuthService
 from backend.services.danmu_service import DanmuService
+from backend.services.delivery_service import DeliveryService
+from backend.services.send_queue import DanmuSendQueue
+from backend.danmu_history import DanmuHistory
+from backend.danmu_export import ColumnarExporter, EXPORT_FORMATS
 
 logger = logging.getLogger("ApiService")
 
@@ -39,6 +44,45 @@ class ApiService:
         self.live_service = LiveService(self.api_client, self.config_manager, self.session_state)
         self.auth_service = AuthService(self.api_client, self.user_service, self.live_service, self.session_state)
         self.danmu_service = DanmuService(self.api_client, self.session_state)
+        self.danmu_service.set_decode_offload(
+            self.config_manager.data.get("danmu_decode_offload", "off"),
+            self.config_manager.data.get("danmu_offload_threshold", 32 * 1024)
+        )
+        self.danmu_service.interact_deduper.window = self.config_manager.data.get("danmu_dedup_window", 10.0)
+        self.danmu_service.gift_aggregator.window = self.config_manager.data.get("danmu_gift_window", 3.0)
+        self.danmu_service.face_cache.path = os.path.join(get_app_path(), "face_cache.json")
+        self.danmu_service.face_cache.load()
+        # 分区列表、直播间号等接口的响应缓存，退出时保存
+        self.api_client.cache.path = os.path.join(get_app_path(), "api_cache.json")
+        self.api_client.cache.load()
+        try:
+            self.danmu_service.keyword_filter.set_rules(self.config_manager.data.get("danmu_keyword_rules", {}))
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid keyword rules in config: {e}")
+        if self.config_manager.data.get("danmu_record", False):
+            self.danmu_service.record_dir = os.path.join(get_app_path(), "recordings")
+            self.danmu_service.record_compress = self.config_manager.data.get("danmu_record_compress", False)
+        # 弹幕事件经独立的推送线程按帧批量推送到前端，不占用弹幕事件循环
+        self.delivery_service = DeliveryService(
+            self.window_service,
+            max_queue=self.config_manager.data.get("danmu_queue_size", 2000),
+            overflow_policy=self.config_manager.data.get("danmu_overflow_policy", "drop_interact_first")
+        )
+        self.delivery_service.start()
+        # 弹幕面板 / 开播为当前账号监听的直播间：停止监听、下播、切换账号、退出登录时全部停止
+        # (切换账号后 session_state.room_id 已是新账号的直播间，只停止它会遗漏之前的)
+        self.panel_rooms = set()
+        # 弹幕历史记录 (SQLite)，独立的写入线程批量写入
+        self.danmu_history = None
+        if self.config_manager.data.get("danmu_history", True):
+            try:
+                self.danmu_history = DanmuHistory(os.path.join(get_app_path(), "danmu_history.db"))
+                self.danmu_history.start()
+            except Exception as e:
+                logger.error(f"Open danmu history failed: {e}")
+        # 弹幕事件导出为 Parquet / Arrow 文件 (需要 pyarrow)
+        self.danmu_exporter = None
+        self._set_danmu_export(self.config_manager.data.get("danmu_export"))
         
         # 设置弹幕回调
         self.danmu_service.set_callback(self._on_danmu_message)
@@ -55,6 +99,13 @@ class ApiService:
         self.loop_thread = threading.Thread(target=self._start_loop, args=(self.loop,), daemon=True)
         self.loop_thread.start()
 
+        # 弹幕发送队列 (令牌桶限流，频率过高时自动重试)，运行在弹幕事件循环上
+        self.send_queue = DanmuSendQueue(
+            self.danmu_service, self.loop,
+            rate=self.config_manager.data.get("danmu_send_rate", 1.0),
+            burst=self.config_manager.data.get("danmu_send_burst", 2)
+        )
+
     def _setup_logging(self):
         """配置日志处理器，将 INFO 及以上级别的日志转发到前端"""
         root_logger = logging.getLogger()
@@ -70,9 +121,27 @@ class ApiService:
 
     def _on_danmu_message(self, data):
         """处理弹幕消息回调，推送到前端"""
-        # 注意：这里可能在子线程中被调用，webview 的 evaluate_js 应该是线程安全的
-        # 前端挂载的函数名为 onDanmuMessage
-        self.window_service.send_to_frontend("onDanmuMessage", data)
+        # 在弹幕事件循环线程中被调用，这里只入队，不阻塞事件循环；
+        # 推送线程按帧通过前端挂载的 onDanmuBatch 一次性推送
+        self.delivery_service.push(data)
+        if self.danmu_history:
+            self.danmu_history.record(data)
+        if self.danmu_exporter:
+            self.danmu_exporter.record(data)
+
+    def _set_danmu_export(self, fmt):
+        """切换导出格式 (parquet / arrow)，为空时关闭导出"""
+        exporter, self.danmu_exporter = self.danmu_exporter, None
+        if exporter:
+            exporter.close()
+        if not fmt:
+            return True
+        try:
+            self.danmu_exporter = ColumnarExporter(os.path.join(get_app_path(), "exports"), fmt)
+            return True
+        except Exception as e:
+            logger.error(f"Enable danmu export failed: {e}")
+            return False
 
     # def _on_backend_log(self, msg):
     #     """处理后端日志回调，推送到前端"""
@@ -86,7 +155,19 @@ class ApiService:
         if self.session_state.is_live:
             self.live_service.stop_live()
 
-        asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
+        future = asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
+        try:
+            # 等待录制文件、头像缓存写入完成
+            future.result(timeout=3)
+        except Exception as e:
+            logger.error(f"Stop danmu service failed: {e}")
+        # 推送完剩余的事件 (如停止时结束的礼物连击) 后停止推送线程
+        self.delivery_service.stop()
+        if self.danmu_history:
+            self.danmu_history.close()
+        if self.danmu_exporter:
+            self.danmu_exporter.close()
+        self.api_client.close()
         return self.window_service.window_close(lambda: self.config_manager.save())
     def get_window_position(self): return self.window_service.get_window_position()
     def window_drag(self, target_x, target_y): return self.window_service.window_drag(target_x, target_y)
@@ -95,8 +176,17 @@ class ApiService:
     def load_saved_config(self): return self.user_service.load_saved_config()
     def refresh_current_user(self): return self.user_service.refresh_current_user()
     def get_account_list(self): return self.user_service.get_account_list()
-    def switch_account(self, uid): return self.user_service.switch_account(uid)
-    def logout(self, uid): return self.user_service.logout(uid)
+    def switch_account(self, uid):
+        res = self.user_service.switch_account(uid)
+        if res['code'] == 0:
+            self._stop_panel_rooms(include_current=False)
+        return res
+
+    def logout(self, uid):
+        res = self.user_service.logout(uid)
+        if res['code'] == 0:
+            self._stop_panel_rooms(include_current=False)
+        return res
 
     # --- Auth Proxy Methods ---
     def get_login_qrcode(self): return self.auth_service.get_login_qrcode()
@@ -104,10 +194,18 @@ class ApiService:
 
     # --- Live Proxy Methods ---
     def get_partitions(self): return self.live_service.get_partitions()
+    def prewarm_live(self): return self.live_service.prewarm()
     def update_title(self, title): return self.live_service.update_title(title)
     def update_area(self, p_name, s_name): return self.live_service.update_area(p_name, s_name)
     def start_live(self, p_name=None, s_name=None): 
         res = self.live_service.start_live(p_name, s_name)
+        if res['code'] == 0 and self.danmu_history:
+            # 每次开播为一个弹幕历史场次
+            user = self.config_manager.data.get("users", {}).get(str(self.config_manager.data.get("current_uid")), {})
+            self.danmu_history.start_session(int(self.session_state.room_id or 0), user.get("last_title", ""),
+                                             "-".join(self.session_state.current_area_names or []))
+        if res['code'] == 0 and self.danmu_exporter:
+            self.danmu_exporter.start_session(self.session_state.room_id)
         # if res['code'] == 0:
         #      # 开启直播成功后，连接弹幕
         #      room_id = self.session_state.room_id
@@ -118,7 +216,11 @@ class ApiService:
     def stop_live(self): 
         res = self.live_service.stop_live()
         if res['code'] == 0:
-            asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
+            self._stop_panel_rooms()
+        if res['code'] == 0 and self.danmu_history:
+            self.danmu_history.end_session()
+        if res['code'] == 0 and self.danmu_exporter:
+            self.danmu_exporter.end_session()
         return res
 
     # --- Danmu Methods ---
@@ -127,16 +229,160 @@ class ApiService:
         room_id = self.session_state.room_id
         if not room_id:
              return {"code": -1, "msg": "未获取到房间ID"}
+        self.panel_rooms.add(int(room_id))
         asyncio.run_coroutine_threadsafe(self.danmu_service.connect(room_id), self.loop)
         return {"code": 0}
 
     def stop_danmu_monitor(self):
-        asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
+        self._stop_panel_rooms()
         return {"code": 0}
 
+    def _stop_panel_rooms(self, include_current=True):
+        """
+        停止弹幕面板启动的全部直播间 (start_room_monitor 单独监听的其他直播间不受影响)
+        :param include_current: 同时停止当前账号的直播间；切换账号 / 退出登录时为 False (此时已是新账号)
+        """
+        rooms, self.panel_rooms = self.panel_rooms, set()
+        if include_current and self.session_state.room_id:
+            rooms.add(int(self.session_state.room_id))
+        for room_id in rooms:
+            asyncio.run_coroutine_threadsafe(self.danmu_service.stop_room(room_id), self.loop)
+
+    def start_room_monitor(self, room_id):
+        """开始监听指定直播间 (可同时监听多个直播间，事件带 room_id)"""
+        try:
+            room_id = int(room_id)
+        except (TypeError, ValueError):
+            return {"code": -1, "msg": "无效的房间ID"}
+        if room_id not in self.danmu_service.rooms and len(self.danmu_service.rooms) >= self.danmu_service.max_rooms:
+            return {"code": -1, "msg": f"最多同时监听 {self.danmu_service.max_rooms} 个直播间"}
+        asyncio.run_coroutine_threadsafe(self.danmu_service.start_room(room_id), self.loop)
+        return {"code": 0}
+
+    def stop_room_monitor(self, room_id):
+        """停止监听指定直播间"""
+        try:
+            room_id = int(room_id)
+        except (TypeError, ValueError):
+            return {"code": -1, "msg": "无效的房间ID"}
+        asyncio.run_coroutine_threadsafe(self.danmu_service.stop_room(room_id), self.loop)
+        return {"code": 0}
+
+    def get_room_monitors(self):
+        """正在监听的直播间及连接状态"""
+        return {"code": 0, "data": self.danmu_service.get_rooms()}
+
+    def get_danmu_series(self, room_id=None, points=120):
+        """
+        直播间本次监听期间的人气值 / 看过人数 / 高能榜人数序列 (降采样到最多 points 个点)
+        :param room_id: 不传时为当前账号的直播间
+        """
+        room = self.danmu_service.rooms.get(int(room_id or self.session_state.room_id or 0))
+        if not room:
+            return {"code": -1, "msg": "未监听该直播间"}
+        return {"code": 0, "data": room.series.get_series(int(points))}
+
+    def get_danmu_analytics(self, room_id=None, top=10):
+        """
+        直播间实时统计 (1 分钟 / 5 分钟 / 本次监听全程)，结果缓存 1 秒，可每秒轮询
+        :param room_id: 不传时为当前账号的直播间
+        """
+        room = self.danmu_service.rooms.get(int(room_id or self.session_state.room_id or 0))
+        if not room:
+            return {"code": -1, "msg": "未监听该直播间"}
+        return {"code": 0, "data": room.analytics.snapshot(int(top))}
+
     def send_danmu(self, msg):
-        """发送弹幕"""
-        return self.danmu_service.send_danmu(msg)
+        """发送弹幕 (等待发送结果)，与 submit_danmu 共用发送队列和限流"""
+        return self.send_queue.submit(msg, self.session_state.room_id, wait=True)
+
+    def submit_danmu(self, msg, room_id=None):
+        """
+        提交弹幕到发送队列，立即返回 ticket；发送结果以 send_result 事件 (带 ticket) 推送到前端
+        :param room_id: 不传时发送到当前账号的直播间
+        """
+        if not msg or not str(msg).strip():
+            return {"code": -1, "msg": "弹幕内容为空"}
+        room_id = room_id or self.session_state.room_id
+        if not room_id:
+            return {"code": -1, "msg": "未获取到房间ID"}
+        return self.send_queue.submit(str(msg), room_id)
+
+    def get_danmu_send_stats(self):
+        """弹幕发送队列统计 (队列深度、发送 / 失败 / 重试次数、提交到完成的延迟)"""
+        return {"code": 0, "data": self.send_queue.get_stats()}
+
+    def get_danmu_host_stats(self):
+        """各弹幕服务器主机的握手成功 / 失败次数和延迟"""
+        return {"code": 0, "data": {k: dict(v) for k, v in list(self.danmu_service.host_stats.items())}}
+
+    def get_danmu_decode_stats(self):
+        """弹幕命令解析统计 (解析 / 跳过的条数和字节数，事件循环占用时间)"""
+        return {"code": 0, "data": dict(self.danmu_service.decode_stats)}
+
+    def get_danmu_delivery_stats(self):
+        """弹幕推送统计 (每帧条数、延迟、队列深度、丢弃数)"""
+        return {"code": 0, "data": self.delivery_service.get_stats()}
+
+    def get_keyword_rules(self):
+        """弹幕关键词规则 {"hide": [...], "highlight": [...], "tags": {"标签": [...]}}"""
+        return {"code": 0, "data": self.danmu_service.keyword_filter.rules}
+
+    def set_keyword_rules(self, rules):
+        """设置弹幕关键词规则，立即生效并保存"""
+        try:
+            self.danmu_service.keyword_filter.set_rules(rules)
+        except ValueError as e:
+            return {"code": -1, "msg": str(e)}
+        self.config_manager.data["danmu_keyword_rules"] = rules
+        self.config_manager.save()
+        return {"code": 0, "data": self.danmu_service.keyword_filter.get_stats()}
+
+    def get_keyword_filter_stats(self):
+        """关键词过滤统计 (检查 / 命中 / 屏蔽条数，平均耗时)"""
+        return {"code": 0, "data": self.danmu_service.keyword_filter.get_stats()}
+
+    # --- Danmu History Methods ---
+    # 分页：返回 {"items": [...], "next_before_id": id}，下一页传入 before_id=next_before_id，为 None 时没有更多
+    def get_history_sessions(self, before_id=None, limit=20):
+        """弹幕历史场次列表 (新的在前)"""
+        if not self.danmu_history:
+            return {"code": -1, "msg": "弹幕历史记录未开启"}
+        return {"code": 0, "data": self.danmu_history.list_sessions(before_id, int(limit))}
+
+    def get_history_events(self, session_id=None, event_type=None, uid=None, before_id=None, limit=50):
+        """按场次 / 类型 (danmu / gift / interact) / 用户查询弹幕历史 (新的在前)"""
+        if not self.danmu_history:
+            return {"code": -1, "msg": "弹幕历史记录未开启"}
+        return {"code": 0, "data": self.danmu_history.query_events(session_id, event_type, uid, before_id, int(limit))}
+
+    def search_history(self, keyword, session_id=None, before_id=None, limit=50):
+        """全文搜索弹幕历史 (弹幕内容和用户名)"""
+        if not self.danmu_history:
+            return {"code": -1, "msg": "弹幕历史记录未开启"}
+        return {"code": 0, "data": self.danmu_history.search(keyword, session_id, before_id, int(limit))}
+
+    def get_danmu_export_stats(self):
+        """弹幕导出统计 (写入行数 / 批次 / 文件数，当前文件)"""
+        if not self.danmu_exporter:
+            return {"code": -1, "msg": "弹幕导出未开启"}
+        return {"code": 0, "data": self.danmu_exporter.get_stats()}
+
+    def get_danmu_dedup_stats(self):
+        """交互消息去重统计 (命中 / 未命中次数，当前记录数)"""
+        return {"code": 0, "data": self.danmu_service.interact_deduper.get_stats()}
+
+    def get_danmu_gift_stats(self):
+        """礼物连击合并统计 (收到 / 合并的礼物数，推送的更新 / 最终结果数，进行中的连击数)"""
+        return {"code": 0, "data": self.danmu_service.gift_aggregator.get_stats()}
+
+    def get_danmu_face_stats(self):
+        """头像缓存统计 (命中 / 未命中，学习 / 批量获取的数量)"""
+        return {"code": 0, "data": self.danmu_service.face_cache.get_stats()}
+
+    def get_api_cache_stats(self):
+        """接口响应缓存统计 (命中 / 未命中 / 合并的并发请求)"""
+        return {"code": 0, "data": self.api_client.cache.get_stats()}
 
     # --- App Config Methods ---
     def get_app_config(self):
@@ -155,6 +401,8 @@ class ApiService:
                 pass
         config = {
             "min_to_tray": self.config_manager.data.get("min_to_tray", True),
+            "danmu_record": self.config_manager.data.get("danmu_record", False),
+            "danmu_export": self.config_manager.data.get("danmu_export"),
             "is_win32": sys.platform == 'win32',
             "has_tray": has_tray
         }
@@ -165,4 +413,20 @@ class ApiService:
             self.config_manager.data["min_to_tray"] = bool(value)
             self.config_manager.save()
             return {"code": 0}
+        if key == "danmu_record":
+            # 录制弹幕原始帧，下次开始监听直播间时生效
+            self.config_manager.data["danmu_record"] = bool(value)
+            self.config_manager.save()
+            self.danmu_service.record_dir = os.path.join(get_app_path(), "recordings") if value else None
+            self.danmu_service.record_compress = self.config_manager.data.get("danmu_record_compress", False)
+            return {"code": 0}
+        if key == "danmu_export":
+            # 导出格式 parquet / arrow，空值关闭
+            if value and value not in EXPORT_FORMATS:
+                return {"code": -1, "msg": f"不支持的导出格式: {value}"}
+            if not self._set_danmu_export(value):
+                return {"code": -1, "msg": "开启导出失败 (需要安装 pyarrow)"}
+            self.config_manager.data["danmu_export"] = value or None
+            self.config_manager.save()
+            return {"code": 0}
         return {"code": -1, "msg": "Unknown config key"}
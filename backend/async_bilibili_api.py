@@ -0,0 +1,103 @@
+"""
+说明：BilibiliApi 的 asyncio 版本 (aiohttp)
+
+供弹幕事件循环使用，网络请求不阻塞事件循环，也不占用线程池。
+签名 (APP / Wbi)、日志脱敏、JSON 解析和账户 cookie 都复用同步客户端 BilibiliApi：
+cookie 每次从 BilibiliApi.cookies 读取，切换账户后立即生效。
+请求复用调用方提供的 ClientSession (与弹幕 WebSocket 共用一个连接池)。
+"""
+
+import asyncio
+import json
+import logging
+import urllib.parse
+
+import aiohttp
+
+from backend import get_wbi
+
+logger = logging.getLogger("BiliAPI")
+
+RETRY_STATUS = (502, 503, 504)
+
+
+class AsyncBilibiliApi:
+    def __init__(self, api, get_session, timeout=10, retries=2):
+        """
+        :param api: 同步客户端 BilibiliApi，提供 cookies / headers / 签名 / 脱敏
+        :param get_session: 返回 aiohttp.ClientSession 的协程函数
+        :param retries: GET 请求在连接失败、超时、502/503/504 时的重试次数 (POST 不重试)
+        """
+        self.api = api
+        self.get_session = get_session
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+
+    async def _req(self, method, url, params=None, data=None):
+        """通用请求封装，返回值与 BilibiliApi._req 相同"""
+        masked_url = self.api._mask_url(url)
+        logger.debug(f"API Request: {method} {masked_url}")
+        attempts = self.retries + 1 if method == "GET" else 1
+        for attempt in range(attempts):
+            try:
+                session = await self.get_session()
+                async with session.request(method, url, params=params, data=data, cookies=self.api.cookies,
+                                           headers=self.api.headers, timeout=self.timeout) as resp:
+                    if resp.status in RETRY_STATUS and attempt + 1 < attempts:
+                        await asyncio.sleep(0.3 * 2 ** attempt)
+                        continue
+                    text = await resp.text()
+                return self.api._parse_response(masked_url, resp.status, text)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(0.3 * 2 ** attempt)
+                    continue
+                logger.error(f"Request Error: {masked_url} -> {e!r}")
+                return False, {"code": -1, "msg": str(e) or type(e).__name__}
+            except Exception as e:
+                logger.error(f"Request Error: {masked_url} -> {e}")
+                return False, {"code": -1, "msg": str(e)}
+
+    # --- Wbi 签名 ---
+    async def get_wbi_keys(self):
+        """获取最新的 img_key 和 sub_key (不携带账户 cookie)"""
+        session = await self.get_session()
+        async with session.get('https://api.bilibili.com/x/web-interface/nav', headers=get_wbi.headers,
+                               timeout=self.timeout) as resp:
+            resp.raise_for_status()
+            return get_wbi.parse_wbi_keys(json.loads(await resp.text()))
+
+    async def get_w_rid_and_wts(self, other_data_dict):
+        """与 get_wbi.get_w_rid_and_wts 相同 (共用 key 缓存)，返回 (含签名的 dict, query 字符串)"""
+        mixin_key = get_wbi.key_cache.get() or get_wbi.key_cache.set(*await self.get_wbi_keys())
+        signed_params = get_wbi.signParams(other_data_dict, mixin_key)
+        return signed_params, urllib.parse.urlencode(signed_params)
+
+    # --- 弹幕服务使用的接口 ---
+    async def get_user_info(self):
+        success, res = await self._req("GET", "https://api.bilibili.com/x/web-interface/nav")
+        if success:
+            get_wbi.prime_from_nav(res)
+        return success, res
+
+    async def get_user_cards(self, uids):
+        """批量获取用户名片 (头像、昵称)，uids 为 uid 列表"""
+        return await self._req("GET", "https://api.vc.bilibili.com/account/v1/user/cards",
+                               params={"uids": ",".join(str(uid) for uid in uids)})
+
+    async def get_danmu_info(self, room_id):
+        """获取弹幕服务器 token 和主机列表 (Wbi 签名)，签名校验失败时刷新 key 重试一次"""
+        for attempt in range(2):
+            signed_params, _ = await self.get_w_rid_and_wts({"id": room_id, "type": 0})
+            success, res = await self._req(
+                "GET", "https://api.live.bilibili.com/xlive/web-room/v1/index/getDanmuInfo", params=signed_params)
+            if not success or res.get('code') not in get_wbi.SIGN_ERROR_CODES or attempt:
+                return success, res
+            logger.info(f"Wbi sign rejected ({res.get('code')}), refreshing keys")
+            get_wbi.key_cache.invalidate()
+
+    async def get_buvid3(self):
+        success, res = await self._req("GET", "https://api.bilibili.com/x/frontend/finger/spi")
+        if success and res['code'] == 0:
+            return res['data']['b_3']
+        return None
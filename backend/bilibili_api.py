@@ -1,12 +1,13 @@
 import hashlib
+import threading
 import urllib.parse
-import requests
 import logging
 import json
 import time
 from backend import data as dt
 from backend import util
-from backend.get_wbi import get_w_rid_and_wts
+from backend import get_wbi
+from backend.api_cache import ResponseCache
 
 # 配置模块日志
 logger = logging.getLogger("BiliAPI")
@@ -16,13 +17,70 @@ class BilibiliApi:
     # B站直播姬 App Key
     APP_KEY = "aae92bc66f3edfab"
     APP_SEC = "af125a0d5279fd576c1b4418a3e8276d"
+    # 响应缓存策略：接口名 -> (有效期秒数, 是否持久化)
+    CACHE_POLICIES = {
+        "area_list": (24 * 3600, True),
+        "room_id_by_uid": (7 * 24 * 3600, True),
+        "user_info": (30, False),
+        "user_stat": (30, False),
+    }
 
     def __init__(self):
         self.cookies = {}
         self.headers = dt.header.copy()
+        # 每个账户一个 Session (按 DedeUserID)，复用 keep-alive 连接，服务端下发的 cookie 保存在各自的 cookie jar 中
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.session = self._get_session("")
+        # 扫码登录、获取 wbi key 不携带账户 cookie，使用单独的匿名 Session
+        self.anon_session = util.create_session(self.headers)
+        # 开播前置数据：服务器时钟偏差只估算一次；直播姬版本信息带有效期缓存，过半后在后台刷新
+        self.clock_offset = None  # 服务器时间 - 本地时间 (秒)
+        self.clock_estimated_at = (0.0, 0.0)  # 估算时的 (time.time(), time.monotonic())，用于发现本地时钟被调整
+        self.version_info = None  # (build, curr_version)
+        self.version_fetched_at = 0.0
+        self.version_ttl = 6 * 3600
+        self.version_refreshing = False
+        self.live_lock = threading.Lock()
+        self.cache = ResponseCache(self.CACHE_POLICIES)
+
+    def _get_session(self, uid):
+        with self.sessions_lock:
+            session = self.sessions.get(uid)
+            if session is None:
+                session = util.create_session(self.headers)
+                self.sessions[uid] = session
+            return session
 
     def update_cookies(self, cookies: dict):
         self.cookies = cookies
+        self.session = self._get_session(self._account())
+
+    def _account(self):
+        return str(self.cookies.get("DedeUserID", ""))
+
+    def _cached(self, endpoint, fetch, params=None, per_account=True, force=False):
+        """通过响应缓存请求，per_account 为 True 时不同账户分开缓存"""
+        account = self._account() if per_account else ""
+        return self.cache.get_or_fetch(endpoint, params, account, fetch, force)
+
+    def close_session(self, uid):
+        """退出登录时关闭该账户的 Session，丢弃其连接、cookie jar 和缓存的响应"""
+        self.cache.invalidate(account=str(uid))
+        with self.sessions_lock:
+            session = self.sessions.pop(str(uid), None)
+        if session is not None:
+            session.close()
+            if session is self.session:
+                self.session = self._get_session("")
+
+    def close(self):
+        with self.sessions_lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions + [self.anon_session]:
+            session.close()
+        self.cache.save()
 
     def _appsign(self, params: dict) -> dict:
         """为请求参数进行 APP 签名"""
@@ -82,46 +140,45 @@ class BilibiliApi:
         try:
             masked_url = self._mask_url(url)
             logger.debug(f"API Request: {method} {masked_url}")
-            
-            # 确保 buvid3 在 cookies 中
-            req_cookies = self.cookies.copy()
-            if 'buvid3' not in req_cookies and 'buvid3' in self.cookies:
-                 req_cookies['buvid3'] = self.cookies['buvid3']
 
+            # 账户 cookie 每次随请求传入 (其他服务会直接修改 self.cookies，如补充 buvid3)，与 Session 的 cookie jar 合并
             if method == "GET":
-                resp = requests.get(url, params=params, cookies=req_cookies, headers=self.headers, timeout=10)
+                resp = self.session.get(url, params=params, cookies=self.cookies, timeout=10)
             else:
-                resp = requests.post(url, params=params, data=data, cookies=req_cookies, headers=self.headers,
-                                     timeout=10)
+                resp = self.session.post(url, params=params, data=data, cookies=self.cookies, timeout=10)
 
-            # 尝试解析 JSON
-            try:
-                json_data = resp.json()
-                code = json_data.get("code", "N/A")
-                msg = json_data.get("msg") or json_data.get("message", "")
-                
-                # 记录部分脱敏后的 data 信息
-                resp_data = json_data.get("data")
-                masked_data = "None"
-                if resp_data:
-                    # 简单截取或脱敏，避免日志过大
-                    try:
-                        masked_data = json.dumps(self._mask_data(resp_data), ensure_ascii=False)
-                        if len(masked_data) > 200:
-                            masked_data = masked_data[:200] + "..."
-                    except:
-                        masked_data = "Parse Error"
-
-                logger.debug(f"API Response: {masked_url} -> code={code}, msg={msg}, data={masked_data}")
-                return True, json_data
-            except ValueError:
-                logger.error(f"JSON Decode Error. Status: {resp.status_code}, Content: {resp.text[:100]}")
-                return False, {"code": -1, "msg": "API 返回格式错误"}
+            return self._parse_response(masked_url, resp.status_code, resp.text)
 
         except Exception as e:
             logger.error(f"Request Error: {url} -> {e}")
             return False, {"code": -1, "msg": str(e)}
 
+    def _parse_response(self, masked_url, status, text):
+        """解析 JSON 响应并记录脱敏日志 (同步 / 异步客户端共用)"""
+        try:
+            json_data = json.loads(text)
+        except ValueError:
+            logger.error(f"JSON Decode Error. Status: {status}, Content: {text[:100]}")
+            return False, {"code": -1, "msg": "API 返回格式错误"}
+
+        code = json_data.get("code", "N/A")
+        msg = json_data.get("msg") or json_data.get("message", "")
+
+        # 记录部分脱敏后的 data 信息
+        resp_data = json_data.get("data")
+        masked_data = "None"
+        if resp_data:
+            # 简单截取或脱敏，避免日志过大
+            try:
+                masked_data = json.dumps(self._mask_data(resp_data), ensure_ascii=False)
+                if len(masked_data) > 200:
+                    masked_data = masked_data[:200] + "..."
+            except:
+                masked_data = "Parse Error"
+
+        logger.debug(f"API Response: {masked_url} -> code={code}, msg={msg}, data={masked_data}")
+        return True, json_data
+
     # --- 扫码登录 ---
     def get_passport_qrcode(self):
         return self._req("GET", "https://passport.bilibili.com/x/passport-login/web/qrcode/generate")
@@ -133,7 +190,7 @@ class BilibiliApi:
             masked_url = self._mask_url(f"{url}?qrcode_key={qrcode_key}")
             logger.debug(f"API Request: GET {masked_url}")
             
-            resp = requests.get(url, params=params, headers=self.headers, timeout=10)
+            resp = self.anon_session.get(url, params=params, timeout=10)
             json_data = resp.json()
             code = json_data.get("data", {}).get("code", "N/A")
             
@@ -153,21 +210,39 @@ class BilibiliApi:
             return False, {"code": -1, "msg": str(e)}, {}
 
     # --- 用户信息 ---
-    def get_user_info(self):
+    def get_user_info(self, force=False):
         """获取基本信息 (昵称、等级、头像、硬币等)"""
-        return self._req("GET", "https://api.bilibili.com/x/web-interface/nav")
+        def fetch():
+            success, res = self._req("GET", "https://api.bilibili.com/x/web-interface/nav")
+            if success:
+                get_wbi.prime_from_nav(res)
+            return success, res
+        return self._cached("user_info", fetch, force=force)
 
-    def get_user_stat(self):
+    def get_user_stat(self, force=False):
         """[新增] 获取统计信息 (粉丝数、关注数、动态数)"""
-        return self._req("GET", "https://api.bilibili.com/x/web-interface/nav/stat")
+        return self._cached("user_stat", lambda: self._req("GET", "https://api.bilibili.com/x/web-interface/nav/stat"),
+                            force=force)
+
+    def get_user_cards(self, uids):
+        """批量获取用户名片 (头像、昵称)，uids 为 uid 列表"""
+        return self._req("GET", "https://api.vc.bilibili.com/account/v1/user/cards",
+                         params={"uids": ",".join(str(uid) for uid in uids)})
 
     def get_room_id_by_uid(self, uid):
         """通过 UID 获取直播间 ID"""
-        return self._req("GET", f"https://api.live.bilibili.com/room/v2/Room/room_id_by_uid?uid={uid}")
+        return self._cached(
+            "room_id_by_uid",
+            lambda: self._req("GET", f"https://api.live.bilibili.com/room/v2/Room/room_id_by_uid?uid={uid}"),
+            params=str(uid), per_account=False)
 
     # --- 直播控制 ---
-    def get_area_list(self):
-        return self._req("GET", "https://api.live.bilibili.com/room/v1/Area/getList", params={"show_pinyin": 1})
+    def get_area_list(self, force=False):
+        """分区列表 (所有账户共用缓存)；force 为 True 时忽略缓存"""
+        return self._cached(
+            "area_list",
+            lambda: self._req("GET", "https://api.live.bilibili.com/room/v1/Area/getList", params={"show_pinyin": 1}),
+            per_account=False, force=force)
 
     def update_title(self, room_id, title, csrf):
         data = {'room_id': room_id, 'platform': 'pc_link', 'title': title, 'csrf_token': csrf, 'csrf': csrf}
@@ -175,26 +250,96 @@ class BilibiliApi:
 
     def update_area(self, room_id, area_id, csrf):
         data = {'room_id': room_id, 'area_id': area_id, 'platform': 'pc_link', 'csrf_token': csrf, 'csrf': csrf}
-        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/update", data=data)
+        success, res = self._req("POST", "https://api.live.bilibili.com/room/v1/Room/update", data=data)
+        if success and res.get('code') != 0:
+            # 分区可能已被调整 (下线、改名)，下次重新获取分区列表
+            self.cache.invalidate("area_list")
+        return success, res
 
-    def start_live(self, room_id, area_id, csrf):
-        # 1. 获取时间戳
-        s1, t_resp = self._req("GET", "https://api.bilibili.com/x/report/click/now")
-        if not s1 or t_resp['code'] != 0: return False, t_resp
-        ts = t_resp["data"]["now"]
+    def estimate_clock_offset(self):
+        """请求服务器时间估算时钟偏差 (取请求往返的中点)"""
+        start = time.time()
+        success, res = self._req("GET", "https://api.bilibili.com/x/report/click/now")
+        if not success or res.get('code') != 0:
+            return False, res
+        self.clock_offset = res["data"]["now"] - (start + time.time()) / 2
+        self.clock_estimated_at = (time.time(), time.monotonic())
+        logger.debug(f"Server clock offset: {self.clock_offset:.2f}s")
+        return True, res
 
-        # 2. 获取版本
+    def server_now(self):
+        """估算的服务器时间戳 (秒)，偏差未知或本地时钟被调整过时先请求一次"""
+        wall, mono = self.clock_estimated_at
+        if self.clock_offset is None or abs((time.time() - wall) - (time.monotonic() - mono)) > 2:
+            success, res = self.estimate_clock_offset()
+            if not success:
+                return None, res
+        return int(time.time() + self.clock_offset), None
+
+    def refresh_live_version(self):
+        """获取直播姬版本信息 (build, curr_version) 并缓存"""
+        ts, err = self.server_now()
+        if ts is None:
+            return False, err
         v_params = self._appsign({"system_version": 2, "ts": ts})
-        s2, v_resp = self._req("GET",
-                               "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
-                               params=v_params)
-        if not s2 or v_resp['code'] != 0: return False, v_resp
+        success, res = self._req("GET",
+                                 "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
+                                 params=v_params)
+        if not success or res.get('code') != 0:
+            return False, res
+        self.version_info = (res['data']['build'], res['data']['curr_version'])
+        self.version_fetched_at = time.monotonic()
+        return True, res
+
+    def _refresh_live_version_background(self):
+        with self.live_lock:
+            if self.version_refreshing:
+                return
+            self.version_refreshing = True
+
+        def run():
+            try:
+                self.refresh_live_version()
+            finally:
+                self.version_refreshing = False
+
+        threading.Thread(target=run, name="LiveVersionRefresh", daemon=True).start()
+
+    def get_live_version(self):
+        """返回缓存的版本信息；已过期时同步获取，超过有效期一半时在后台刷新"""
+        age = time.monotonic() - self.version_fetched_at
+        if self.version_info is None or age >= self.version_ttl:
+            success, res = self.refresh_live_version()
+            if not success:
+                return None, res
+        elif age >= self.version_ttl / 2:
+            self._refresh_live_version_background()
+        return self.version_info, None
+
+    def prewarm_live(self):
+        """
+        打开开播面板时调用：估算时钟偏差、获取版本信息，同时建立到 api.live.bilibili.com 的 keep-alive 连接，
+        之后开播只需一次 startLive 请求
+        """
+        if self.clock_offset is None:
+            self.estimate_clock_offset()
+        return self.get_live_version()
+
+    def start_live(self, room_id, area_id, csrf):
+        # 1. 服务器时间戳 (本地时间 + 缓存的时钟偏差)
+        ts, err = self.server_now()
+        if ts is None: return False, err
+
+        # 2. 版本信息 (有效期内使用缓存)
+        version, err = self.get_live_version()
+        if version is None: return False, err
+        build, curr_version = version
 
         # 3. 开始直播
         data = {
             'room_id': room_id, 'platform': 'pc_link', 'area_v2': area_id, 'backup_stream': '0',
-            'csrf_token': csrf, 'csrf': csrf, 'build': v_resp['data']['build'],
-            'version': v_resp['data']['curr_version'], 'ts': ts
+            'csrf_token': csrf, 'csrf': csrf, 'build': build,
+            'version': curr_version, 'ts': ts
         }
         return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/startLive", data=self._appsign(data))
 
@@ -204,21 +349,24 @@ class BilibiliApi:
 
     # --- 弹幕发送 ---
     def send_danmu(self, room_id, msg, csrf):
-        """发送弹幕"""
-        # 1. 获取 Wbi 签名参数
-        _, query = get_w_rid_and_wts(other_data_dict={"web_location": 444.8})
-        
-        # 2. 准备数据
+        """发送弹幕，签名校验失败时刷新 Wbi key 重试一次"""
+        # 1. 准备数据
         data = dt.bullet_data.copy()
         data["msg"] = msg
         data["csrf_token"] = csrf
         data["csrf"] = csrf
         data["roomid"] = int(room_id)
         data["rnd"] = int(time.time())
-        
-        url = f"https://api.live.bilibili.com/msg/send?{query}"
-        
-        return self._req("POST", url, data=data)
+
+        for attempt in range(2):
+            # 2. 获取 Wbi 签名参数 (key 有缓存)
+            _, query = get_wbi.get_w_rid_and_wts(other_data_dict={"web_location": 444.8}, session=self.anon_session)
+            url = f"https://api.live.bilibili.com/msg/send?{query}"
+            success, res = self._req("POST", url, data=data)
+            if not success or res.get('code') not in get_wbi.SIGN_ERROR_CODES or attempt:
+                return success, res
+            logger.info(f"Wbi sign rejected ({res.get('code')}), refreshing keys")
+            get_wbi.key_cache.invalidate()
 
     # --- buvid3 获取 ---
     def get_buvid3(self):
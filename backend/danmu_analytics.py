@@ -0,0 +1,249 @@
+"""
+说明：弹幕实时统计
+
+由 DanmuService._handle_command 产生的事件驱动，统计 1 分钟、5 分钟和本次监听全程的：
+弹幕数 (条/分钟)、发言人数、发言最多的用户、礼物排行、高频词 / 表情。
+
+- 1 分钟 / 5 分钟窗口：按 10 秒分桶的环形计数 (WindowCounter)，每个事件 O(1) 更新，
+  桶过期时从窗口合计中减去，窗口内不同 key 的数量有上限。
+- 全程：发言人数用 HyperLogLog 估算，排行用有上限的计数器 (超出上限时裁剪低频 key，近似值)。
+
+add 在弹幕事件循环线程调用，snapshot 在 pywebview 线程调用，两者 (以及窗口过期) 都在 DanmuAnalytics.lock 内进行。
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+
+EMOTE_PATTERN = re.compile(r'\[[^\[\]]{1,16}\]')
+WORD_PATTERN = re.compile(r'[A-Za-z0-9]{2,}')
+REPEAT_PATTERN = re.compile(r'(.)\1{3,}')
+
+
+def extract_words(text, max_len=10):
+    """
+    提取 "词"：不做中文分词，取
+    - 表情 [xxx]
+    - 去掉表情后不超过 max_len 个字的短弹幕整体 (连续重复 4 次以上的字压缩为 3 个，如 哈哈哈哈哈 -> 哈哈哈)
+    - 较长弹幕中的英文单词和数字 (如 666、gg)
+    """
+    if not text:
+        return []
+    words = EMOTE_PATTERN.findall(text)
+    rest = EMOTE_PATTERN.sub('', text).strip()
+    if not rest:
+        return words
+    if len(rest) <= max_len:
+        words.append(REPEAT_PATTERN.sub(r'\1\1\1', rest.lower()))
+    else:
+        words.extend(w.lower() for w in WORD_PATTERN.findall(rest))
+    return words
+
+
+class WindowCounter:
+    """滑动窗口计数：按 bucket 秒分桶，窗口合计随桶过期递减"""
+
+    def __init__(self, window=60, bucket=10, max_keys=5000):
+        self.window = window
+        self.bucket = bucket
+        self.max_keys = max_keys
+        self.buckets = deque()  # (桶开始时间, Counter)
+        self.totals = Counter()
+        self.count = 0  # 窗口内的计数合计 (包括因超出 max_keys 未单独计数的 key)
+
+    def add(self, key, n=1, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+        if not self.buckets or now - self.buckets[-1][0] >= self.bucket:
+            self.buckets.append((now - now % self.bucket, Counter()))
+        self.count += n
+        if key in self.totals or len(self.totals) < self.max_keys:
+            self.buckets[-1][1][key] += n
+            self.totals[key] += n
+        else:
+            self.buckets[-1][1][None] += n  # 只计入合计
+
+    def expire(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        buckets = self.buckets
+        totals = self.totals
+        while buckets and now - buckets[0][0] >= self.window:
+            _, counts = buckets.popleft()
+            for key, n in counts.items():
+                self.count -= n
+                if key is None:
+                    continue
+                left = totals[key] - n
+                if left > 0:
+                    totals[key] = left
+                else:
+                    del totals[key]
+
+    def top(self, k=10):
+        return heapq.nlargest(k, self.totals.items(), key=lambda item: item[1])
+
+
+class TopCounter:
+    """有上限的全程计数：超过 2 * max_keys 个 key 时只保留计数最多的 max_keys 个 (低频 key 的计数为近似值)"""
+
+    def __init__(self, max_keys=5000):
+        self.max_keys = max_keys
+        self.counts = Counter()
+
+    def add(self, key, n=1):
+        counts = self.counts
+        counts[key] += n
+        if len(counts) > 2 * self.max_keys:
+            self.counts = Counter(dict(counts.most_common(self.max_keys)))
+
+    def top(self, k=10):
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+
+class HyperLogLog:
+    """基数估算 (发言人数)，2^p 个寄存器，标准误差约 1.04 / sqrt(2^p)"""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    @staticmethod
+    def _hash(value):
+        # splitmix64，int 的 hash() 是其本身，分布不均匀
+        x = (hash(value) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return x ^ (x >> 31)
+
+    def add(self, value):
+        x = self._hash(value)
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.m
+        estimate = self.alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(estimate)
+
+
+class DanmuAnalytics:
+    WINDOWS = {"1m": 60, "5m": 300}
+
+    def __init__(self, max_keys=5000, cache_ttl=1.0):
+        """
+        :param max_keys: 每个窗口 / 排行最多单独计数的 key 数量；窗口内发言用户为 4 倍 (窗口发言人数在此范围内是准确值)
+        :param cache_ttl: snapshot 结果缓存时间 (秒)，前端每秒轮询时不重复计算
+        """
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.cache_ttl = cache_ttl
+        self.windows = {
+            name: {
+                "senders": WindowCounter(seconds, max_keys=4 * max_keys),
+                "gifts": WindowCounter(seconds, max_keys=max_keys),
+                "words": WindowCounter(seconds, max_keys=max_keys),
+            }
+            for name, seconds in self.WINDOWS.items()
+        }
+        self.session = {
+            "senders": TopCounter(max_keys),
+            "gifts": TopCounter(max_keys),
+            "words": TopCounter(max_keys),
+        }
+        self.chatters = HyperLogLog()
+        self.names = {}  # uid -> 最近的用户名 (最多 20000 个)
+        self.messages = 0
+        self.gifts = 0
+        self._cache = None
+        self._cache_at = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, event, now=None):
+        """加入一个事件 (danmu / gift，其他类型忽略)；gift 的 num 需为本次数量而非连击累计数量"""
+        event_type = event.get('type')
+        if event_type == 'danmu' or event_type == 'gift':
+            with self.lock:
+                self._add(event_type, event, now)
+
+    def _add(self, event_type, event, now):
+        if now is None:
+            now = time.monotonic()
+        if event_type == 'danmu':
+            uid = event.get('uid') or event.get('uname')
+            self.messages += 1
+            self.chatters.add(uid)
+            if len(self.names) < 20000 or uid in self.names:
+                self.names[uid] = event.get('uname')
+            words = extract_words(event.get('msg'))
+            for window in self.windows.values():
+                window["senders"].add(uid, 1, now)
+                for word in words:
+                    window["words"].add(word, 1, now)
+            self.session["senders"].add(uid)
+            for word in words:
+                self.session["words"].add(word)
+        else:
+            try:
+                num = int(event.get('num') or 1)
+            except (TypeError, ValueError):
+                num = 1
+            name = event.get('gift_name')
+            self.gifts += num
+            for window in self.windows.values():
+                window["gifts"].add(name, num, now)
+            self.session["gifts"].add(name, num)
+
+    def _senders(self, items):
+        return [{"uid": uid, "uname": self.names.get(uid, ''), "count": n} for uid, n in items]
+
+    def snapshot(self, top=10):
+        """各窗口的统计结果，cache_ttl 内重复调用直接返回缓存"""
+        with self.lock:
+            return self._snapshot(top)
+
+    def _snapshot(self, top):
+        now = time.monotonic()
+        if self._cache is not None and self._cache[0] == top and now - self._cache_at < self.cache_ttl:
+            return self._cache[1]
+
+        result = {"started_at": self.started_at}
+        for name, seconds in self.WINDOWS.items():
+            window = self.windows[name]
+            for counter in window.values():
+                counter.expire(now)
+            # 监听时间不足一个窗口时按实际时长计算
+            minutes = min(seconds, max(now - self.start, 1.0)) / 60
+            result[name] = {
+                "messages": window["senders"].count,
+                "per_minute": round(window["senders"].count / minutes, 1),
+                "chatters": len(window["senders"].totals),
+                "top_senders": self._senders(window["senders"].top(top)),
+                "top_gifts": [{"gift_name": g, "num": n} for g, n in window["gifts"].top(top)],
+                "top_words": [{"word": w, "count": n} for w, n in window["words"].top(top)],
+            }
+        minutes = max(now - self.start, 1.0) / 60
+        result["session"] = {
+            "messages": self.messages,
+            "per_minute": round(self.messages / minutes, 1),
+            "chatters": self.chatters.count(),
+            "gifts": self.gifts,
+            "top_senders": self._senders(self.session["senders"].top(top)),
+            "top_gifts": [{"gift_name": g, "num": n} for g, n in self.session["gifts"].top(top)],
+            "top_words": [{"word": w, "count": n} for w, n in self.session["words"].top(top)],
+        }
+        self._cache = (top, result)
+        self._cache_at = now
+        return result
@@ -0,0 +1,195 @@
+"""
+说明：弹幕事件导出为列式文件 (Parquet / Arrow IPC 流)，用于直播结束后在 pandas / duckdb 中分析
+
+推送到前端的事件 (弹幕、礼物连击最终结果、交互) 按行缓存，每满 batch_rows 行转换为一个 RecordBatch，
+交给单独的写入线程追加到当前文件。直播过程中持续追加，结束时只需写入最后不满一批的数据。
+
+程序崩溃或被强制结束时：
+    arrow    使用 Arrow IPC 流格式 (没有文件尾)，已写入的批次都可以读出 (pyarrow.ipc.open_stream)
+    parquet  文件尾 (元数据) 在关闭时才写入，未关闭的文件无法读取；因此每个文件超过 rotate_rows 行
+             或打开超过 rotate_seconds 秒后换一个新文件，最多丢失最后一个文件的数据
+
+文件名：{直播间}_{场次开始时间}_{序号}.parquet / .arrows
+表结构：ts (timestamp[ms, UTC]), room (int64), type (string), uid (int64), uname (string),
+        text (string), gift (string), num (int32)
+
+依赖 pyarrow (可选)，未安装时导出不可用。
+"""
+
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger("DanmuExport")
+
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+EXPORT_FORMATS = (FORMAT_PARQUET, FORMAT_ARROW)
+EXPORTED_TYPES = ('danmu', 'gift', 'interact')
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("ts", pa.timestamp("ms", tz="UTC")),
+        ("room", pa.int64()),
+        ("type", pa.string()),
+        ("uid", pa.int64()),
+        ("uname", pa.string()),
+        ("text", pa.string()),
+        ("gift", pa.string()),
+        ("num", pa.int32()),
+    ])
+else:
+    SCHEMA = None
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ColumnarExporter:
+    def __init__(self, directory, fmt=FORMAT_PARQUET, batch_rows=10000, rotate_rows=100000, rotate_seconds=600):
+        """
+        :param fmt: parquet 或 arrow (Arrow IPC 流格式)
+        :param batch_rows: 每批行数 (Parquet 中为一个 row group)
+        :param rotate_rows: 每个文件最多行数，超出后换新文件
+        :param rotate_seconds: 每个文件最长写入时间 (秒)，超出后换新文件
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.directory = directory
+        self.fmt = fmt
+        self.batch_rows = batch_rows
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.columns = self._new_columns()
+        self.prefix = None  # 当前场次的文件名前缀
+        # 开播 / 下播在 pywebview 线程调用，事件在弹幕事件循环线程追加
+        self.lock = threading.Lock()
+        # 以下由写入线程使用
+        self.writer = None
+        self.writer_prefix = None
+        self.part = 0
+        self.file_rows = 0
+        self.file_opened = 0.0
+        self.path = None
+        # 单线程，保证批次按顺序写入
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DanmuExport")
+        self.stats = {"rows": 0, "batches": 0, "files": 0, "last_write_ms": 0.0, "max_write_ms": 0.0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _new_columns():
+        return {name: [] for name in SCHEMA.names}
+
+    def start_session(self, room_id):
+        """开始新场次 (开播时调用)：写完上一场次的数据，之后的事件写入新文件"""
+        with self.lock:
+            self._end_session()
+            self.prefix = f"{room_id}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    def end_session(self):
+        """写入不满一批的剩余数据并关闭当前文件"""
+        with self.lock:
+            self._end_session()
+
+    def _end_session(self):
+        if self.prefix is None:
+            return
+        self._submit_batch()
+        self.executor.submit(self._close_writer)
+        self.prefix = None
+
+    def record(self, event):
+        """追加一个事件 (弹幕事件循环线程调用，只追加到列缓存)；进行中的礼物连击只记录最终结果"""
+        event_type = event.get('type')
+        if event_type not in EXPORTED_TYPES or event.get('final') is False:
+            return
+        with self.lock:
+            if self.prefix is None:
+                self.prefix = f"{event.get('room_id') or 0}_{time.strftime('%Y%m%d_%H%M%S')}"
+            columns = self.columns
+            columns["ts"].append(int(time.time() * 1000))
+            columns["room"].append(_int_or_none(event.get('room_id')))
+            columns["type"].append(event_type)
+            columns["uid"].append(_int_or_none(event.get('uid')))
+            columns["uname"].append(event.get('uname'))
+            columns["text"].append(event.get('msg'))
+            columns["gift"].append(event.get('gift_name'))
+            columns["num"].append(_int_or_none(event.get('num')))
+            if len(columns["ts"]) >= self.batch_rows:
+                self._submit_batch()
+
+    def _submit_batch(self):
+        if not self.columns["ts"]:
+            return
+        columns, self.columns = self.columns, self._new_columns()
+        self.executor.submit(self._write_batch, columns, self.prefix)
+
+    # --- 写入线程 ---
+    def _write_batch(self, columns, prefix):
+        start = time.perf_counter()
+        try:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(columns[field.name], type=field.type) for field in SCHEMA], schema=SCHEMA)
+            if (self.writer is None or prefix != self.writer_prefix or self.file_rows >= self.rotate_rows
+                    or time.monotonic() - self.file_opened >= self.rotate_seconds):
+                self._close_writer()
+                self._open_writer(prefix)
+            if self.fmt == FORMAT_PARQUET:
+                self.writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                self.writer.write_batch(batch)
+            self.file_rows += batch.num_rows
+            self.stats["rows"] += batch.num_rows
+            self.stats["batches"] += 1
+        except Exception as e:
+            logger.error(f"Export danmu batch failed: {e}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["last_write_ms"] = elapsed_ms
+        self.stats["max_write_ms"] = max(self.stats["max_write_ms"], elapsed_ms)
+
+    def _open_writer(self, prefix):
+        if prefix != self.writer_prefix:
+            self.writer_prefix = prefix
+            self.part = 0
+        self.part += 1
+        ext = "parquet" if self.fmt == FORMAT_PARQUET else "arrows"
+        self.path = os.path.join(self.directory, f"{prefix}_{self.part:04d}.{ext}")
+        if self.fmt == FORMAT_PARQUET:
+            self.writer = pq.ParquetWriter(self.path, SCHEMA, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_stream(self.path, SCHEMA)
+        self.file_rows = 0
+        self.file_opened = time.monotonic()
+        self.stats["files"] += 1
+        logger.info(f"Exporting danmu events to {self.path}")
+
+    def _close_writer(self):
+        if self.writer is None:
+            return
+        try:
+            self.writer.close()
+        except Exception as e:
+            logger.error(f"Close export file failed: {e}")
+        self.writer = None
+
+    def close(self):
+        self.end_session()
+        self.executor.shutdown(wait=True)
+
+    def get_stats(self):
+        return dict(self.stats, format=self.fmt, buffered=len(self.columns["ts"]), path=self.path)
@@ -0,0 +1,187 @@
+"""
+说明：弹幕事件过滤 / 合并
+
+InteractDeduper: 同一用户进场时会先后收到 INTERACT_WORD、INTERACT_WORD_V2 和 ENTRY_EFFECT，
+在时间窗口内按 (直播间, 用户, 事件种类) 去重，只保留第一条。
+GiftAggregator: 礼物连击时每个 SEND_GIFT / COMBO_SEND 都是一个事件，按 (直播间, 用户, 礼物) 在滑动窗口内合并，
+只推送一条累计数量的事件 (带 combo_id，前端原地更新)，连击结束时推送最终结果。
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+
+
+class InteractDeduper:
+    """
+    按 key 在时间窗口内去重。
+
+    OrderedDict 按首次出现时间排序 (命中时不刷新)，过期的 key 从头部依次淘汰，
+    同时限制最大条目数，长时间直播时内存占用保持不变。
+    """
+
+    def __init__(self, window=10.0, max_size=4096):
+        """
+        :param window: 去重时间窗口 (秒)，0 表示不去重
+        :param max_size: 最多记录的 key 数量，超出时淘汰最早的
+        """
+        self.window = window
+        self.max_size = max_size
+        self._seen = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def seen(self, key, now=None):
+        """key 在时间窗口内出现过则返回 True (重复)，否则记录并返回 False"""
+        if not self.window:
+            return False
+        if now is None:
+            now = time.monotonic()
+        seen = self._seen
+        # 淘汰过期的 key (头部最早)
+        while seen:
+            if now - next(iter(seen.values())) < self.window:
+                break
+            seen.popitem(last=False)
+
+        if key in seen:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        seen[key] = now
+        if len(seen) > self.max_size:
+            seen.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def clear(self):
+        self._seen.clear()
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "window": self.window,
+            "size": len(self._seen),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class GiftAggregator:
+    """
+    礼物连击合并。
+
+    每个连击从收到第一个礼物开始，之后 window 秒内收到同一用户的同一礼物都算同一连击 (每收到一个礼物窗口顺延)。
+    第一个礼物立即推送，之后累计数量最多每 update_interval 秒推送一次，连击结束时推送 final=True 的最终结果。
+    同时进行中的连击数量超过 max_combos 时提前结束最早的连击。
+    """
+
+    def __init__(self, window=3.0, update_interval=0.5, max_combos=1024):
+        """
+        :param window: 连击窗口 (秒)，0 表示不合并
+        :param update_interval: 连击进行中推送累计数量的最小间隔 (秒)
+        :param max_combos: 同时进行中的连击数量上限
+        """
+        self.window = window
+        self.update_interval = update_interval
+        self.max_combos = max_combos
+        self._combos = OrderedDict()  # key -> combo，按最后一次收到礼物的时间排序
+        self._ids = itertools.count(1)
+        self._evicted = []  # 因超出上限提前结束的连击，下次 flush 时推送最终结果
+        self.stats = {
+            "gifts": 0,
+            "merged": 0,
+            "updates": 0,
+            "finals": 0,
+            "evicted": 0,
+        }
+
+    def add(self, key, event, num, cumulative=False, now=None):
+        """
+        加入一个礼物事件
+        :param num: 本次礼物数量；cumulative 为 True 时表示连击累计数量 (COMBO_SEND 的 combo_num)
+        :return: 需要立即推送的事件，没有则返回 None
+        """
+        if now is None:
+            now = time.monotonic()
+        self.stats["gifts"] += 1
+        combo = self._combos.get(key)
+        if combo is None:
+            combo = {
+                "event": event,
+                "combo_id": next(self._ids),
+                "total": num,
+                "count": 1,
+                "last_ts": now,
+                "last_emit": now,
+                "dirty": False,
+            }
+            self._combos[key] = combo
+            if len(self._combos) > self.max_combos:
+                _, evicted = self._combos.popitem(last=False)
+                self._evicted.append(self._snapshot(evicted, True))
+                self.stats["evicted"] += 1
+            return self._snapshot(combo, False)
+
+        self.stats["merged"] += 1
+        combo["total"] = max(combo["total"], num) if cumulative else combo["total"] + num
+        combo["count"] += 1
+        combo["last_ts"] = now
+        combo["event"] = event
+        self._combos.move_to_end(key)
+        if now - combo["last_emit"] >= self.update_interval:
+            combo["last_emit"] = now
+            combo["dirty"] = False
+            self.stats["updates"] += 1
+            return self._snapshot(combo, False)
+        combo["dirty"] = True
+        return None
+
+    def flush(self, now=None, force=False):
+        """
+        定期调用：结束超出窗口的连击，推送到期的累计数量
+        :param force: 结束全部连击 (停止监听时)
+        :return: 需要推送的事件列表
+        """
+        if now is None:
+            now = time.monotonic()
+        out, self._evicted = self._evicted, []
+        combos = self._combos
+        # 头部为最久没有收到礼物的连击
+        while combos:
+            combo = next(iter(combos.values()))
+            if not force and now - combo["last_ts"] < self.window:
+                break
+            combos.popitem(last=False)
+            out.append(self._snapshot(combo, True))
+        for combo in combos.values():
+            if combo["dirty"] and now - combo["last_emit"] >= self.update_interval:
+                combo["last_emit"] = now
+                combo["dirty"] = False
+                self.stats["updates"] += 1
+                out.append(self._snapshot(combo, False))
+        return out
+
+    @property
+    def pending(self):
+        """进行中和已提前结束但还未推送最终结果的连击数量"""
+        return len(self._combos) + len(self._evicted)
+
+    def _snapshot(self, combo, final):
+        """以最近一个礼物事件为基础生成推送事件 (新 dict，已推送的事件不会再被修改)"""
+        if final:
+            self.stats["finals"] += 1
+        event = dict(combo["event"])
+        event["num"] = combo["total"]
+        event["combo_id"] = combo["combo_id"]
+        event["combo_count"] = combo["count"]
+        event["final"] = final
+        return event
+
+    def get_stats(self):
+        return dict(self.stats, window=self.window, open_combos=len(self._combos))
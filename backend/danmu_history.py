@@ -0,0 +1,352 @@
+"""
+说明：弹幕历史记录 (SQLite)
+
+把推送到前端的弹幕、礼物 (连击结束后的最终结果)、交互事件保存到本地 SQLite 数据库 (WAL 模式)。
+每次开播 (start_live) 为一个场次 (session)；未开播时监听产生的事件自动归入一个新场次。
+事件由弹幕事件循环入队，独立的写入线程批量写入 (一个事务)，事件循环不等待磁盘。
+FTS5 全文索引 (trigram 分词，支持中文任意子串；SQLite 不支持时退回 unicode61) 用于搜索弹幕内容。
+trigram 索引只能匹配 3 个字以上的关键词，1~2 个字的关键词 (中文搜索最常见) 使用另一个只存索引的 FTS5 表
+events_grams：写入时把弹幕内容和用户名拆成单字和相邻两字 (由写入连接注册的 danmu_grams 函数生成)，
+标点、表情也作为字索引，只按空白分隔。
+分页使用 id 游标 (before_id)，不使用 OFFSET，百万行数据下查询仍为毫秒级。
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger("DanmuHistory")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    room_id INTEGER,
+    title TEXT,
+    area TEXT,
+    started_at REAL,
+    ended_at REAL,
+    danmu_count INTEGER DEFAULT 0,
+    gift_count INTEGER DEFAULT 0,
+    interact_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER,
+    room_id INTEGER,
+    ts REAL,
+    type TEXT,
+    uid INTEGER,
+    uname TEXT,
+    msg TEXT,
+    gift_name TEXT,
+    num INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_events_session ON events(session_id, id);
+CREATE INDEX IF NOT EXISTS idx_events_uid ON events(uid, id);
+CREATE INDEX IF NOT EXISTS idx_events_type ON events(type, id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    msg, uname, content='events', content_rowid='id', tokenize='{tokenize}'
+);
+CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events
+WHEN new.type = 'danmu' BEGIN
+    INSERT INTO events_fts(rowid, msg, uname) VALUES (new.id, new.msg, new.uname);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events
+WHEN old.type = 'danmu' BEGIN
+    INSERT INTO events_fts(events_fts, rowid, msg, uname) VALUES ('delete', old.id, old.msg, old.uname);
+END;
+"""
+
+GRAMS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS events_grams USING fts5(
+    grams, content='', tokenize="unicode61 categories 'L* M* N* P* S* Co'"
+);
+CREATE TRIGGER IF NOT EXISTS events_grams_insert AFTER INSERT ON events
+WHEN new.type = 'danmu' BEGIN
+    INSERT INTO events_grams(rowid, grams) VALUES (new.id, danmu_grams(new.msg, new.uname));
+END;
+CREATE TRIGGER IF NOT EXISTS events_grams_delete AFTER DELETE ON events
+WHEN old.type = 'danmu' BEGIN
+    INSERT INTO events_grams(events_grams, rowid, grams) VALUES ('delete', old.id, danmu_grams(old.msg, old.uname));
+END;
+"""
+# events_grams 索引的最长关键词
+GRAM_MAX = 2
+
+EVENT_COLUMNS = "id, session_id, room_id, ts, type, uid, uname, msg, gift_name, num"
+EVENT_COLUMNS_E = ", ".join("e." + c for c in EVENT_COLUMNS.split(", "))
+INSERT_EVENT = f"INSERT INTO events ({EVENT_COLUMNS}) VALUES (NULL,?,?,?,?,?,?,?,?,?)"
+STORED_TYPES = ('danmu', 'gift', 'interact')
+
+
+def danmu_grams(*texts):
+    """短关键词索引的内容：每段文本 (按空白切分) 的单字和相邻两字，空格分隔"""
+    grams = []
+    for text in texts:
+        if not text:
+            continue
+        for part in text.lower().split():
+            grams.extend(part)
+            grams.extend(part[i:i + GRAM_MAX] for i in range(len(part) - 1))
+    return " ".join(grams)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # events_grams 的触发器调用，写入 events 的连接都需要注册
+    conn.create_function("danmu_grams", -1, danmu_grams, deterministic=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class DanmuHistory:
+    def __init__(self, path, interval=0.5, max_batch=1000, max_queue=100000):
+        """
+        :param interval: 写入线程最多等待多久 (秒) 提交一批
+        :param max_batch: 每个事务最多写入的事件数
+        :param max_queue: 队列上限，写入跟不上时丢弃最早的事件
+        """
+        self.path = path
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.read_lock = threading.Lock()
+        self.stats = {"written": 0, "batches": 0, "dropped": 0, "last_batch_ms": 0.0, "max_batch_ms": 0.0}
+
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA.format(tokenize='trigram'))
+            self.tokenizer = 'trigram'
+        except sqlite3.OperationalError:
+            # SQLite < 3.34 不支持 trigram
+            conn.executescript(FTS_SCHEMA.format(tokenize='unicode61'))
+            self.tokenizer = 'unicode61'
+        has_grams = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_grams'").fetchone()
+        conn.executescript(GRAMS_SCHEMA)
+        if not has_grams:
+            # 旧版本创建的数据库：为已有的弹幕建立短关键词索引
+            conn.execute("INSERT INTO events_grams(rowid, grams) "
+                         "SELECT id, danmu_grams(msg, uname) FROM events WHERE type = 'danmu'")
+        conn.commit()
+        self.reader = conn
+        self.session_id = None  # 仅由写入线程修改
+
+    # --- 写入 ---
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="DanmuHistory", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止写入线程，写完队列中剩余的事件"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _put(self, item):
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.stats["dropped"] += 1
+            self.queue.append(item)
+            if len(self.queue) >= self.max_batch:
+                self.cond.notify()
+
+    def record(self, event):
+        """记录一个事件 (弹幕事件循环线程调用，只入队)；进行中的礼物连击只记录最终结果"""
+        event_type = event.get('type')
+        if event_type not in STORED_TYPES or event.get('final') is False:
+            return
+        self._put(("event", time.time(), event))
+
+    def start_session(self, room_id, title="", area=""):
+        """开始新场次 (开播时调用)，之后的事件归入该场次"""
+        self._put(("start", time.time(), (room_id, title, area)))
+
+    def end_session(self):
+        self._put(("end", time.time(), None))
+
+    def _run(self):
+        conn = _connect(self.path)
+        try:
+            while True:
+                with self.cond:
+                    if self.running and len(self.queue) < self.max_batch:
+                        self.cond.wait(self.interval)
+                    n = min(len(self.queue), self.max_batch)
+                    items = [self.queue.popleft() for _ in range(n)]
+                    running = self.running
+                if items:
+                    try:
+                        self._write(conn, items)
+                    except Exception as e:
+                        logger.error(f"Write danmu history failed: {e}")
+                if not running and not self.queue:
+                    break
+            self._end_session(conn, time.time())
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _write(self, conn, items):
+        start = time.perf_counter()
+        rows = []
+        with conn:
+            for kind, ts, payload in items:
+                if kind == "event":
+                    if self.session_id is None:
+                        self._start_session(conn, ts, payload.get('room_id'), "", "")
+                    rows.append(self._row(ts, payload))
+                    continue
+                # 场次变化前先写入之前的事件
+                self._insert(conn, rows)
+                rows = []
+                if kind == "start":
+                    self._end_session(conn, ts)
+                    self._start_session(conn, ts, *payload)
+                elif kind == "end":
+                    self._end_session(conn, ts)
+            self._insert(conn, rows)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats["written"] += sum(1 for kind, _, _ in items if kind == "event")
+        self.stats["batches"] += 1
+        self.stats["last_batch_ms"] = elapsed_ms
+        self.stats["max_batch_ms"] = max(self.stats["max_batch_ms"], elapsed_ms)
+
+    def _insert(self, conn, rows):
+        """写入同一场次的一批事件，并更新场次的事件数量 (列表页不需要 COUNT)"""
+        if not rows:
+            return
+        conn.executemany(INSERT_EVENT, rows)
+        counts = {t: 0 for t in STORED_TYPES}
+        for row in rows:
+            counts[row[3]] += 1
+        conn.execute("UPDATE sessions SET danmu_count = danmu_count + ?, gift_count = gift_count + ?, "
+                     "interact_count = interact_count + ? WHERE id = ?",
+                     (counts['danmu'], counts['gift'], counts['interact'], rows[0][0]))
+
+    def _row(self, ts, event):
+        uid = event.get('uid')
+        try:
+            uid = int(uid) if uid else None
+        except (TypeError, ValueError):
+            uid = None
+        num = event.get('num')
+        try:
+            num = int(num) if num is not None else None
+        except (TypeError, ValueError):
+            num = None
+        return (self.session_id, event.get('room_id'), ts, event.get('type'), uid, event.get('uname'),
+                event.get('msg'), event.get('gift_name'), num)
+
+    def _start_session(self, conn, ts, room_id, title, area):
+        cur = conn.execute("INSERT INTO sessions (room_id, title, area, started_at) VALUES (?,?,?,?)",
+                           (room_id, title, area, ts))
+        self.session_id = cur.lastrowid
+
+    def _end_session(self, conn, ts):
+        if self.session_id is not None:
+            conn.execute("UPDATE sessions SET ended_at = ? WHERE id = ?", (ts, self.session_id))
+            self.session_id = None
+
+    # --- 查询 ---
+    def _query(self, sql, params):
+        with self.read_lock:
+            return [dict(row) for row in self.reader.execute(sql, params).fetchall()]
+
+    def list_sessions(self, before_id=None, limit=20):
+        """场次列表 (新的在前)，附带各类事件数量"""
+        sql = "SELECT * FROM sessions"
+        params = []
+        if before_id:
+            sql += " WHERE id < ?"
+            params.append(before_id)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return self._page(self._query(sql, params), limit)
+
+    def query_events(self, session_id=None, event_type=None, uid=None, before_id=None, limit=50):
+        """按场次 / 类型 / 用户筛选事件 (新的在前)"""
+        where = []
+        params = []
+        if session_id:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if event_type:
+            where.append("type = ?")
+            params.append(event_type)
+        if uid:
+            where.append("uid = ?")
+            params.append(uid)
+        if before_id:
+            where.append("id < ?")
+            params.append(before_id)
+        sql = f"SELECT {EVENT_COLUMNS} FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return self._page(self._query(sql, params), limit)
+
+    def search(self, keyword, session_id=None, before_id=None, limit=50):
+        """全文搜索弹幕内容和用户名 (新的在前)"""
+        keyword = (keyword or "").strip()
+        if not keyword:
+            return self._page([], limit)
+        params = []
+        if len(keyword) <= GRAM_MAX:
+            # 1~2 个字 (trigram 索引无法匹配)：短关键词索引
+            sql = (f"SELECT {EVENT_COLUMNS_E} FROM events_grams JOIN events e ON e.id = events_grams.rowid "
+                   "WHERE events_grams MATCH ?")
+            params.append('"' + keyword.lower().replace('"', '""') + '"')
+            id_column = "events_grams.rowid"
+        else:
+            sql = (f"SELECT {EVENT_COLUMNS_E} FROM events_fts JOIN events e ON e.id = events_fts.rowid "
+                   "WHERE events_fts MATCH ?")
+            params.append('"' + keyword.replace('"', '""') + '"')
+            id_column = "events_fts.rowid"
+        if session_id:
+            sql += " AND e.session_id = ?"
+            params.append(session_id)
+        if before_id:
+            sql += f" AND {id_column} < ?"
+            params.append(before_id)
+        sql += f" ORDER BY {id_column} DESC LIMIT ?"
+        params.append(limit)
+        return self._page(self._query(sql, params), limit)
+
+    @staticmethod
+    def _page(items, limit):
+        """分页结果：下一页传入 next_before_id"""
+        return {
+            "items": items,
+            "next_before_id": items[-1]["id"] if len(items) == limit else None,
+        }
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queue"] = len(self.queue)
+        stats["tokenizer"] = self.tokenizer
+        return stats
+
+    def close(self):
+        self.stop()
+        with self.read_lock:
+            self.reader.close()
@@ -0,0 +1,140 @@
+"""
+说明：弹幕 WebSocket 协议帧解析
+
+一帧 (WebSocket binary message) 内可能包含多个数据包，每个数据包由 16 字节头 `!IHHII`
+(packet_len, header_len, proto_ver, operation, seq) 和包体组成；proto_ver 为 2/3 时包体是
+zlib/brotli 压缩后的若干数据包，需要解压后继续解析。
+
+这里基于 memoryview + struct.unpack_from 实现，不对包体做切片拷贝，嵌套的压缩包通过显式栈遍历，
+不递归调用。
+"""
+
+import re
+import json
+import struct
+import zlib
+
+import brotli
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HEADER = struct.Struct('!IHHII')
+HEADER_LEN = HEADER.size  # 16
+
+# 协议版本
+PROTO_JSON = 0
+PROTO_INT = 1
+PROTO_ZLIB = 2
+PROTO_BROTLI = 3
+
+# 操作码
+OP_HEARTBEAT = 2
+OP_HEARTBEAT_REPLY = 3
+OP_COMMAND = 5
+OP_AUTH = 7
+OP_AUTH_REPLY = 8
+
+
+# 命令包体以 {"cmd":"XXX" 开头，预读 cmd 时只匹配开头，不扫描整个包体
+CMD_PATTERN = re.compile(rb'\s*\{\s*"cmd"\s*:\s*"([^"\\]*)"')
+
+JSON_BACKEND = "orjson" if orjson else "json"
+
+
+class PacketError(ValueError):
+    """数据包格式错误"""
+
+
+def pack(operation, body=b'', proto_ver=PROTO_INT, seq=1):
+    """打包一个数据包"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return HEADER.pack(HEADER_LEN + len(body), HEADER_LEN, proto_ver, operation, seq) + body
+
+
+def peek_cmd(body):
+    """不解析 JSON，从原始包体中读取 cmd；无法识别时返回 None"""
+    m = CMD_PATTERN.match(body)
+    if m is None:
+        return None
+    return m.group(1).decode('utf-8', 'replace')
+
+
+def loads(body):
+    """解析 JSON 包体，安装了 orjson 时优先使用"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(str(body, 'utf-8'))
+
+
+def decompress(proto_ver, body):
+    """按协议版本解压包体"""
+    if proto_ver == PROTO_ZLIB:
+        return zlib.decompress(body)
+    if proto_ver == PROTO_BROTLI:
+        try:
+            return brotli.decompress(body)
+        except TypeError:
+            # brotlipy 不接受 memoryview
+            return brotli.decompress(bytes(body))
+    raise PacketError(f"Unknown compressed protover: {proto_ver}")
+
+
+def iter_packets(data):
+    """
+    遍历一帧内的全部数据包（含嵌套的压缩包）
+    :param data: bytes / bytearray / memoryview
+    :return: 依次产出 (operation, body)，body 为指向原缓冲区（或解压后缓冲区）的 memoryview
+    """
+    # 栈中每一项为 (缓冲区, 下一个数据包的偏移)。遇到压缩包时先压入外层剩余部分，
+    # 再压入解压后的缓冲区，保证产出顺序与递归解析一致。
+    unpack_from = HEADER.unpack_from
+    stack = [(memoryview(data), 0)]
+    while stack:
+        buf, offset = stack.pop()
+        end = len(buf)
+        while offset < end:
+            if end - offset < HEADER_LEN:
+                raise PacketError(f"Truncated header: {end - offset} bytes left")
+
+            packet_len, header_len, proto_ver, operation, _ = unpack_from(buf, offset)
+            next_offset = offset + packet_len
+            if header_len < HEADER_LEN or packet_len < header_len or next_offset > end:
+                raise PacketError(f"Bad header: packet_len={packet_len}, header_len={header_len}, "
+                                  f"{end - offset} bytes left")
+
+            if proto_ver == PROTO_ZLIB or proto_ver == PROTO_BROTLI:
+                if next_offset < end:
+                    stack.append((buf, next_offset))
+                stack.append((memoryview(decompress(proto_ver, buf[offset + header_len:next_offset])), 0))
+                break
+
+            yield operation, buf[offset + header_len:next_offset]
+            offset = next_offset
+
+
+def inflate_frame(data):
+    """
+    整帧只有一个压缩包时（服务端合并推送的常见形式）返回解压后的内层数据，否则原样返回
+    解压时会释放 GIL，适合放在线程池中执行
+    """
+    if len(data) >= HEADER_LEN:
+        packet_len, header_len, proto_ver, _, _ = HEADER.unpack_from(data, 0)
+        if (packet_len == len(data) and HEADER_LEN <= header_len <= packet_len
+                and proto_ver in (PROTO_ZLIB, PROTO_BROTLI)):
+            return decompress(proto_ver, memoryview(data)[header_len:])
+    return data
+
+
+def split_frame(data, copy=False):
+    """
+    解析整帧（含解压），一次性返回全部数据包，用于在进程池中解码
+    :param copy: 为 True 时 body 转为 bytes（进程池返回结果需要可序列化）
+    :return: [(operation, body), ...]
+    """
+    if copy:
+        return [(operation, bytes(body)) for operation, body in iter_packets(data)]
+    return list(iter_packets(data))
@@ -0,0 +1,182 @@
+"""
+说明：弹幕原始帧录制与回放
+
+录制文件为追加写入的二进制文件：
+    文件头  MAGIC(4) + 版本(1) + room_id(8) + 开始时间戳(8, unix 秒, double)
+    每一帧  相对开始时间的秒数(8, monotonic, double) + 长度(4) + 帧数据
+整个文件可选用 gzip 压缩 (后缀 .gz，默认不压缩：帧本身已压缩过)，读取时根据文件开头自动识别。
+
+回放时把录制的帧按原始时间间隔 (可加速) 或尽可能快地送入 DanmuService 的解码和命令处理流程，不需要网络。
+"""
+
+import asyncio
+import gzip
+import os
+import struct
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger("DanmuRecorder")
+
+MAGIC = b'BLDR'
+VERSION = 1
+FILE_HEADER = struct.Struct('!4sBQd')
+RECORD_HEADER = struct.Struct('!dI')
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class FrameRecorder:
+    """
+    录制一个直播间一次监听期间收到的全部原始帧
+
+    write 在弹幕事件循环中调用，只把帧加入队列；独立的写入线程每隔 flush_interval 秒批量写入文件，
+    事件循环不等待压缩和磁盘。帧本身已是 brotli / zlib 压缩数据，gzip 几乎不能再压缩，默认不压缩。
+    """
+
+    def __init__(self, path, room_id=0, compress=False, flush_interval=1.0, max_queue=100000):
+        """
+        :param flush_interval: 写入线程每批写入的间隔 (秒)
+        :param max_queue: 队列上限 (帧)，写入跟不上时丢弃最早的帧
+        """
+        self.path = path
+        self.room_id = room_id
+        self.compress = compress
+        self.flush_interval = flush_interval  # seconds
+        self.max_queue = max_queue
+        self.start = time.monotonic()
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.file = gzip.open(path, 'wb', compresslevel=6) if compress else open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, room_id, time.time()))
+        self.queue = deque()  # (相对时间, 帧数据)
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="DanmuRecorder", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def for_room(cls, directory, room_id, compress=False):
+        """在 directory 下按 房间号_开始时间 创建录制文件"""
+        name = f"{room_id}_{time.strftime('%Y%m%d_%H%M%S')}.bldr"
+        if compress:
+            name += ".gz"
+        return cls(os.path.join(directory, name), room_id, compress)
+
+    def write(self, data):
+        """加入一帧 (不阻塞)"""
+        if not self.running:
+            return
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append((time.monotonic() - self.start, data))
+        self.frames += 1
+        self.bytes += len(data)
+
+    def _run(self):
+        """写入线程：每隔 flush_interval 秒写入队列中的帧；停止时写完剩余的帧后关闭文件"""
+        while True:
+            with self.cond:
+                if self.running:
+                    self.cond.wait(self.flush_interval)
+                items = list(self.queue)
+                self.queue.clear()
+                running = self.running
+            try:
+                for ts, data in items:
+                    self.file.write(RECORD_HEADER.pack(ts, len(data)))
+                    self.file.write(data)
+                if items:
+                    self.file.flush()
+            except Exception as e:
+                logger.error(f"Write recording failed: {e}")
+            if not running:
+                break
+        try:
+            self.file.close()
+        except Exception as e:
+            logger.error(f"Close recording failed: {e}")
+
+    def close(self):
+        """停止写入线程，写完队列中剩余的帧并关闭文件"""
+        if not self.running:
+            return
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout=5)
+        logger.info(f"Recorded {self.frames} frames ({self.bytes} bytes) to {self.path}"
+                    + (f", dropped {self.dropped}" if self.dropped else ""))
+
+
+def _open(path):
+    with open(path, 'rb') as f:
+        head = f.read(2)
+    return gzip.open(path, 'rb') if head == GZIP_MAGIC else open(path, 'rb')
+
+
+def read_header(path):
+    """读取文件头，返回 (room_id, 开始时间戳)"""
+    with _open(path) as f:
+        magic, version, room_id, started_at = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Not a danmu recording: {path}")
+    return room_id, started_at
+
+
+def read_frames(path):
+    """依次产出 (相对时间, 帧数据)；文件末尾不完整的记录 (录制时进程中断) 会被忽略"""
+    with _open(path) as f:
+        magic, version, _, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a danmu recording: {path}")
+        while True:
+            head = f.read(RECORD_HEADER.size)
+            if len(head) < RECORD_HEADER.size:
+                return
+            ts, length = RECORD_HEADER.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield ts, data
+
+
+class FrameReplayer:
+    """把录制的帧送入 DanmuService 的解码和命令处理流程"""
+
+    def __init__(self, danmu_service, path, speed=1.0):
+        """
+        :param speed: 回放倍速，1 为原速，None 或 0 表示不等待、尽可能快
+        """
+        self.service = danmu_service
+        self.path = path
+        self.speed = speed
+        self.stats = {"frames": 0, "bytes": 0, "elapsed": 0.0}
+
+    async def run(self):
+        room_id, _ = read_header(self.path)
+        # 离线回放不访问网络：缺失的头像不再批量获取
+        face_fetch_enabled, self.service.face_fetch_enabled = self.service.face_fetch_enabled, False
+        start = time.monotonic()
+        try:
+            for ts, data in read_frames(self.path):
+                if self.speed:
+                    delay = ts / self.speed - (time.monotonic() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await self.service._decode_packet(data, room_id or None)
+                self.stats["frames"] += 1
+                self.stats["bytes"] += len(data)
+            # 回放结束时推送还在合并中的礼物连击
+            self.service.flush_gifts()
+        finally:
+            self.service.face_fetch_enabled = face_fetch_enabled
+        self.stats["elapsed"] = time.monotonic() - start
+        return self.stats
@@ -0,0 +1,97 @@
+"""
+说明：uid -> 头像 (face) 缓存
+
+DANMU_MSG 只有部分消息带头像，COMBO_SEND 不带头像。从带头像的消息 (SEND_GIFT、V15 DANMU_MSG 等) 中学习，
+LRU 淘汰，退出时保存到磁盘，下次启动时加载。
+缓存中没有的 uid 由 DanmuService 攒批后通过 user/cards 接口批量获取。
+"""
+
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("FaceCache")
+
+
+class FaceCache:
+    def __init__(self, path=None, max_size=5000, miss_ttl=600):
+        """
+        :param path: 持久化文件路径，None 表示不保存
+        :param max_size: 最多缓存的 uid 数量
+        :param miss_ttl: 获取失败的 uid 在这段时间内 (秒) 不再重复获取
+        """
+        self.path = path
+        self.max_size = max_size
+        self.miss_ttl = miss_ttl
+        self._faces = OrderedDict()
+        self._misses = OrderedDict()  # uid -> 获取失败的时间
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0, "learned": 0, "fetched": 0, "evictions": 0}
+
+    def get(self, uid):
+        face = self._faces.get(uid)
+        if face is None:
+            self.stats["misses"] += 1
+            return None
+        self._faces.move_to_end(uid)
+        self.stats["hits"] += 1
+        return face
+
+    def put(self, uid, face, fetched=False):
+        if not uid or not face:
+            return
+        faces = self._faces
+        if faces.get(uid) != face:
+            faces[uid] = face
+            self.dirty = True
+            self.stats["fetched" if fetched else "learned"] += 1
+        faces.move_to_end(uid)
+        self._misses.pop(uid, None)
+        if len(faces) > self.max_size:
+            faces.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def should_fetch(self, uid):
+        """uid 不在缓存中，且最近没有获取失败"""
+        if not uid or uid in self._faces:
+            return False
+        failed_at = self._misses.get(uid)
+        return failed_at is None or time.monotonic() - failed_at >= self.miss_ttl
+
+    def mark_missing(self, uid):
+        self._misses[uid] = time.monotonic()
+        self._misses.move_to_end(uid)
+        if len(self._misses) > self.max_size:
+            self._misses.popitem(last=False)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 文件中按最近使用顺序保存
+            for uid, face in data.items():
+                self._faces[int(uid)] = face
+            while len(self._faces) > self.max_size:
+                self._faces.popitem(last=False)
+            logger.info(f"Loaded {len(self._faces)} cached faces")
+        except Exception as e:
+            logger.error(f"Load face cache failed: {e}")
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self._faces), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            logger.error(f"Save face cache failed: {e}")
+
+    def get_stats(self):
+        return dict(self.stats, size=len(self._faces), max_size=self.max_size)
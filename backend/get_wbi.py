@@ -10,11 +10,13 @@ wbi算法来源：https://github.com/SocialSisterYi/bilibili-API-collect/blob/ma
 更新时间：2025-02-11
 """
 
-from functools import reduce
 from hashlib import md5
+from operator import itemgetter
+import threading
 import urllib.parse
 import time
-import requests
+
+from backend import util
 
 # 打乱映射表
 mixinKeyEncTab = [
@@ -23,40 +25,64 @@ mixinKeyEncTab = [
     61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
     36, 20, 34, 44, 52
 ]
+# mixin key 只取前 32 位，预先取出对应的下标
+_mixinKeyGetter = itemgetter(*mixinKeyEncTab[:32])
+# 签名前需要从 value 中去掉的字符
+_filterTable = str.maketrans('', '', "!'()*")
+
+# img_key / sub_key 每天 0 点 (北京时间) 轮换
+ROTATE_OFFSET = 8 * 3600
+MAX_KEY_TTL = 12 * 3600
+# 签名校验失败的返回码，收到后需要强制刷新 key
+SIGN_ERROR_CODES = (-352, -403)
 
 
 def getMixinKey(orig: str):
     """对 imgKey 和 subKey 进行字符顺序打乱编码"""
-    return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
+    return ''.join(_mixinKeyGetter(orig))
 
 
-def encWbi(params: dict, img_key: str, sub_key: str):
-    """为请求参数进行 wbi 签名"""
-    mixin_key = getMixinKey(img_key + sub_key)
-    curr_time = round(time.time())
-    params['wts'] = curr_time  # 添加 wts 字段
-    params = dict(sorted(params.items()))  # 按照 key 重排参数
-    # 过滤 value 中的 "!'()*" 字符
-    params = {
-        k: ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
-        for k, v
-        in params.items()
-    }
+def signParams(params: dict, mixin_key: str):
+    """用 mixin key 为请求参数进行 wbi 签名"""
+    params['wts'] = round(time.time())  # 添加 wts 字段
+    # 按照 key 重排参数，并过滤 value 中的 "!'()*" 字符
+    params = {k: str(params[k]).translate(_filterTable) for k in sorted(params)}
     query = urllib.parse.urlencode(params)  # 序列化参数
-    wbi_sign = md5((query + mixin_key).encode()).hexdigest()  # 计算 w_rid
-    params['w_rid'] = wbi_sign
+    params['w_rid'] = md5((query + mixin_key).encode()).hexdigest()  # 计算 w_rid
     return params
 
 
-def getWbiKeys() -> tuple[str, str]:
+def encWbi(params: dict, img_key: str, sub_key: str):
+    """为请求参数进行 wbi 签名"""
+    return signParams(params, getMixinKey(img_key + sub_key))
+
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Referer': 'https://www.bilibili.com/'
+}
+
+# 未指定 session 时使用的共享连接 (不携带账户 cookie)
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = util.create_session(headers)
+    return _session
+
+
+def getWbiKeys(session=None) -> tuple[str, str]:
     """获取最新的 img_key 和 sub_key"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-        'Referer': 'https://www.bilibili.com/'
-    }
-    resp = requests.get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
+    session = session or _get_session()
+    resp = session.get('https://api.bilibili.com/x/web-interface/nav', headers=headers, timeout=10)
     resp.raise_for_status()
-    json_content = resp.json()
+    return parse_wbi_keys(resp.json())
+
+
+def parse_wbi_keys(json_content: dict) -> tuple[str, str]:
+    """从 nav 接口的返回中取出 img_key 和 sub_key"""
     img_url: str = json_content['data']['wbi_img']['img_url']
     sub_url: str = json_content['data']['wbi_img']['sub_url']
     img_key = img_url.rsplit('/', 1)[1].split('.')[0]
@@ -64,15 +90,84 @@ def getWbiKeys() -> tuple[str, str]:
     return img_key, sub_key
 
 
-def get_w_rid_and_wts(other_data_dict: dict) -> tuple[dict, str]:
+class WbiKeyCache:
+    """
+    缓存 img_key / sub_key 及其 mixin key，有效期到下一次轮换 (北京时间 0 点，最长 MAX_KEY_TTL)
+    签名校验失败时调用 invalidate 强制下次重新获取
+
+    lock 只在替换 key 时短暂持有 (弹幕事件循环也会调用 set / invalidate)；
+    同步获取 key 的网络请求由 fetch_lock 保证同时只有一个，不会让事件循环等待网络请求
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.mixin_key = None
+        self.expires_at = 0.0
+        self.stats = {"hits": 0, "fetches": 0, "invalidations": 0}
+
+    @staticmethod
+    def next_rotation(now):
+        day = 86400
+        return (now + ROTATE_OFFSET) // day * day + day - ROTATE_OFFSET
+
+    def get(self):
+        """返回有效期内的 mixin key，已过期或未获取时返回 None"""
+        if self.mixin_key and time.time() < self.expires_at:
+            self.stats["hits"] += 1
+            return self.mixin_key
+        return None
+
+    def set(self, img_key, sub_key):
+        now = time.time()
+        with self.lock:
+            self.mixin_key = getMixinKey(img_key + sub_key)
+            self.expires_at = min(self.next_rotation(now), now + MAX_KEY_TTL)
+            self.stats["fetches"] += 1
+            return self.mixin_key
+
+    def invalidate(self):
+        with self.lock:
+            self.mixin_key = None
+            self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        return dict(self.stats, expires_in=max(0.0, self.expires_at - time.time()) if self.mixin_key else 0.0)
+
+
+key_cache = WbiKeyCache()
+
+
+def prime_from_nav(json_content: dict):
+    """nav 接口 (获取用户信息) 的返回中也带有 wbi key，顺便写入缓存，省去之后单独请求"""
+    try:
+        key_cache.set(*parse_wbi_keys(json_content))
+    except (KeyError, TypeError, IndexError, AttributeError):
+        pass
+
+
+def get_mixin_key(session=None) -> str:
+    """获取 mixin key，有效期内不发起请求"""
+    mixin_key = key_cache.get()
+    if mixin_key:
+        return mixin_key
+    with key_cache.fetch_lock:
+        # 等待期间其他线程可能已经获取
+        mixin_key = key_cache.get()
+        if mixin_key:
+            return mixin_key
+        img_key, sub_key = getWbiKeys(session)
+        return key_cache.set(img_key, sub_key)
+
+
+def get_w_rid_and_wts(other_data_dict: dict, session=None) -> tuple[dict, str]:
     """
     获取w_rid和wts
     :param other_data_dict: 其他参数
+    :param session: 获取 key 使用的 requests.Session，默认使用模块共享的连接
     :return: 返回的第一个值是含有签名的dict形式，第二个是写入url中的query形式
     """
-    img_key, sub_key = getWbiKeys()
-
-    signed_params = encWbi(params=other_data_dict, img_key=img_key, sub_key=sub_key)
+    signed_params = signParams(other_data_dict, get_mixin_key(session))
     query = urllib.parse.urlencode(signed_params)
 
     return signed_params, query
@@ -0,0 +1,186 @@
+"""
+说明：弹幕关键词过滤 / 高亮
+
+屏蔽词、高亮词、标签词列表 (各数千条) 编译成一个 Aho-Corasick 自动机，每条弹幕只扫描一遍文本，
+耗时与关键词数量无关。规则变更时在调用线程中构建新的自动机，构建完成后整体替换 (一次属性赋值)，
+弹幕事件循环中正在进行的匹配不受影响。
+"""
+
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger("KeywordFilter")
+
+ACTION_HIDE = "hide"
+ACTION_HIGHLIGHT = "highlight"
+ACTION_TAG = "tag"
+
+
+class AhoCorasick:
+    """多模式串匹配自动机 (不区分大小写)"""
+
+    def __init__(self, patterns):
+        """
+        :param patterns: 模式串列表，匹配结果为模式串在列表中的下标
+        """
+        self.patterns = list(patterns)
+        goto = [{}]
+        out = [()]
+        for index, pattern in enumerate(self.patterns):
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            out[node] = out[node] + (index,)
+
+        # BFS 计算失配指针，并把失配链上的输出合并到当前节点，匹配时不需要沿失配链查找输出
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def search(self, text):
+        """返回 text 中出现的模式串下标集合"""
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        node = 0
+        found = set()
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+def _check_words(words, name):
+    if words is None:
+        return
+    if not isinstance(words, (list, tuple)):
+        raise ValueError(f"{name} 应为关键词列表")
+    for word in words:
+        if not isinstance(word, str):
+            raise ValueError(f"{name} 中的关键词应为字符串: {word!r}")
+
+
+def validate_rules(rules):
+    """检查规则格式，格式错误时抛出 ValueError (消息可直接显示给用户)"""
+    if not isinstance(rules, dict):
+        raise ValueError("规则格式错误")
+    _check_words(rules.get(ACTION_HIDE), ACTION_HIDE)
+    _check_words(rules.get(ACTION_HIGHLIGHT), ACTION_HIGHLIGHT)
+    tags = rules.get("tags")
+    if tags is None:
+        return
+    if not isinstance(tags, dict):
+        raise ValueError("tags 应为 {标签: [关键词...]}")
+    for tag, words in tags.items():
+        if not isinstance(tag, str) or not tag:
+            raise ValueError(f"标签名应为非空字符串: {tag!r}")
+        _check_words(words, f"tags.{tag}")
+
+
+class KeywordFilter:
+    def __init__(self):
+        self._compiled = None  # (AhoCorasick, [(action, tag)])，整体替换
+        self.rules = {}
+        self.stats = {"checked": 0, "matched": 0, "hidden": 0, "highlighted": 0, "tagged": 0,
+                      "check_ms": 0.0, "patterns": 0, "build_ms": 0.0}
+
+    def set_rules(self, rules):
+        """
+        设置规则并重新编译 (在调用线程中构建，完成后替换)
+        :param rules: {"hide": [词...], "highlight": [词...], "tags": {"标签": [词...]}}
+        :raises ValueError: 规则格式错误，此时保留当前规则
+        """
+        validate_rules(rules)
+        patterns = []
+        actions = []
+        for word in rules.get(ACTION_HIDE) or []:
+            patterns.append(word)
+            actions.append((ACTION_HIDE, None))
+        for word in rules.get(ACTION_HIGHLIGHT) or []:
+            patterns.append(word)
+            actions.append((ACTION_HIGHLIGHT, None))
+        for tag, words in (rules.get("tags") or {}).items():
+            for word in words:
+                patterns.append(word)
+                actions.append((ACTION_TAG, tag))
+
+        start = time.perf_counter()
+        automaton = AhoCorasick(patterns) if patterns else None
+        build_ms = (time.perf_counter() - start) * 1000
+        self._compiled = (automaton, actions) if automaton else None
+        self.rules = rules
+        self.stats["patterns"] = len(patterns)
+        self.stats["build_ms"] = build_ms
+        logger.info(f"Keyword filter compiled: {len(patterns)} patterns in {build_ms:.1f}ms")
+
+    def apply(self, event):
+        """
+        过滤一条弹幕事件：命中屏蔽词返回 None；命中高亮词 / 标签词时在事件上标记 highlight / tags / keywords
+        """
+        compiled = self._compiled
+        if compiled is None:
+            return event
+        automaton, actions = compiled
+        stats = self.stats
+        start = time.perf_counter()
+        found = automaton.search(event.get('msg') or '')
+        stats["checked"] += 1
+        if not found:
+            stats["check_ms"] += (time.perf_counter() - start) * 1000
+            return event
+
+        stats["matched"] += 1
+        highlight = False
+        tags = []
+        for index in found:
+            action, tag = actions[index]
+            if action == ACTION_HIDE:
+                stats["hidden"] += 1
+                stats["check_ms"] += (time.perf_counter() - start) * 1000
+                return None
+            if action == ACTION_HIGHLIGHT:
+                highlight = True
+            elif tag not in tags:
+                tags.append(tag)
+        if highlight:
+            event['highlight'] = True
+            stats["highlighted"] += 1
+        if tags:
+            event['tags'] = tags
+            stats["tagged"] += 1
+        event['keywords'] = sorted({automaton.patterns[i] for i in found})
+        stats["check_ms"] += (time.perf_counter() - start) * 1000
+        return event
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["avg_check_us"] = stats["check_ms"] * 1000 / stats["checked"] if stats["checked"] else 0.0
+        return stats
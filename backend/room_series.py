@@ -0,0 +1,69 @@
+"""
+说明：直播间人气值 / 看过人数 / 高能榜人数时间序列
+
+每次收到心跳回复 (op 3，约 30 秒一次) 记录一个采样点：人气值，以及最近一次 WATCHED_CHANGE、ONLINE_RANK_COUNT 的值。
+采样点保存在固定大小的环形缓冲区中，超出后覆盖最早的采样点，长时间直播时内存占用不变。
+sample 在弹幕事件循环线程调用，get_series 在 pywebview 线程调用，写入采样点和复制序列都在 lock 内进行。
+"""
+
+import threading
+import time
+
+FIELDS = ("popularity", "watched", "online_rank")
+
+
+class RoomSeries:
+    def __init__(self, capacity=2880):
+        """
+        :param capacity: 最多保留的采样点数，默认 2880 个 (30 秒一次约 24 小时)
+        """
+        self.capacity = capacity
+        self.ts = [0.0] * capacity
+        self.columns = {name: [0] * capacity for name in FIELDS}
+        self.start = 0  # 最早采样点的下标
+        self.size = 0
+        # 最近一次收到的 WATCHED_CHANGE / ONLINE_RANK_COUNT，在下一个采样点记录
+        self.latest = {"watched": 0, "online_rank": 0}
+        self.lock = threading.Lock()
+
+    def update(self, name, value):
+        """记录最近一次收到的 看过人数 / 高能榜人数"""
+        self.latest[name] = value
+
+    def sample(self, popularity, ts=None):
+        """心跳回复时记录一个采样点"""
+        with self.lock:
+            i = (self.start + self.size) % self.capacity
+            if self.size == self.capacity:
+                self.start = (self.start + 1) % self.capacity
+            else:
+                self.size += 1
+            self.ts[i] = time.time() if ts is None else ts
+            self.columns["popularity"][i] = popularity
+            self.columns["watched"][i] = self.latest["watched"]
+            self.columns["online_rank"][i] = self.latest["online_rank"]
+
+    def _ordered(self, column):
+        end = self.start + self.size
+        if end <= self.capacity:
+            return column[self.start:end]
+        return column[self.start:] + column[:end - self.capacity]
+
+    def get_series(self, points=120):
+        """
+        按时间顺序返回各序列，超过 points 个采样点时等分成 points 段，每段取平均值 (时间取段内最后一个)
+        :return: {"ts": [...], "popularity": [...], "watched": [...], "online_rank": [...]}
+        """
+        with self.lock:
+            ts = self._ordered(self.ts)
+            series = {name: self._ordered(column) for name, column in self.columns.items()}
+        n = len(ts)
+        if points <= 0 or n <= points:
+            return dict(series, ts=ts)
+
+        bounds = [n * k // points for k in range(points + 1)]
+        out = {"ts": [ts[bounds[k + 1] - 1] for k in range(points)]}
+        for name, values in series.items():
+            out[name] = [round(sum(values[bounds[k]:bounds[k + 1]]) / (bounds[k + 1] - bounds[k]))
+                         for k in range(points)]
+        return out
@@ -20,7 +20,7 @@ class AuthService:
                 csrf = cookies.get('bili_jct', '')
                 room_id = self.user_service.fetch_room_id(cookies)
                 if not room_id: return {"code": -1, "msg": "获取直播间ID失败"}
-                ok, full_data = self.user_service.fetch_full_user_data()
+                ok, full_data = self.user_service.fetch_full_user_data(force=True)
                 if ok:
                     uid = str(cookies.get("DedeUserID"))
                     cookie_str = "; ".join([f"{k}={v}" for k, v in cookies.items()])
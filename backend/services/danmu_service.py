@@ -1,32 +1,160 @@
 import asyncio
 import json
+import time
 import logging
 import struct
-import zlib
 import base64
+import random
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 
-import brotli
 import aiohttp
-from backend import get_wbi
 from backend import util
+from backend.async_bilibili_api import AsyncBilibiliApi
 from backend import dm_pb2
+from backend import danmu_protocol
+from backend.danmu_recorder import FrameRecorder
+from backend.danmu_filters import InteractDeduper, GiftAggregator
+from backend.face_cache import FaceCache
+from backend.room_series import RoomSeries
+from backend.danmu_analytics import DanmuAnalytics
+from backend.keyword_filter import KeywordFilter
 
 logger = logging.getLogger("DanmuService")
 
-class DanmuService:
-    def __init__(self, api_client, session_state):
-        self.api = api_client
-        self.state = session_state
+# 帧解码位置
+# 默认在事件循环内解码、每 yield_every 个数据包让出一次，单次占用事件循环的时间已很短
+# (benchmarks/bench_decode_offload.py：最长约 2.4ms)。线程池解压在实测中没有收益；
+# 进程池整帧解码要把全部数据包传回事件循环，最长阻塞反而升到约 87ms，已移除。
+DECODE_INLINE = "off"        # 在事件循环线程内解码
+DECODE_THREAD = "thread"     # 超过阈值的帧在线程池中解压 (brotli / zlib 解压时会释放 GIL)
+
+class DanmuAuthError(ConnectionError):
+    """弹幕服务器认证失败 (token 失效等)"""
+
+
+class DanmuRoom:
+    """单个直播间的弹幕连接状态，每个直播间有独立的连接、心跳和重连计数"""
+    def __init__(self, room_id, max_reconnect_attempts=5, reconnect_delay=5):
+        self.room_id = room_id
         self.ws = None
         self.running = False
         self.heartbeat_task = None
         self.receive_task = None
+        self.reconnect_task = None
+        self.reconnect_attempts = 0
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnect_delay = reconnect_delay  # seconds
+        self.ws_url = ""
+        self.connected_at = 0.0
+        self.frames = 0
+        self.disconnected_at = 0.0  # monotonic，断线后第一次安排重连的时间
+        self.reconnects = 0
+        self.last_reconnect_ms = 0.0
+        self.recorder = None
+        self.series = RoomSeries()  # 人气值 / 看过人数 / 高能榜人数，每次心跳回复采样
+        self.analytics = DanmuAnalytics()  # 弹幕数、发言人数、排行等实时统计
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    def to_dict(self):
+        return {
+            "room_id": self.room_id,
+            "running": self.running,
+            "connected": self.connected,
+            "ws_url": self.ws_url,
+            "reconnect_attempts": self.reconnect_attempts,
+            "connected_at": self.connected_at,
+            "frames": self.frames,
+            "reconnects": self.reconnects,
+            "last_reconnect_ms": self.last_reconnect_ms,
+            "recording": self.recorder.path if self.recorder else "",
+        }
+
+
+class DanmuService:
+    def __init__(self, api_client, session_state):
+        self.api = api_client
+        self.state = session_state
         self.message_callback = None
         self.log_callback = None
+        # 所有直播间共用一个 ClientSession (一个连接池)，运行在同一个事件循环中
         self.session = None
-        self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 5
-        self.reconnect_delay = 5  # seconds
+        # 事件循环中的 HTTP 请求 (getDanmuInfo、buvid3、uid、头像) 也使用该 ClientSession，不阻塞事件循环
+        self.async_api = AsyncBilibiliApi(api_client, self._get_session)
+        self.rooms = {}  # room_id -> DanmuRoom
+        self.max_rooms = 50
+        self.max_reconnect_attempts = 8
+        self.reconnect_delay = 1  # seconds，指数退避的基数
+        self.max_reconnect_delay = 30  # seconds
+        # getDanmuInfo 返回的 token 和主机列表缓存，重连时在有效期内直接复用
+        self.danmu_info_cache = {}  # room_id -> (danmu_info, monotonic 获取时间)
+        self.danmu_info_ttl = 600  # seconds
+        # 设置目录后，每个直播间每次监听收到的原始帧录制到该目录下的一个文件
+        self.record_dir = None
+        self.record_compress = False
+
+        # 连接时并发尝试的主机数、启动间隔和握手超时；各主机的握手成功率和延迟用于下次连接时排序
+        self.use_wss = True  # False 时使用 ws_port 明文连接 (本地测试服务器)
+        self.race_hosts = 3
+        self.race_stagger = 0.25  # seconds
+        self.handshake_timeout = 5  # seconds
+        self.host_stats = {}  # "host:port" -> {'success', 'fail', 'latency_ms'}
+
+        # 弹幕关键词屏蔽 / 高亮 / 标签，规则变更时整体替换编译好的自动机
+        self.keyword_filter = KeywordFilter()
+
+        # 交互消息 (进场 / 关注 / 分享) 去重
+        self.interact_deduper = InteractDeduper(window=10.0)
+        # 礼物连击合并，有进行中的连击时 gift_flush_task 定期推送累计数量和结束的连击
+        self.gift_aggregator = GiftAggregator(window=3.0)
+        self.gift_flush_interval = 0.25
+        self.gift_flush_task = None
+
+        # uid -> 头像缓存，缺失的头像攒批后由 face_fetch_task 批量获取 (face_fetch_enabled 为 False 时只使用缓存，离线回放 / 基准测试时关闭)
+        self.face_cache = FaceCache()
+        self.face_fetch_enabled = True
+        self.face_batch_size = 50
+        self.face_batch_delay = 0.5
+        self.max_face_pending = 1000
+        self._face_pending = {}  # uid -> None，按加入顺序
+        self.face_fetch_task = None
+
+        # 命令处理表：命令名 (去掉 :suffix) -> handler(command)，一次 dict 查找完成分发
+        self.command_handlers = {}
+        self._dispatch_cache = {}
+        self.register_handler('DANMU_MSG', self._on_danmu_msg)
+        self.register_handler('INTERACT_WORD', self._on_interact_word)
+        self.register_handler('INTERACT_WORD_V2', self._on_interact_word_v2)
+        self.register_handler('ENTRY_EFFECT', self._on_entry_effect)
+        self.register_handler('ENTRY_EFFECT_MUST_RECEIVE', self._on_entry_effect)
+        self.register_handler('SEND_GIFT', self._on_send_gift)
+        self.register_handler('COMBO_SEND', self._on_combo_send)
+        self.register_handler('WATCHED_CHANGE', self._on_watched_change)
+        self.register_handler('ONLINE_RANK_COUNT', self._on_online_rank_count)
+
+        # 可选：大帧解压卸载到线程池，小于阈值 (字节) 的帧仍在事件循环内解码
+        self.decode_offload = DECODE_INLINE
+        self.offload_threshold = 32 * 1024
+        self.decode_executor = None
+        # 一帧内每处理这么多个数据包让出一次事件循环，避免合并的大帧长时间占用事件循环
+        self.yield_every = 256
+
+        # 命令包解析统计 (跳过的为没有处理函数、未做 JSON 解析的命令)
+        self.decode_stats = {
+            'json_backend': danmu_protocol.JSON_BACKEND,
+            'parsed': 0,
+            'parsed_bytes': 0,
+            'skipped': 0,
+            'skipped_bytes': 0,
+            'inline_frames': 0,
+            'offloaded_frames': 0,
+            'offload_wait_ms': 0.0,     # 等待线程池的时间 (期间事件循环可运行其他协程)
+            'loop_blocking_ms': 0.0,    # 帧解码及命令处理占用事件循环线程的时间
+            'max_loop_blocking_ms': 0.0,  # 单次连续占用的最长时间
+        }
 
     def set_callback(self, callback):
         self.message_callback = callback
@@ -39,13 +167,34 @@ class DanmuService:
         if self.log_callback:
             self.log_callback(msg)
 
-    def _notify_frontend(self, msg_type, msg_content):
+    def _notify_frontend(self, msg_type, msg_content, room_id=None):
         """通知前端消息"""
-        if self.message_callback:
-            self.message_callback({
-                'type': 'system',
-                'msg': msg_content
-            })
+        self._emit({
+            'type': 'system',
+            'msg': msg_content,
+            'room_id': room_id
+        })
+
+    def set_decode_offload(self, mode, threshold=None):
+        """
+        设置大帧解码位置
+        :param mode: "off" / "thread"
+        :param threshold: 帧大小阈值 (字节)，小于阈值的帧在事件循环内解码
+        """
+        if mode not in (DECODE_INLINE, DECODE_THREAD):
+            logger.warning(f"Unknown decode offload mode: {mode}")
+            mode = DECODE_INLINE
+        if threshold is not None:
+            self.offload_threshold = threshold
+        if mode == self.decode_offload:
+            return
+
+        if self.decode_executor:
+            self.decode_executor.shutdown(wait=False)
+            self.decode_executor = None
+        if mode == DECODE_THREAD:
+            self.decode_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="DanmuDecode")
+        self.decode_offload = mode
 
     def _mask_string(self, s, visible_start=2, visible_end=2):
         """简单的字符串脱敏"""
@@ -53,9 +202,9 @@ class DanmuService:
             return "***"
         return s[:visible_start] + "***" + s[-visible_end:]
 
-    def send_danmu(self, msg):
-        """发送弹幕 (同步方法)"""
-        room_id = self.state.room_id
+    def send_danmu(self, msg, room_id=None):
+        """发送弹幕 (同步方法，会发起网络请求)；room_id 为空时发送到当前账号的直播间"""
+        room_id = room_id or self.state.room_id
         if not room_id:
             return {"code": -1, "msg": "未获取到房间ID"}
             
@@ -84,29 +233,12 @@ class DanmuService:
         else:
              return {"code": -1, "msg": "网络请求失败"}
 
-    async def get_danmu_info(self, room_id):
+    async def _fetch_danmu_info(self, room_id):
         """获取弹幕服务器信息"""
         try:
-            # 1. 准备参数
-            params = {
-                "id": room_id,
-                "type": 0
-            }
-            
-            # 2. 获取 Wbi 签名
-            signed_params, _ = get_wbi.get_w_rid_and_wts(params)
-
-            if 'buvid3' not in self.api.cookies:
-                buvid3 = self.api.get_buvid3()
-                if buvid3:
-                    self.api.cookies['buvid3'] = buvid3
-                    self._log(f"Fetched buvid3: {self._mask_string(buvid3, 4, 4)}")
-                else:
-                    logger.warning("Failed to fetch buvid3")
-            
-            # 3. 请求接口
-            success, res = self.api._req("GET", "https://api.live.bilibili.com/xlive/web-room/v1/index/getDanmuInfo", params=signed_params)
-            
+            await self._ensure_buvid3()
+            success, res = await self.async_api.get_danmu_info(room_id)
+
             if success and res['code'] == 0:
                 return res['data']
             else:
@@ -116,30 +248,35 @@ class DanmuService:
             logger.error(f"Error getting danmu info: {e}")
             return None
 
-    async def connect(self, room_id):
-        """连接弹幕服务器"""
-        if self.running:
-            await self.stop()
-
-        self.running = True
-        self.reconnect_attempts = 0
-        
-        await self._connect_internal(room_id)
-
-    async def _connect_internal(self, room_id):
-        """内部连接逻辑，支持重连"""
-        # 尝试获取 buvid3，如果不存在则先获取
+    async def get_danmu_info(self, room_id, use_cache=False):
+        """
+        获取弹幕服务器信息
+        :param use_cache: 为 True 时在有效期内直接使用缓存的 token 和主机列表
+        """
+        if use_cache:
+            cached = self.danmu_info_cache.get(room_id)
+            if cached and time.monotonic() - cached[1] < self.danmu_info_ttl:
+                return cached[0]
+
+        info = await self._fetch_danmu_info(room_id)
+        if info:
+            self.danmu_info_cache[room_id] = (info, time.monotonic())
+        return info
+
+    async def _ensure_buvid3(self):
+        """如果 cookies 中没有 buvid3 则先获取"""
         if 'buvid3' not in self.api.cookies:
-            buvid3 = self.api.get_buvid3()
+            buvid3 = await self.async_api.get_buvid3()
             if buvid3:
                 self.api.cookies['buvid3'] = buvid3
                 self._log(f"Fetched buvid3: {self._mask_string(buvid3, 4, 4)}")
             else:
                 logger.warning("Failed to fetch buvid3")
 
-        # 尝试获取 uid
+    async def _ensure_uid(self):
+        """尝试获取 uid"""
         if not self.state.uid:
-             success, res = self.api.get_user_info()
+             success, res = await self.async_api.get_user_info()
              if success and res['code'] == 0 and res['data']['isLogin']:
                  self.state.uid = res['data']['mid']
                  self._log(f"Fetched uid: {self._mask_string(str(self.state.uid), 2, 2)}")
@@ -147,317 +284,740 @@ class DanmuService:
                  self.state.uid = 0
                  self._log("User not logged in, using uid=0")
 
-        danmu_info = await self.get_danmu_info(room_id)
-        if not danmu_info:
-            self._handle_reconnect(room_id)
+    @property
+    def running(self):
+        return any(room.running for room in self.rooms.values())
+
+    async def _get_session(self):
+        """获取共用的 ClientSession"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_rooms * 2, ttl_dns_cache=300)
+            # 账户 cookie 由 async_api 每次随请求传入，不在 ClientSession 中保存 (切换账户后不会残留)
+            self.session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+        return self.session
+
+    async def connect(self, room_id):
+        """连接弹幕服务器 (已在监听的直播间会重新连接，不影响其他直播间)"""
+        return await self.start_room(room_id)
+
+    async def start_room(self, room_id):
+        """开始监听一个直播间"""
+        room_id = int(room_id)
+        room = self.rooms.get(room_id)
+        if room:
+            await self._close_room(room)
+        elif len(self.rooms) >= self.max_rooms:
+            logger.warning(f"Too many danmu rooms, max {self.max_rooms}")
             return False
 
-        token = danmu_info['token']
-        host_list = danmu_info['host_list']
-        
-        # 优先使用 wss
-        ws_url = f"wss://{host_list[0]['host']}:{host_list[0]['wss_port']}/sub"
-        
-        try:
-            # 确保之前的 session 已经关闭
+        room = DanmuRoom(room_id, self.max_reconnect_attempts, self.reconnect_delay)
+        room.running = True
+        if self.record_dir:
+            try:
+                room.recorder = FrameRecorder.for_room(self.record_dir, room_id, self.record_compress)
+            except Exception as e:
+                logger.error(f"Failed to start danmu recording: {e}")
+        self.rooms[room_id] = room
+        return await self._connect_internal(room)
+
+    async def stop_room(self, room_id):
+        """停止监听一个直播间"""
+        room = self.rooms.pop(int(room_id), None)
+        if not room:
+            return False
+        await self._release_room(room)
+        self._log(f"Danmu room {self._mask_string(str(room.room_id), 2, 2)} stopped")
+        return True
+
+    async def _release_room(self, room):
+        """关闭已从 rooms 中移除的直播间；没有其他直播间时保存头像缓存并关闭 ClientSession"""
+        await self._close_room(room)
+        if not self.rooms:
+            self.face_cache.save()
             if self.session:
                 await self.session.close()
+                self.session = None
 
-            self.session = aiohttp.ClientSession()
-            self.ws = await self.session.ws_connect(ws_url, headers=self.api.headers, )
-            
-            # 发送认证包
-            auth_data = {
-                "uid": int(self.state.uid),
-                "roomid": int(room_id),
-                "protover": 3,
-                "platform": "web",
-                "type": 2,
-                "key": token
-            }
-            await self.send_packet(7, json.dumps(auth_data))
-            
-            # 启动心跳和接收任务
-            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop(room_id))
-            self.receive_task = asyncio.create_task(self._receive_loop(room_id))
-            
-            self._log(f"Connected to danmu server: {ws_url}")
-            self._notify_frontend('system', "弹幕服务器连接成功")
-            self.reconnect_attempts = 0 # 重置重连次数
-            return True
+    def get_rooms(self):
+        return [room.to_dict() for room in list(self.rooms.values())]
+
+    async def _connect_internal(self, room):
+        """内部连接逻辑，支持重连"""
+        if 'buvid3' not in self.api.cookies or not self.state.uid:
+            await self._ensure_buvid3()
+            await self._ensure_uid()
+
+        # 重连时优先复用有效期内的 token 和主机列表 (快速恢复)；认证失败时丢弃缓存重新获取
+        use_cache = room.reconnect_attempts > 0
+        danmu_info = await self.get_danmu_info(room.room_id, use_cache=use_cache)
+        if not room.running:
+            return False
+        if not danmu_info:
+            self._handle_reconnect(room)
+            return False
+
+        token = danmu_info['token']
+        host_list = self._order_hosts(danmu_info['host_list'])
+        auth_data = {
+            "uid": int(self.state.uid),
+            "roomid": room.room_id,
+            "protover": 3,
+            "platform": "web",
+            "type": 2,
+            "key": token
+        }
+
+        try:
+            ws, ws_url = await self._race_hosts(host_list[:self.race_hosts], auth_data)
         except Exception as e:
             logger.error(f"Failed to connect to danmu server: {e}")
-            if self.session:
-                await self.session.close()
-                self.session = None
-            self._handle_reconnect(room_id)
+            if isinstance(e, DanmuAuthError):
+                self.danmu_info_cache.pop(room.room_id, None)
+            await self._close_connection(room)
+            self._handle_reconnect(room)
+            return False
+
+        if not room.running:
+            await ws.close()
             return False
 
-    def _handle_reconnect(self, room_id):
+        room.ws = ws
+        room.ws_url = ws_url
+
+        # 启动心跳和接收任务
+        room.heartbeat_task = asyncio.create_task(self._heartbeat_loop(room))
+        room.receive_task = asyncio.create_task(self._receive_loop(room))
+        room.connected_at = time.time()
+
+        self._log(f"Connected to danmu server: {ws_url}")
+        self._notify_frontend('system', "弹幕服务器连接成功", room.room_id)
+        if room.disconnected_at:
+            # 从断线到重新认证成功的耗时
+            room.last_reconnect_ms = (time.monotonic() - room.disconnected_at) * 1000
+            room.reconnects += 1
+            room.disconnected_at = 0.0
+            self._log(f"Danmu reconnected in {room.last_reconnect_ms:.0f}ms")
+        room.reconnect_attempts = 0 # 重置重连次数
+        return True
+
+    def _host_key(self, host):
+        return f"{host['host']}:{host['wss_port'] if self.use_wss else host['ws_port']}"
+
+    def _host_url(self, host):
+        # 优先使用 wss
+        if self.use_wss:
+            return f"wss://{host['host']}:{host['wss_port']}/sub"
+        return f"ws://{host['host']}:{host['ws_port']}/sub"
+
+    def _order_hosts(self, host_list):
+        """按历史握手延迟排序：有成功记录的按延迟从低到高，其次是没有记录的 (保持服务端顺序)，只失败过的排最后"""
+        def score(item):
+            index, host = item
+            stat = self.host_stats.get(self._host_key(host))
+            if not stat:
+                return 1, 0.0, index
+            if not stat['success']:
+                return 2, stat['fail'], index
+            # 失败较多的主机适当降权
+            return 0, stat['latency_ms'] * (1 + stat['fail'] / (stat['success'] + stat['fail'])), index
+        return [host for _, host in sorted(enumerate(host_list), key=score)]
+
+    def _record_host(self, host, latency_ms=None):
+        """记录主机握手结果，latency_ms 为 None 表示失败"""
+        stat = self.host_stats.setdefault(self._host_key(host), {'success': 0, 'fail': 0, 'latency_ms': 0.0})
+        if latency_ms is None:
+            stat['fail'] += 1
+        elif stat['success']:
+            stat['success'] += 1
+            stat['latency_ms'] = stat['latency_ms'] * 0.7 + latency_ms * 0.3
+        else:
+            stat['success'] += 1
+            stat['latency_ms'] = latency_ms
+
+    async def _race_hosts(self, host_list, auth_data):
+        """
+        并发尝试多个主机 (happy eyeballs)：每隔 race_stagger 秒启动下一个，前一个失败时立即启动下一个，
+        使用第一个完成认证 (收到 op 8 回复) 的连接，其余的取消并关闭
+        :return: (ws, ws_url)
+        """
+        pending = set()
+        waiting = list(host_list)
+        last_error = None
+        try:
+            while waiting or pending:
+                if waiting:
+                    host = waiting.pop(0)
+                    pending.add(asyncio.create_task(self._handshake(host, auth_data)))
+                done, pending = await asyncio.wait(
+                    pending, timeout=self.race_stagger if waiting else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                winners = []
+                for task in done:
+                    try:
+                        winners.append(task.result())
+                    except Exception as e:
+                        # 优先上报认证失败，调用方据此丢弃缓存的 token
+                        if not isinstance(last_error, DanmuAuthError):
+                            last_error = e
+                if winners:
+                    # 同一轮可能有多个主机同时完成认证，只保留第一个
+                    for ws, _ in winners[1:]:
+                        await ws.close()
+                    return winners[0]
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # 等待取消完成，已建立的连接在 _handshake 中关闭；取消前恰好完成认证的连接在这里关闭
+                for result in await asyncio.gather(*pending, return_exceptions=True):
+                    if isinstance(result, tuple):
+                        await result[0].close()
+        raise last_error or ConnectionError("No danmu host available")
+
+    async def _handshake(self, host, auth_data):
+        """连接单个主机并完成认证，返回 (ws, ws_url)"""
+        ws_url = self._host_url(host)
+        start = time.perf_counter()
+        ws = None
+        try:
+            session = await self._get_session()
+            ws = await asyncio.wait_for(session.ws_connect(ws_url, headers=self.api.headers), self.handshake_timeout)
+            await self.send_packet(ws, danmu_protocol.OP_AUTH, json.dumps(auth_data))
+            await asyncio.wait_for(self._wait_auth_reply(ws), self.handshake_timeout)
+        except BaseException as e:
+            if ws is not None:
+                await ws.close()
+            if not isinstance(e, asyncio.CancelledError):
+                self._record_host(host)
+                logger.warning(f"Danmu host {ws_url} failed: {e!r}")
+            raise
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._record_host(host, latency_ms)
+        logger.debug(f"Danmu host {ws_url} authenticated in {latency_ms:.0f}ms")
+        return ws, ws_url
+
+    async def _wait_auth_reply(self, ws):
+        """等待认证回复 (op 8)"""
+        while True:
+            msg = await ws.receive()
+            if msg.type != aiohttp.WSMsgType.BINARY:
+                raise ConnectionError(f"Unexpected websocket message: {msg.type}")
+            for operation, body in danmu_protocol.iter_packets(msg.data):
+                if operation != danmu_protocol.OP_AUTH_REPLY:
+                    continue
+                reply = danmu_protocol.loads(body)
+                if reply.get('code') != 0:
+                    raise DanmuAuthError(f"Danmu authentication failed: {reply}")
+                self._log("Danmu authentication successful")
+                return
+
+    def _handle_reconnect(self, room):
         """处理重连逻辑"""
-        if not self.running:
+        if not room.running:
             return
+        # 心跳和接收任务可能同时发现断线，只安排一次重连 (重连任务自身连接失败时除外)
+        task = room.reconnect_task
+        if task and not task.done() and task is not asyncio.current_task():
+            return
+
+        if not room.disconnected_at:
+            room.disconnected_at = time.monotonic()
 
-        if self.reconnect_attempts < self.max_reconnect_attempts:
-            self.reconnect_attempts += 1
-            wait_time = self.reconnect_delay * self.reconnect_attempts
-            msg = f"弹幕连接断开，{wait_time}秒后尝试第{self.reconnect_attempts}次重连..."
+        if room.reconnect_attempts < room.max_reconnect_attempts:
+            room.reconnect_attempts += 1
+            wait_time = self._backoff_delay(room)
+            msg = f"弹幕连接断开，{wait_time:.1f}秒后尝试第{room.reconnect_attempts}次重连..."
             self._log(msg)
-            self._notify_frontend('system', msg)
+            self._notify_frontend('system', msg, room.room_id)
             
             async def reconnect_task():
+                await self._close_connection(room)
                 await asyncio.sleep(wait_time)
-                if self.running:
-                    await self._connect_internal(room_id)
+                if room.running:
+                    await self._connect_internal(room)
             
-            asyncio.create_task(reconnect_task())
+            room.reconnect_task = asyncio.create_task(reconnect_task())
         else:
             msg = "弹幕连接失败，已达到最大重连次数"
             self._log(msg)
-            self._notify_frontend('system', msg)
-            self.running = False
+            self._notify_frontend('system', msg, room.room_id)
+            room.running = False
+            # 移出 rooms，不再占用 max_rooms 名额，并与 stop_room 一样释放连接和录制文件
+            if self.rooms.get(room.room_id) is room:
+                del self.rooms[room.room_id]
+                room.reconnect_task = asyncio.create_task(self._release_room(room))
+
+    def _backoff_delay(self, room):
+        """
+        重连等待时间：第一次重连时如果缓存的 token 仍在有效期内则立即重连，
+        之后按指数退避 (reconnect_delay * 2^n，不超过 max_reconnect_delay) 并加随机抖动
+        """
+        attempt = room.reconnect_attempts
+        if attempt == 1:
+            cached = self.danmu_info_cache.get(room.room_id)
+            if cached and time.monotonic() - cached[1] < self.danmu_info_ttl:
+                return 0.0
+        delay = min(self.max_reconnect_delay, room.reconnect_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    async def _close_connection(self, room):
+        """关闭直播间当前的连接和心跳 / 接收任务"""
+        current = asyncio.current_task()
+        for task in (room.heartbeat_task, room.receive_task):
+            if task and task is not current:
+                task.cancel()
+        room.heartbeat_task = None
+        room.receive_task = None
+        if room.ws:
+            try:
+                await room.ws.close()
+            except Exception:
+                pass
+            room.ws = None
+
+    async def _close_room(self, room):
+        room.running = False
+        if room.recorder:
+            room.recorder.close()
+            room.recorder = None
+        if room.reconnect_task and room.reconnect_task is not asyncio.current_task():
+            room.reconnect_task.cancel()
+        room.reconnect_task = None
+        await self._close_connection(room)
 
     async def stop(self):
-        """停止弹幕服务"""
-        self.running = False
-        if self.ws:
-            await self.ws.close()
+        """停止弹幕服务 (所有直播间)"""
+        rooms = list(self.rooms.values())
+        self.rooms = {}
+        for room in rooms:
+            await self._close_room(room)
+        self.flush_gifts()
+        if self.face_fetch_task:
+            self.face_fetch_task.cancel()
+            self.face_fetch_task = None
+        self._face_pending.clear()
+        self.face_cache.save()
         if self.session:
             await self.session.close()
             self.session = None
-        if self.heartbeat_task:
-            self.heartbeat_task.cancel()
-        if self.receive_task:
-            self.receive_task.cancel()
         self._log("Danmu service stopped")
 
-    async def send_packet(self, operation, body):
+    async def send_packet(self, ws, operation, body):
         """发送数据包"""
-        if not self.ws:
+        if not ws:
             return
-        
-        body_bytes = body.encode('utf-8')
-        header = struct.pack('!IHHII', 16 + len(body_bytes), 16, 1, operation, 1)
-        await self.ws.send_bytes(header + body_bytes)
 
-    async def _heartbeat_loop(self, room_id):
+        await ws.send_bytes(danmu_protocol.pack(operation, body))
+
+    async def _heartbeat_loop(self, room):
         """心跳循环"""
-        while self.running:
+        while room.running:
             try:
-                await self.send_packet(2, "")
+                await self.send_packet(room.ws, danmu_protocol.OP_HEARTBEAT, "")
                 await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Heartbeat error: {e}")
-                self._handle_reconnect(room_id)
+                self._handle_reconnect(room)
                 break
 
-    async def _receive_loop(self, room_id):
+    async def _receive_loop(self, room):
         """接收循环"""
-        while self.running:
+        ws = room.ws
+        while room.running:
             try:
-                msg = await self.ws.receive()
+                msg = await ws.receive()
                 if msg.type == aiohttp.WSMsgType.BINARY:
-                    await self._decode_packet(msg.data)
-                elif msg.type == aiohttp.WSMsgType.CLOSED:
+                    room.frames += 1
+                    if room.recorder:
+                        room.recorder.write(msg.data)
+                    await self._decode_packet(msg.data, room.room_id)
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
                     logger.warning("WebSocket connection closed")
-                    self._handle_reconnect(room_id)
+                    self._handle_reconnect(room)
                     break
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     logger.error("WebSocket connection error")
-                    self._handle_reconnect(room_id)
+                    self._handle_reconnect(room)
                     break
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Receive error: {e}")
-                self._handle_reconnect(room_id)
+                self._handle_reconnect(room)
                 break
 
-    async def _decode_packet(self, data):
+    async def _decode_packet(self, data, room_id=None):
         """解码数据包"""
-        offset = 0
-        while offset < len(data):
+        # 超过阈值的帧在线程池中只做解压 (释放 GIL)；接收循环逐帧 await，帧的处理顺序不变
+        if self.decode_executor is not None and len(data) >= self.offload_threshold:
+            wait_start = time.perf_counter()
             try:
-                packet_len, header_len, proto_ver, operation, seq = struct.unpack('!IHHII', data[offset:offset+16])
-                body = data[offset+16:offset+packet_len]
-                
-                if proto_ver == 2:
-                    # zlib 压缩
-                    body = zlib.decompress(body)
-                    await self._decode_packet(body)
-                elif proto_ver == 3:
-                    # brotli 压缩
-                    body = brotli.decompress(body)
-                    await self._decode_packet(body)
-                else:
-                    if operation == 5:
-                        # 普通包 (命令)
-                        try:
-                            body_json = json.loads(body.decode('utf-8'))
-                            await self._handle_command(body_json)
-                        except Exception as e:
-                            logger.error(f"JSON decode error: {e}")
-                    elif operation == 3:
-                        # 心跳回复 (人气值)
-                        popularity = struct.unpack('!I', body)[0]
-                        # logger.debug(f"Popularity: {popularity}")
-                    elif operation == 8:
-                        # 认证包回复
-                        try:
-                            body_json = json.loads(body.decode('utf-8'))
-                            if body_json.get('code') == 0:
-                                self._log("Danmu authentication successful")
-                            else:
-                                logger.error(f"Danmu authentication failed: {body_json}")
-                        except Exception as e:
-                            logger.error(f"Auth response decode error: {e}")
-                
-                offset += packet_len
+                loop = asyncio.get_running_loop()
+                inner = await loop.run_in_executor(self.decode_executor, danmu_protocol.inflate_frame, data)
+                packets = danmu_protocol.iter_packets(inner)
             except Exception as e:
                 logger.error(f"Packet decode error: {e}")
-                break
+                return
+            self.decode_stats['offloaded_frames'] += 1
+            self.decode_stats['offload_wait_ms'] += (time.perf_counter() - wait_start) * 1000
+        else:
+            packets = danmu_protocol.iter_packets(data)
+            self.decode_stats['inline_frames'] += 1
 
-    async def _handle_command(self, command):
-        """处理命令"""
-        cmd = command.get('cmd', '')
-        if cmd.startswith('DANMU_MSG'):
-            # print(command)
-            info = command.get('info', [])
-            # print(info)
-            if info:
-                danmu_data = {
-                    'type': 'danmu',
-                    'uid': info[2][0],
-                    'uname': info[2][1],
-                    'face': '', # 弹幕消息中不直接包含头像，需要额外获取或从 info[0][15]['user']['base']['face'] 获取
-                    'msg': info[1]
-                }
-                
-                # 尝试获取头像
-                try:
-                    if len(info) > 0 and len(info[0]) > 15:
-                         extra = info[0][15]
-                         if 'user' in extra and 'base' in extra['user']:
-                             danmu_data['face'] = extra['user']['base']['face']
-                except:
-                    pass
-
-                if self.message_callback:
-                    self.message_callback(danmu_data)
-        
-        elif cmd == 'INTERACT_WORD':
-             # 交互消息（进场、关注、分享）
-             data = command.get('data', {})
-             msg_type = data.get('msg_type')
-             
-             # 尝试转为 int
-             try:
-                 msg_type = int(msg_type)
-             except:
-                 pass
-
-             msg_text = ""
-             if msg_type == 1:
-                 msg_text = "进入直播间"
-             elif msg_type == 2:
-                 msg_text = "关注了直播间"
-             elif msg_type == 3:
-                 msg_text = "分享了直播间"
-             
-             if msg_text:
-                 self._log(f"Interact: {data.get('uname')} {msg_text}")
-                 interact_data = {
-                     'type': 'interact',
-                     'uid': data.get('uid'),
-                     'uname': data.get('uname'),
-                     'msg': msg_text
-                 }
-                 if self.message_callback:
-                     self.message_callback(interact_data)
-
-        elif cmd.startswith('ENTRY_EFFECT'):
-             # 进场特效
-             data = command.get('data', {})
-             # print(data)
-             copy_writing = data.get('copy_writing')
-             if copy_writing:
-                 self._log(f"Entry Effect: {copy_writing}")
-                 msg = copy_writing.replace('<%', '').replace('%>', '')
-                 interact_data = {
-                     'type': 'interact',
-                     'uid': data.get('uid'),
-                     'uname': '', # 名字在 msg 里
-                     'msg': msg
-                 }
-                 if self.message_callback:
-                     self.message_callback(interact_data)
-
-        elif cmd.startswith('SEND_GIFT'):
-            # 送礼
-            data = command.get('data', {})
-            # print(data)
-            gift_name = data.get('giftName') or data.get('gift_name')
-            self._log(f"Gift: {data.get('uname')} sent {gift_name}")
-            gift_data = {
-                'type': 'gift',
-                'uid': data.get('uid'),
-                'uname': data.get('uname'),
-                'face': data.get('face'),
-                'gift_name': gift_name,
-                'num': data.get('num'),
-                'action': data.get('action') or '投喂'
-            }
-            if self.message_callback:
-                self.message_callback(gift_data)
-
-        elif cmd.startswith('COMBO_SEND'):
-            # 连击送礼
-            data = command.get('data', {})
-            gift_name = data.get('gift_name') or data.get('giftName')
-            self._log(f"Combo Gift: {data.get('uname')} sent {gift_name} x {data.get('combo_num')}")
-            gift_data = {
-                'type': 'gift',
-                'uid': data.get('uid'),
-                'uname': data.get('uname'),
-                'face': '', 
-                'gift_name': gift_name,
-                'num': data.get('combo_num'),
-                'action': data.get('action') or '投喂'
-            }
-            if self.message_callback:
-                self.message_callback(gift_data)
-        
-        elif cmd.startswith('INTERACT_WORD_V2'):
-             # 交互消息（进场、关注、分享）
-             data = command.get('data', {})
-
-             # print(data)
-             
-             # 先用 base64 解码 data['pb'] 内的字符串为字节数据pb，再使用proto文件解码pb数据。
-             try:
-                 pb_data = base64.b64decode(data.get('pb', ''))
-                 dm_v2 = dm_pb2.InteractWordV2()
-                 dm_v2.ParseFromString(pb_data)
-                 
-                 msg_type = dm_v2.msg_type
-                 uname = dm_v2.uname
-                 uid = dm_v2.uid
-                 
-                 msg_text = ""
-                 if msg_type == 1:
-                     msg_text = "进入直播间"
-                 elif msg_type == 2:
-                     msg_text = "关注了直播间"
-                 elif msg_type == 3:
-                     msg_text = "分享了直播间"
-                 
-                 if msg_text:
-                     self._log(f"Interact V2: {uname} {msg_text}")
-                     interact_data = {
-                         'type': 'interact',
-                         'uid': uid,
-                         'uname': uname,
-                         'msg': msg_text
-                     }
-                     if self.message_callback:
-                         self.message_callback(interact_data)
-             except Exception as e:
-                 logger.error(f"Decode INTERACT_WORD_V2 error: {e}")
+        slice_start = time.perf_counter()
+        count = 0
+        try:
+            for operation, body in packets:
+                count += 1
+                if count % self.yield_every == 0:
+                    self._record_blocking(slice_start)
+                    await asyncio.sleep(0)
+                    slice_start = time.perf_counter()
+
+                if operation == danmu_protocol.OP_COMMAND:
+                    # 普通包 (命令)，没有处理函数的命令不做 JSON 解析直接丢弃
+                    cmd = danmu_protocol.peek_cmd(body)
+                    if cmd is not None and self._get_handler(cmd) is None:
+                        self.decode_stats['skipped'] += 1
+                        self.decode_stats['skipped_bytes'] += len(body)
+                        continue
+                    self.decode_stats['parsed'] += 1
+                    self.decode_stats['parsed_bytes'] += len(body)
+                    try:
+                        body_json = danmu_protocol.loads(body)
+                        await self._handle_command(body_json, room_id)
+                    except Exception as e:
+                        logger.error(f"JSON decode error: {e}")
+                elif operation == danmu_protocol.OP_HEARTBEAT_REPLY:
+                    # 心跳回复 (人气值)
+                    popularity = struct.unpack_from('!I', body)[0]
+                    room = self.rooms.get(room_id)
+                    if room:
+                        room.series.sample(popularity)
+                elif operation == danmu_protocol.OP_AUTH_REPLY:
+                    # 认证包回复
+                    try:
+                        body_json = danmu_protocol.loads(body)
+                        if body_json.get('code') == 0:
+                            self._log("Danmu authentication successful")
+                        else:
+                            logger.error(f"Danmu authentication failed: {body_json}")
+                    except Exception as e:
+                        logger.error(f"Auth response decode error: {e}")
+        except Exception as e:
+            logger.error(f"Packet decode error: {e}")
+        self._record_blocking(slice_start)
+
+    def _record_blocking(self, slice_start):
+        """记录一段连续占用事件循环线程的时间 (内联解码、解压和命令处理都是同步执行的)"""
+        blocking_ms = (time.perf_counter() - slice_start) * 1000
+        self.decode_stats['loop_blocking_ms'] += blocking_ms
+        if blocking_ms > self.decode_stats['max_loop_blocking_ms']:
+            self.decode_stats['max_loop_blocking_ms'] = blocking_ms
+
+    @staticmethod
+    def normalize_cmd(cmd):
+        """去掉命令名的 :suffix 部分，如 DANMU_MSG:4:0:2:2:2:0 -> DANMU_MSG"""
+        return cmd.partition(':')[0]
+
+    def register_handler(self, cmd, handler):
+        """
+        注册命令处理函数，同名命令会覆盖已有的处理函数
+        :param cmd: 命令名 (不含 :suffix)
+        :param handler: handler(command) -> 事件 dict 或 None，返回的事件会推送给 message_callback
+        """
+        self.command_handlers[self.normalize_cmd(cmd)] = handler
+        self._dispatch_cache.clear()
+
+    def unregister_handler(self, cmd):
+        self.command_handlers.pop(self.normalize_cmd(cmd), None)
+        self._dispatch_cache.clear()
+
+    def _get_handler(self, cmd):
+        """原始命令名 -> handler，未注册的命令返回 None"""
+        try:
+            return self._dispatch_cache[cmd]
+        except KeyError:
+            return self._resolve_handler(cmd)
+
+    def _resolve_handler(self, cmd):
+        """原始命令名 -> handler (未注册为 None)，结果缓存，带 :suffix 的变体也只需一次查找"""
+        handler = self.command_handlers.get(self.normalize_cmd(cmd))
+        if len(self._dispatch_cache) >= 1024:
+            self._dispatch_cache.clear()
+        self._dispatch_cache[cmd] = handler
+        return handler
+
+    def _emit(self, event):
+        """推送事件"""
+        if self.message_callback:
+            self.message_callback(event)
+
+    async def _handle_command(self, command, room_id=None):
+        """处理命令，产生的事件标记所属直播间"""
+        handler = self._get_handler(command.get('cmd', ''))
+        if handler is None:
+            return
+        event = handler(command)
+        if not event:
+            return
+        if event['type'] == 'room_stat':
+            # 看过人数 / 高能榜人数，只记录到时间序列，不推送
+            room = self.rooms.get(room_id)
+            if room:
+                room.series.update(event['name'], event['value'])
+            return
+        if event['type'] == 'danmu':
+            event = self.keyword_filter.apply(event)
+            if event is None:
+                return
+        if event['type'] in ('danmu', 'gift') and not event.get('cumulative'):
+            # COMBO_SEND 的数量是连击累计数量，与 SEND_GIFT 重复，不计入统计
+            room = self.rooms.get(room_id)
+            if room:
+                room.analytics.add(event)
+        if 'face' in event:
+            self._fill_face(event)
+        if event['type'] == 'interact':
+            # 同一用户进场会先后收到 INTERACT_WORD / INTERACT_WORD_V2 / ENTRY_EFFECT，窗口内只保留第一条
+            # 未登录时 uid 可能为 0，此时用用户名区分 (ENTRY_EFFECT 为文案中的名字)，都没有时用文案本身
+            who = event.get('uid') or event.get('uname') or event.pop('_who', None) or event['msg']
+            event.pop('_who', None)
+            if who and self.interact_deduper.seen((room_id, who, event['kind'])):
+                return
+            # 每条事件的日志只记 DEBUG：INFO 日志会同步转发到前端 (FrontendLogHandler)，在事件循环上阻塞 evaluate_js
+            if event['uname']:
+                logger.debug(f"Interact: {event['uname']} {event['msg']}")
+            else:
+                logger.debug(f"Interact: {event['msg']}")
+        elif event['type'] == 'gift':
+            event['room_id'] = room_id
+            cumulative = event.pop('cumulative', False)
+            if not self.gift_aggregator.window:
+                self._emit_gift(event)
+                return
+            # 连击中的礼物合并成一条累计数量的事件，由 _gift_flush_loop 推送后续更新和最终结果
+            try:
+                num = int(event.get('num') or 1)
+            except (TypeError, ValueError):
+                num = 1
+            key = (room_id, event.get('uid'), event.get('gift_name'))
+            event = self.gift_aggregator.add(key, event, num, cumulative)
+            if event:
+                self._emit(event)
+            if not self.gift_flush_task or self.gift_flush_task.done():
+                self.gift_flush_task = asyncio.create_task(self._gift_flush_loop())
+            return
+        event['room_id'] = room_id
+        self._emit(event)
+
+    def _fill_face(self, event):
+        """从带头像的消息中学习头像；不带头像时从缓存补全，缓存中没有则加入批量获取"""
+        try:
+            uid = int(event.get('uid') or 0)
+        except (TypeError, ValueError):
+            return
+        if not uid:
+            return
+        if event['face']:
+            self.face_cache.put(uid, event['face'])
+            return
+        face = self.face_cache.get(uid)
+        if face:
+            event['face'] = face
+        elif (self.face_fetch_enabled and uid not in self._face_pending
+              and len(self._face_pending) < self.max_face_pending and self.face_cache.should_fetch(uid)):
+            self._face_pending[uid] = None
+            if not self.face_fetch_task or self.face_fetch_task.done():
+                self.face_fetch_task = asyncio.create_task(self._face_fetch_loop())
+
+    async def _face_fetch_loop(self):
+        """攒批获取缺失的头像，获取到后推送 face 事件，由前端补全已显示消息的头像"""
+        while self._face_pending:
+            await asyncio.sleep(self.face_batch_delay)
+            uids = list(itertools.islice(self._face_pending, self.face_batch_size))
+            for uid in uids:
+                del self._face_pending[uid]
+            faces = await self._fetch_faces(uids)
+            for uid in uids:
+                face = faces.get(uid)
+                if face:
+                    self.face_cache.put(uid, face, fetched=True)
+                    self._emit({'type': 'face', 'uid': uid, 'face': face, 'room_id': None})
+                else:
+                    self.face_cache.mark_missing(uid)
+        # 没有在监听的直播间时 (如全部停止后才获取完)，关闭为获取头像创建的 ClientSession
+        if not self.rooms and self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _fetch_faces(self, uids):
+        """批量获取头像，返回 {uid: face}"""
+        success, res = await self.async_api.get_user_cards(uids)
+        if not success or res.get('code') != 0:
+            logger.warning(f"Failed to fetch faces: {res.get('message') or res.get('msg')}")
+            return {}
+        return {int(card['mid']): card.get('face') for card in res.get('data') or []}
+
+    def _emit_gift(self, event):
+        """推送礼物事件，连击结束 (或未合并) 时记录 DEBUG 日志"""
+        if event.get('final', True):
+            logger.debug(f"Gift: {event.get('uname')} sent {event.get('gift_name')} x {event.get('num')}")
+        self._emit(event)
+
+    async def _gift_flush_loop(self):
+        """定期推送礼物连击的累计数量，结束超出窗口的连击；全部连击结束后退出，下次收到礼物时重新启动"""
+        while self.gift_aggregator.pending:
+            await asyncio.sleep(self.gift_flush_interval)
+            for event in self.gift_aggregator.flush():
+                self._emit_gift(event)
+
+    def flush_gifts(self):
+        """立即结束全部连击并推送最终结果 (停止服务、回放结束时)"""
+        if self.gift_flush_task:
+            self.gift_flush_task.cancel()
+            self.gift_flush_task = None
+        for event in self.gift_aggregator.flush(force=True):
+            self._emit_gift(event)
+
+    # 交互消息类型 -> (事件种类, 文本)
+    INTERACT_TYPES = {
+        1: ("entry", "进入直播间"),
+        2: ("follow", "关注了直播间"),
+        3: ("share", "分享了直播间"),
+    }
+
+    def _on_danmu_msg(self, command):
+        """弹幕"""
+        info = command.get('info', [])
+        if not info:
+            return None
+        danmu_data = {
+            'type': 'danmu',
+            'uid': info[2][0],
+            'uname': info[2][1],
+            'face': '', # 弹幕消息中不直接包含头像，需要额外获取或从 info[0][15]['user']['base']['face'] 获取
+            'msg': info[1]
+        }
+
+        # 尝试获取头像
+        try:
+            if len(info) > 0 and len(info[0]) > 15:
+                extra = info[0][15]
+                if 'user' in extra and 'base' in extra['user']:
+                    danmu_data['face'] = extra['user']['base']['face']
+        except:
+            pass
+        return danmu_data
+
+    def _on_interact_word(self, command):
+        """交互消息（进场、关注、分享）"""
+        data = command.get('data', {})
+        msg_type = data.get('msg_type')
+
+        # 尝试转为 int
+        try:
+            msg_type = int(msg_type)
+        except:
+            pass
+
+        if msg_type not in self.INTERACT_TYPES:
+            return None
+        kind, msg_text = self.INTERACT_TYPES[msg_type]
+        return {
+            'type': 'interact',
+            'kind': kind,
+            'uid': data.get('uid'),
+            'uname': data.get('uname'),
+            'msg': msg_text
+        }
+
+    def _on_interact_word_v2(self, command):
+        """交互消息（进场、关注、分享），pb 格式"""
+        data = command.get('data', {})
+
+        # 先用 base64 解码 data['pb'] 内的字符串为字节数据pb，再使用proto文件解码pb数据。
+        try:
+            pb_data = base64.b64decode(data.get('pb', ''))
+            dm_v2 = dm_pb2.InteractWordV2()
+            dm_v2.ParseFromString(pb_data)
+        except Exception as e:
+            logger.error(f"Decode INTERACT_WORD_V2 error: {e}")
+            return None
+
+        if dm_v2.msg_type not in self.INTERACT_TYPES:
+            return None
+        kind, msg_text = self.INTERACT_TYPES[dm_v2.msg_type]
+        return {
+            'type': 'interact',
+            'kind': kind,
+            'uid': dm_v2.uid,
+            'uname': dm_v2.uname,
+            'msg': msg_text
+        }
+
+    def _on_entry_effect(self, command):
+        """进场特效"""
+        data = command.get('data', {})
+        copy_writing = data.get('copy_writing')
+        if not copy_writing:
+            return None
+        # 名字在 <% %> 之间，未登录时 uid 为 0，用它去重 (_handle_command 中移除)
+        start = copy_writing.find('<%')
+        end = copy_writing.find('%>', start + 2)
+        who = copy_writing[start + 2:end] if start >= 0 and end >= 0 else ''
+        return {
+            'type': 'interact',
+            'kind': 'entry',
+            'uid': data.get('uid'),
+            'uname': '', # 名字在 msg 里
+            'msg': copy_writing.replace('<%', '').replace('%>', ''),
+            '_who': who
+        }
+
+    def _on_send_gift(self, command):
+        """送礼"""
+        data = command.get('data', {})
+        gift_name = data.get('giftName') or data.get('gift_name')
+        return {
+            'type': 'gift',
+            'uid': data.get('uid'),
+            'uname': data.get('uname'),
+            'face': data.get('face'),
+            'gift_name': gift_name,
+            'num': data.get('num'),
+            'action': data.get('action') or '投喂'
+        }
+
+    def _on_combo_send(self, command):
+        """连击送礼"""
+        data = command.get('data', {})
+        gift_name = data.get('gift_name') or data.get('giftName')
+        return {
+            'type': 'gift',
+            'uid': data.get('uid'),
+            'uname': data.get('uname'),
+            'face': '',
+            'gift_name': gift_name,
+            'num': data.get('combo_num'),
+            'action': data.get('action') or '投喂',
+            'cumulative': True  # combo_num 为连击累计数量
+        }
+
+    def _on_watched_change(self, command):
+        """看过人数"""
+        num = command.get('data', {}).get('num')
+        if num is None:
+            return None
+        return {'type': 'room_stat', 'name': 'watched', 'value': num}
+
+    def _on_online_rank_count(self, command):
+        """高能榜人数"""
+        data = command.get('data', {})
+        count = data.get('online_count', data.get('count'))
+        if count is None:
+            return None
+        return {'type': 'room_stat', 'name': 'online_rank', 'value': count}
@@ -0,0 +1,207 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("DeliveryService")
+
+# 队列满时的丢弃策略。礼物事件在任何策略下都不会被丢弃：队列满时先丢非礼物事件腾出位置，
+# 队列中全是礼物时礼物可以超出 max_queue (非礼物事件仍受上限约束)
+POLICY_DROP_INTERACT_FIRST = "drop_interact_first"  # 先丢最旧的进场/关注/分享事件，没有再丢最旧的非礼物事件
+POLICY_DROP_OLDEST = "drop_oldest"                  # 丢最旧的非礼物事件
+POLICY_DROP_NEWEST = "drop_newest"                  # 丢弃新来的非礼物事件
+OVERFLOW_POLICIES = (POLICY_DROP_INTERACT_FIRST, POLICY_DROP_OLDEST, POLICY_DROP_NEWEST)
+
+# 队列按优先级分类，每类一个 deque，丢弃某一类最旧的事件是 O(1)
+CLASS_GIFT = "gift"
+CLASS_INTERACT = "interact"
+CLASS_OTHER = "other"
+
+
+class DeliveryService:
+    """
+    弹幕事件推送：弹幕事件循环只负责入队，独立的推送线程按时间窗口或条数把事件合并成一帧，
+    每帧调用一次 evaluate_js，慢的 UI 线程不会阻塞弹幕接收和心跳
+    """
+
+    def __init__(self, window_service, function_name="onDanmuBatch", interval=0.05, max_batch=100,
+                 max_queue=2000, overflow_policy=POLICY_DROP_INTERACT_FIRST):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning(f"Unknown overflow policy: {overflow_policy}, using {POLICY_DROP_INTERACT_FIRST}")
+            overflow_policy = POLICY_DROP_INTERACT_FIRST
+        self.window_service = window_service
+        self.function_name = function_name
+        self.interval = interval  # seconds
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        # 分类 -> deque[(序号, 入队时间, 事件)]；推送时按序号合并，保持入队顺序
+        self.queues = {CLASS_GIFT: deque(), CLASS_INTERACT: deque(), CLASS_OTHER: deque()}
+        self.size = 0
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stats = {
+            "frames": 0,
+            "events": 0,
+            "enqueued": 0,
+            "dropped": 0,
+            "dropped_by_type": {},
+            "dropped_on_stop": 0,
+            "max_queue_depth": 0,
+            "last_frame_size": 0,
+            "max_frame_size": 0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "total_latency_ms": 0.0,
+            "last_eval_ms": 0.0,
+            "max_eval_ms": 0.0,
+        }
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="DanmuDelivery", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        """停止推送线程：先推送完队列中剩余的事件 (最多等待 timeout 秒)，未推送的计入 dropped_on_stop"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+        with self.cond:
+            left = self.size
+            if not left:
+                return
+            for queue in self.queues.values():
+                for _, _, event in queue:
+                    self._count_drop(event)
+                queue.clear()
+            self.size = 0
+            self.stats["dropped_on_stop"] += left
+        logger.warning(f"Delivery stopped with {left} undelivered events")
+
+    @staticmethod
+    def _classify(event):
+        msg_type = event.get("type")
+        if msg_type == "gift":
+            return CLASS_GIFT
+        if msg_type == "interact":
+            return CLASS_INTERACT
+        return CLASS_OTHER
+
+    def push(self, event):
+        """加入一条事件 (线程安全，不阻塞)"""
+        cls = self._classify(event)
+        with self.cond:
+            if self.size >= self.max_queue and not self._make_room(cls):
+                self._count_drop(event)
+                return
+            self.seq += 1
+            self.queues[cls].append((self.seq, time.monotonic(), event))
+            self.size += 1
+            self.stats["enqueued"] += 1
+            if self.size > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = self.size
+            if self.size == 1 or self.size >= self.max_batch:
+                self.cond.notify()
+
+    def _make_room(self, cls):
+        """队列已满时按策略丢弃一条非礼物事件腾出位置，返回新事件 (分类为 cls) 是否可以入队"""
+        if self.overflow_policy == POLICY_DROP_NEWEST and cls != CLASS_GIFT:
+            return False
+
+        queues = self.queues
+        if self.overflow_policy == POLICY_DROP_INTERACT_FIRST and queues[CLASS_INTERACT]:
+            victim = queues[CLASS_INTERACT]
+        else:
+            # 最旧的非礼物事件
+            victim = self._oldest_queue(queues[CLASS_INTERACT], queues[CLASS_OTHER])
+        if victim is None:
+            # 队列里全是礼物：礼物超出上限入队，非礼物事件丢弃
+            return cls == CLASS_GIFT
+        _, _, dropped = victim.popleft()
+        self.size -= 1
+        self._count_drop(dropped)
+        return True
+
+    @staticmethod
+    def _oldest_queue(*queues):
+        """返回队头序号最小 (最早入队) 的非空 deque，都为空时返回 None"""
+        oldest = None
+        for queue in queues:
+            if queue and (oldest is None or queue[0][0] < oldest[0][0]):
+                oldest = queue
+        return oldest
+
+    def _pop_oldest(self):
+        self.size -= 1
+        return self._oldest_queue(*self.queues.values()).popleft()
+
+    def _count_drop(self, event):
+        msg_type = event.get("type", "unknown")
+        self.stats["dropped"] += 1
+        self.stats["dropped_by_type"][msg_type] = self.stats["dropped_by_type"].get(msg_type, 0) + 1
+
+    def _run(self):
+        """推送线程：等第一条事件到达后，再等待 interval 或凑满 max_batch 条后推送一帧"""
+        while True:
+            with self.cond:
+                while self.running and not self.size:
+                    self.cond.wait()
+                if not self.size:
+                    return
+                # 停止时不再等待，剩余事件直接按 max_batch 分帧推送完
+                if self.running:
+                    deadline = self._oldest_queue(*self.queues.values())[0][1] + self.interval
+                while self.running and self.size < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                n = min(self.size, self.max_batch)
+                items = [self._pop_oldest() for _ in range(n)]
+
+            if items:
+                self._deliver(items)
+
+    def _deliver(self, items):
+        batch = [e for _, _, e in items]
+        eval_start = time.monotonic()
+        self.window_service.send_to_frontend(self.function_name, batch)
+        now = time.monotonic()
+        self._record(len(batch), (now - items[0][1]) * 1000, (now - eval_start) * 1000)
+
+    def _record(self, size, latency_ms, eval_ms):
+        """记录单帧大小和延迟 (延迟为帧内第一条事件入队到 evaluate_js 返回)"""
+        stats = self.stats
+        stats["frames"] += 1
+        stats["events"] += size
+        stats["last_frame_size"] = size
+        stats["max_frame_size"] = max(stats["max_frame_size"], size)
+        stats["last_latency_ms"] = latency_ms
+        stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+        stats["total_latency_ms"] += latency_ms
+        stats["last_eval_ms"] = eval_ms
+        stats["max_eval_ms"] = max(stats["max_eval_ms"], eval_ms)
+        if stats["frames"] % 100 == 0:
+            logger.debug(f"Delivered {stats['frames']} frames / {stats['events']} events, "
+                         f"last frame: size={size}, latency={latency_ms:.1f}ms, eval={eval_ms:.1f}ms, "
+                         f"queue={self.size}, dropped={stats['dropped']}")
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["dropped_by_type"] = dict(self.stats["dropped_by_type"])
+            stats["queue_depth"] = self.size
+        total_latency_ms = stats.pop("total_latency_ms")
+        frames = stats["frames"]
+        stats["avg_frame_size"] = stats["events"] / frames if frames else 0
+        stats["avg_latency_ms"] = total_latency_ms / frames if frames else 0.0
+        stats["overflow_policy"] = self.overflow_policy
+        return stats
@@ -1,4 +1,5 @@
 import logging
+import time
 from backend import util
 
 logger = logging.getLogger("LiveService")
@@ -10,9 +11,9 @@ class LiveService:
         self.state = session_state
         self.partition_map = {}
 
-    def _refresh_partitions_internal(self):
+    def _refresh_partitions_internal(self, force=False):
         logger.debug("Refreshing partitions...")
-        success, res = self.api.get_area_list()
+        success, res = self.api.get_area_list(force=force)
         if success and res.get('code') == 0:
             self.partition_map = {}
             for p in res['data']:
@@ -43,6 +44,17 @@ class LiveService:
         return []
 
     # --- API Methods ---
+    def prewarm(self):
+        """打开开播面板时预热：服务器时钟偏差、直播姬版本信息，开播时只需一次请求 (分区列表由 get_partitions 加载)"""
+        start = time.perf_counter()
+        version, err = self.api.prewarm_live()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if version is None:
+            logger.warning(f"Prewarm live failed: {err}")
+            return {"code": -1, "msg": (err or {}).get('msg') or (err or {}).get('message')}
+        logger.debug(f"Live prewarmed in {elapsed_ms:.0f}ms")
+        return {"code": 0, "data": {"elapsed_ms": round(elapsed_ms, 1)}}
+
     def get_partitions(self):
         if not self.partition_map: self._refresh_partitions_internal()
         data = {p: list(s.keys()) for p, s in self.partition_map.items()}
@@ -88,6 +100,7 @@ class LiveService:
 
     def start_live(self, p_name=None, s_name=None):
         logger.info("Starting live stream...")
+        start = time.perf_counter()
         if not self.state.room_id: return {"code": -1, "msg": "请先登录"}
 
         # 如果前端传了分区名，先更新内存中的 ID
@@ -95,9 +108,9 @@ class LiveService:
             if not self.partition_map: self._refresh_partitions_internal()
             aid = self.partition_map.get(p_name, {}).get(s_name)
             
-            # 如果没找到，尝试强制刷新一次
+            # 如果没找到，尝试强制刷新一次 (跳过缓存)
             if not aid:
-                self._refresh_partitions_internal()
+                self._refresh_partitions_internal(force=True)
                 aid = self.partition_map.get(p_name, {}).get(s_name)
             
             if aid:
@@ -168,13 +181,16 @@ class LiveService:
                 # Mask RTMP address for logging
                 logger.info(f"RTMP-1 Addr: {util.mask_string(rtmp_addr, 10, 5)}")
                 logger.info(f"RTMP-1 Code: {util.mask_string(rtmp_code, 5, 5)}")
+                latency_ms = (time.perf_counter() - start) * 1000
+                logger.info(f"Got RTMP address in {latency_ms:.0f}ms")
                 
                 return {
                     "code": 0, 
                     "data": {
                         "rtmp1": {"addr": rtmp_addr, "code": rtmp_code},
                         "rtmp2": {"addr": rtmp2_addr, "code": rtmp2_code},
-                        "srt": {"addr": srt_addr, "code": srt_code}
+                        "srt": {"addr": srt_addr, "code": srt_code},
+                        "latency_ms": round(latency_ms, 1)
                     }
                 }
             elif res['code'] == 60024:
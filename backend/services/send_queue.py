@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import itertools
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger("DanmuSendQueue")
+
+CODE_RATE_LIMITED = 10031  # 发送频率过高
+
+
+class TokenBucket:
+    """令牌桶限流：平均每秒 rate 个，最多连续 burst 个"""
+
+    def __init__(self, rate=1.0, burst=2):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        """服务端返回频率过高时清空令牌，之后按 rate 重新积累"""
+        self._refill()
+        self.tokens = 0.0
+
+
+class DanmuSendQueue:
+    """
+    弹幕发送队列，运行在弹幕事件循环上。
+
+    submit 可在任意线程调用，立即返回 ticket；发送按令牌桶限流依次进行，
+    返回 10031 (频率过高) 时清空令牌并退避重试，结果以 send_result 事件推送到前端。
+    """
+
+    def __init__(self, danmu_service, loop, rate=1.0, burst=2, max_queue=50, max_retries=3, retry_delay=1.0):
+        """
+        :param rate: 平均每秒发送条数
+        :param burst: 最多连续发送条数
+        :param max_retries: 10031 时最多重试次数，每次等待时间翻倍
+        """
+        self.danmu_service = danmu_service
+        self.loop = loop
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue = None  # asyncio.Queue，在事件循环中创建
+        self.worker_task = None
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+        self.pending = 0  # 已提交未完成的条数 (包括正在发送的)
+        self.stats = {
+            "submitted": 0,
+            "sent": 0,
+            "failed": 0,
+            "rejected": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "max_queue_depth": 0,
+            "last_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "total_latency_ms": 0.0,
+        }
+
+    def submit(self, msg, room_id, wait=False):
+        """
+        提交一条弹幕
+        :param wait: 为 True 时阻塞等待发送结果 (兼容同步接口)，否则立即返回
+        :return: {"code": 0, "data": {"ticket": id, "queue_depth": n}}，wait 时返回发送结果
+        """
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.stats["rejected"] += 1
+                return {"code": -1, "msg": "发送队列已满"}
+            self.pending += 1
+            ticket = next(self._tickets)
+            self.stats["submitted"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.pending)
+            depth = self.pending
+        future = Future()
+        item = (ticket, msg, room_id, time.monotonic(), future)
+        self.loop.call_soon_threadsafe(self._enqueue, item)
+        if wait:
+            try:
+                return future.result(timeout=60)
+            except Exception as e:
+                return {"code": -1, "msg": f"发送超时: {e}"}
+        return {"code": 0, "data": {"ticket": ticket, "queue_depth": depth}}
+
+    def _enqueue(self, item):
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.queue.put_nowait(item)
+        if not self.worker_task or self.worker_task.done():
+            self.worker_task = asyncio.create_task(self._worker())
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ticket, msg, room_id, submitted_at, future = await self.queue.get()
+            attempts = 0
+            delay = self.retry_delay
+            try:
+                while True:
+                    await self.bucket.acquire()
+                    attempts += 1
+                    res = await loop.run_in_executor(
+                        None, functools.partial(self.danmu_service.send_danmu, msg, room_id))
+                    code = res.get('code')
+                    if code == CODE_RATE_LIMITED:
+                        self.stats["rate_limited"] += 1
+                        self.bucket.drain()
+                    if code != CODE_RATE_LIMITED or attempts > self.max_retries:
+                        break
+                    self.stats["retries"] += 1
+                    logger.info(f"Send danmu #{ticket} failed ({res.get('msg')}), retry in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    delay *= 2
+            except Exception as e:
+                logger.error(f"Send danmu #{ticket} error: {e}")
+                res = {"code": -1, "msg": str(e)}
+            self._finish(ticket, room_id, submitted_at, attempts, res, future)
+
+    def _finish(self, ticket, room_id, submitted_at, attempts, res, future):
+        latency_ms = (time.monotonic() - submitted_at) * 1000
+        with self._lock:
+            self.pending -= 1
+        stats = self.stats
+        stats["sent" if res.get('code') == 0 else "failed"] += 1
+        stats["last_latency_ms"] = latency_ms
+        stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+        stats["total_latency_ms"] += latency_ms
+        result = dict(res, ticket=ticket, attempts=attempts, latency_ms=round(latency_ms, 1))
+        future.set_result(result)
+        self.danmu_service._emit({
+            'type': 'send_result',
+            'room_id': room_id,
+            'ticket': ticket,
+            'code': res.get('code'),
+            'msg': res.get('msg'),
+            'attempts': attempts,
+            'latency_ms': round(latency_ms, 1),
+        })
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        done = stats["sent"] + stats["failed"]
+        stats["queue_depth"] = self.pending
+        stats["avg_latency_ms"] = stats["total_latency_ms"] / done if done else 0.0
+        stats["rate"] = self.bucket.rate
+        stats["burst"] = self.bucket.burst
+        return stats
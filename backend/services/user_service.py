@@ -57,13 +57,14 @@ class UserService:
         self.state.current_area_names = new_data["last_area_name"]
         return new_data
 
-    def fetch_full_user_data(self):
+    def fetch_full_user_data(self, force=False):
+        # force: 跳过 BilibiliApi 的响应缓存 (用户主动刷新、登录时)
         logger.debug("Fetching full user data...")
-        s1, nav = self.api.get_user_info()
+        s1, nav = self.api.get_user_info(force=force)
         if not s1 or nav.get('code') != 0:
             logger.warning(f"Failed to fetch user info: {nav}")
             return False, nav
-        s2, stat = self.api.get_user_stat()
+        s2, stat = self.api.get_user_stat(force=force)
         stat_data = stat.get('data', {}) if s2 and stat.get('code') == 0 else {}
         full = nav['data']
         full['stat'] = stat_data
@@ -100,7 +101,7 @@ class UserService:
             logger.warning("Refresh failed: No user logged in.")
             return {"code": -1, "msg": "未登录"}
 
-        ok, full_data = self.fetch_full_user_data()
+        ok, full_data = self.fetch_full_user_data(force=True)
         if ok:
             user = self.config_manager.data["users"][uid]
             saved_user = self.save_user_data(uid, full_data, user['cookie'], user['roomId'], user['csrf'])
@@ -130,6 +131,7 @@ class UserService:
         users = self.config_manager.data.get("users", {})
         if uid in users:
             del users[uid]
+            self.api.close_session(uid)
             if self.config_manager.data.get("current_uid") == uid:
                 self.config_manager.data["current_uid"] = None
                 self.state.clear()
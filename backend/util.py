@@ -1,6 +1,10 @@
 import re
 from urllib.parse import unquote
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 def ck_str_to_dict(ck_str: str) -> dict:
     cookies_pattern = re.compile(r'(\w+)=([^;]+)(?:;|$)')
     return {key: unquote(value) for key, value in cookies_pattern.findall(ck_str)}
@@ -15,3 +19,25 @@ def mask_string(s: str, visible_start=2, visible_end=2) -> str:
     if len(s) <= visible_start + visible_end:
         return "*" * len(s)
     return s[:visible_start] + "*" * 5 + s[-visible_end:]
+
+
+def create_session(headers=None, pool_size=10, retries=2) -> requests.Session:
+    """
+    创建复用连接的 requests.Session (keep-alive，省去每次请求的 TCP / TLS 握手)
+    只对 GET 重试 (连接失败、读超时、502/503/504)，POST 不自动重试，避免重复提交
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    # pool_connections 为缓存连接池的主机数，pool_maxsize 为每个主机保留的连接数
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
@@ -0,0 +1,102 @@
+"""
+说明：弹幕命令分发开销基准
+
+对比旧版 _handle_command 的 startswith 判断链和 DanmuService 的命令处理表（dict 查找），
+处理函数均替换为空函数，只统计分发本身的耗时。
+
+用法：python -m benchmarks.bench_command_dispatch [--messages 200000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from backend.bilibili_api import BilibiliApi
+from backend.state import SessionState
+from backend.services.danmu_service import DanmuService
+from benchmarks import samples
+
+
+def noop(command):
+    return None
+
+
+def legacy_dispatch(command):
+    """旧版 _handle_command 的判断链"""
+    cmd = command.get('cmd', '')
+    if cmd.startswith('DANMU_MSG'):
+        return noop(command)
+    elif cmd == 'INTERACT_WORD':
+        return noop(command)
+    elif cmd.startswith('ENTRY_EFFECT'):
+        return noop(command)
+    elif cmd.startswith('SEND_GIFT'):
+        return noop(command)
+    elif cmd.startswith('COMBO_SEND'):
+        return noop(command)
+    elif cmd.startswith('INTERACT_WORD_V2'):
+        return noop(command)
+
+
+def make_service():
+    service = DanmuService(BilibiliApi(), SessionState())
+    service.face_fetch_enabled = False
+    for cmd in list(service.command_handlers):
+        service.register_handler(cmd, noop)
+    return service
+
+
+def bench(label, commands, func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(commands)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>24}: {best / len(commands) * 1e9:8.1f} ns/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    service = make_service()
+    mixes = {
+        'busy_room_mix': samples.random_commands(args.messages),
+        'INTERACT_WORD_V2 only': [samples.interact_word_v2(1, 'u')] * args.messages,
+    }
+
+    def run_legacy(commands):
+        for c in commands:
+            legacy_dispatch(c)
+
+    def run_table(commands):
+        # 与服务中的调用方式一致 (协程)，在一个事件循环中批量执行
+        async def inner():
+            handle = service._handle_command
+            for c in commands:
+                await handle(c)
+        asyncio.run(inner())
+
+    def run_table_sync(commands):
+        cache = service._dispatch_cache
+        resolve = service._resolve_handler
+        for c in commands:
+            cmd = c.get('cmd', '')
+            try:
+                handler = cache[cmd]
+            except KeyError:
+                handler = resolve(cmd)
+            if handler is not None:
+                handler(c)
+
+    for name, commands in mixes.items():
+        print(f"[{name}] messages={len(commands)}")
+        bench('legacy startswith chain', commands, run_legacy, args.repeat)
+        bench('dict lookup', commands, run_table_sync, args.repeat)
+        bench('_handle_command (async)', commands, run_table, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
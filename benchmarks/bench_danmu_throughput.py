@@ -0,0 +1,160 @@
+"""
+说明：弹幕接收全链路吞吐基准
+
+在子进程中启动本地弹幕服务器 (benchmarks.fake_danmu_server)，让 DanmuService 以 ws:// 连接到它，
+走完整的 认证 -> 心跳 -> 接收 -> 解压 -> 解析 -> 命令处理 流程。
+服务器按目标速率推送命令，每条命令带发送时间，命令处理函数执行完时记录端到端延迟。
+报告：持续处理速率 (msgs/s)、延迟 p50/p95/p99/max、客户端进程 CPU 占用和内存 (RSS)。
+
+用法：
+    python -m benchmarks.bench_danmu_throughput                              # 1 个房间，1000 条/秒
+    python -m benchmarks.bench_danmu_throughput --rates 1000,5000,20000     # 依次测试多个速率
+    python -m benchmarks.bench_danmu_throughput --rooms 10 --rates 500      # 10 个房间，每个 500 条/秒
+    python -m benchmarks.bench_danmu_throughput --rates 0                   # 服务器尽可能快地推送
+"""
+
+import argparse
+import asyncio
+import logging
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from backend.bilibili_api import BilibiliApi
+from backend.state import SessionState
+from backend.services.danmu_service import DanmuService
+from benchmarks.fake_danmu_server import DEFAULT_MIX
+
+
+class LocalDanmuService(DanmuService):
+    """连接本地弹幕服务器，跳过 getDanmuInfo / buvid3 / uid 等网络请求"""
+
+    def __init__(self, port):
+        super().__init__(BilibiliApi(), SessionState())
+        self.port = port
+        self.use_wss = False
+        self.api.cookies['buvid3'] = 'bench'
+        self.state.uid = 1
+        self.face_fetch_enabled = False
+
+    async def _fetch_danmu_info(self, room_id):
+        host = {'host': '127.0.0.1', 'port': self.port, 'ws_port': self.port, 'wss_port': self.port}
+        return {'token': 'bench', 'host_list': [host]}
+
+
+def rss_mb():
+    """当前 RSS (MiB)；不支持 /proc 时返回峰值 RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return 0.0
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def start_server(port, rate, protover, mix, tick):
+    cmd = [sys.executable, '-m', 'benchmarks.fake_danmu_server', '--port', str(port), '--rate', str(rate),
+           '--protover', str(protover), '--mix', mix, '--tick', str(tick)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith('READY'):
+        proc.kill()
+        raise RuntimeError(f"Fake danmu server failed to start: {line!r}")
+    return proc
+
+
+async def run(port, rooms, warmup, duration):
+    service = LocalDanmuService(port)
+    latencies = []
+    measuring = False
+
+    def timed(handler):
+        def wrapper(command):
+            event = handler(command)
+            if measuring:
+                latencies.append(time.time() - command['_ts'])
+            return event
+        return wrapper
+
+    for cmd, handler in list(service.command_handlers.items()):
+        service.register_handler(cmd, timed(handler))
+    service.set_callback(lambda event: None)
+
+    for i in range(rooms):
+        await service.start_room(1000 + i)
+    await asyncio.sleep(warmup)
+
+    stats = service.decode_stats
+    received0 = stats['parsed'] + stats['skipped']
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    measuring = True
+    await asyncio.sleep(duration)
+    measuring = False
+    wall = time.perf_counter() - wall0
+    cpu = time.process_time() - cpu0
+    received = stats['parsed'] + stats['skipped'] - received0
+    connected = sum(1 for room in service.rooms.values() if room.connected)
+    await service.stop()
+
+    latencies.sort()
+    return {
+        "connected": connected,
+        "msgs_per_sec": received / wall,
+        "handled": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "cpu_pct": cpu / wall * 100,
+        "rss_mb": rss_mb(),
+        "loop_blocking_ms": stats['loop_blocking_ms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', default='1000', help='每个房间每秒推送的命令数，逗号分隔；0 表示尽可能快')
+    parser.add_argument('--rooms', type=int, default=1)
+    parser.add_argument('--protover', type=int, default=3, choices=[0, 2, 3])
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--tick', type=float, default=0.05, help='服务器推送间隔 (秒)')
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=18765)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(f"rooms={args.rooms} protover={args.protover} duration={args.duration}s mix={args.mix}")
+    for rate in (float(r) for r in args.rates.split(',')):
+        server = start_server(args.port, rate, args.protover, args.mix, args.tick)
+        try:
+            r = asyncio.run(run(args.port, args.rooms, args.warmup, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        target = f"{rate * args.rooms:.0f}/s" if rate else "max"
+        print(f"target={target:>8} connected={r['connected']}/{args.rooms} "
+              f"received={r['msgs_per_sec']:9.0f} msgs/s  "
+              f"latency p50={r['p50_ms']:7.2f}ms p95={r['p95_ms']:7.2f}ms p99={r['p99_ms']:7.2f}ms "
+              f"max={r['max_ms']:7.2f}ms  cpu={r['cpu_pct']:5.1f}% rss={r['rss_mb']:6.1f}MiB "
+              f"loop_blocking={r['loop_blocking_ms']:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+说明：大帧解码对事件循环的阻塞
+
+用 DanmuService._decode_packet 逐帧解码合并后的大帧 (礼物连击时常见数百 KB 的 brotli 帧)，
+同时运行一个 1ms 间隔的计时协程，统计它被延迟的时间 (即事件循环被阻塞的时间，心跳等协程同样会被延迟)。
+先以改动前的方式 (事件循环内解码整帧、中途不让出) 运行，再分别在 off (事件循环内解码)、thread
+两种模式下、每 256 个数据包让出一次事件循环运行。
+
+用法：python -m benchmarks.bench_decode_offload [--frames 30] [--per-frame 3000]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from backend.bilibili_api import BilibiliApi
+from backend.state import SessionState
+from backend.services.danmu_service import DanmuService
+from benchmarks import samples
+
+
+async def ticker(lags, stop):
+    """每 1ms 醒一次，记录实际醒来时间比预期晚了多少"""
+    interval = 0.001
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run(mode, frames, threshold, yield_every):
+    service = DanmuService(BilibiliApi(), SessionState())
+    service.face_fetch_enabled = False
+    service.set_decode_offload(mode, threshold)
+    service.yield_every = yield_every
+    events = []
+    service.set_callback(events.append)
+
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    for frame in frames:
+        await service._decode_packet(frame)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await tick_task
+    service.set_decode_offload("off")
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    stats = service.decode_stats
+    label = f"{mode}/yield={yield_every}" if yield_every < len(frames[0]) else f"{mode}/no-yield"
+    print(f"{label:>18}: total={elapsed * 1000:8.1f}ms events={len(events)} "
+          f"loop_blocking={stats['loop_blocking_ms']:8.1f}ms (max slice {stats['max_loop_blocking_ms']:6.1f}ms) "
+          f"ticker lag p99={p99 * 1000:6.2f}ms max={lags[-1] * 1000 if lags else 0:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--per-frame', type=int, default=3000)
+    parser.add_argument('--threshold', type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    frames = samples.build_frames(args.frames, args.per_frame)
+    print(f"frames={len(frames)} avg_frame={sum(map(len, frames)) // len(frames)} bytes "
+          f"packets/frame={args.per_frame}")
+    # 改动前：事件循环内解码整帧、不让出
+    asyncio.run(run("off", frames, args.threshold, 10 ** 9))
+    for mode in ("off", "thread"):
+        asyncio.run(run(mode, frames, args.threshold, 256))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+说明：弹幕帧解析微基准
+
+对比旧的递归切片解析 (legacy) 和 danmu_protocol.iter_packets 的耗时。
+
+用法：python -m benchmarks.bench_frame_parser [--frames 2000] [--per-frame 20] [--protover 3]
+      python -m benchmarks.bench_frame_parser --recording recordings/xxx.bldr.gz  (使用录制的真实帧)
+"""
+
+import argparse
+import struct
+import time
+import tracemalloc
+import zlib
+
+import brotli
+
+from backend import danmu_protocol
+from backend import danmu_recorder
+from benchmarks import samples
+
+
+def legacy_decode(data, out):
+    """旧版 DanmuService._decode_packet 的解析部分（切片 + 递归）"""
+    offset = 0
+    while offset < len(data):
+        packet_len, header_len, proto_ver, operation, seq = struct.unpack('!IHHII', data[offset:offset + 16])
+        body = data[offset + 16:offset + packet_len]
+        if proto_ver == 2:
+            legacy_decode(zlib.decompress(body), out)
+        elif proto_ver == 3:
+            legacy_decode(brotli.decompress(body), out)
+        else:
+            out.append((operation, body))
+        offset += packet_len
+
+
+def collect_legacy(frames):
+    out = []
+    for frame in frames:
+        legacy_decode(frame, out)
+    return out
+
+
+def collect_new(frames):
+    out = []
+    for frame in frames:
+        out.extend(danmu_protocol.iter_packets(frame))
+    return out
+
+
+def run_legacy(frames):
+    """与服务中一致：逐帧解析，每个包体立即解码为 str 后丢弃"""
+    chars = 0
+    for frame in frames:
+        packets = []
+        legacy_decode(frame, packets)
+        for _, body in packets:
+            chars += len(str(body, 'utf-8'))
+    return chars
+
+
+def run_new(frames):
+    chars = 0
+    for frame in frames:
+        for _, body in danmu_protocol.iter_packets(frame):
+            chars += len(str(body, 'utf-8'))
+    return chars
+
+
+def timeit(func, frames, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_alloc(func, frames):
+    """解析过程中的内存分配峰值"""
+    tracemalloc.start()
+    result = func(frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--per-frame', type=int, default=20)
+    parser.add_argument('--protover', type=int, default=3, choices=[0, 2, 3])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--recording', help='弹幕录制文件，指定后使用其中的帧')
+    args = parser.parse_args()
+
+    if args.recording:
+        frames = [data for _, data in danmu_recorder.read_frames(args.recording)]
+    else:
+        frames = samples.build_frames(args.frames, args.per_frame, args.protover)
+    total_bytes = sum(len(f) for f in frames)
+
+    old = collect_legacy(frames)
+    new = collect_new(frames)
+    assert [(op, bytes(b)) for op, b in old] == [(op, bytes(b)) for op, b in new], "parser output mismatch"
+
+    source = args.recording or f"synthetic protover={args.protover}"
+    print(f"frames={len(frames)} packets={len(new)} wire_bytes={total_bytes} source={source}")
+    for name, func in (('legacy', run_legacy), ('iter_packets', run_new)):
+        elapsed = timeit(func, frames, args.repeat)
+        peak = peak_alloc(func, frames)
+        print(f"{name:>12}: {elapsed * 1000:8.2f} ms  "
+              f"{len(frames) / elapsed:10.0f} frames/s  {len(new) / elapsed:10.0f} packets/s  "
+              f"peak_alloc={peak / 1024:8.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+说明：BilibiliApi HTTP 连接复用基准
+
+在本地启动一个 HTTPS 服务器 (用 openssl 生成临时自签名证书；没有 openssl 时退回 HTTP)，返回 B 站格式的 JSON，
+分别用 模块级 requests.get (旧版，每次新建 TCP + TLS 连接) 和 BilibiliApi 的 Session (keep-alive 连接池)
+调用 BilibiliApi._req，报告单次请求延迟 p50/p95/max 和新建连接数。
+--rtt 模拟网络往返时间：每个请求加 1 个 RTT，每个新连接再加握手的 RTT (TCP 1 个，TLS 1.3 再 1 个)。
+
+用法：
+    python -m benchmarks.bench_http_session                  # 本机回环，只体现握手的 CPU 开销
+    python -m benchmarks.bench_http_session --rtt 30         # 模拟 30ms 往返时间
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from backend.bilibili_api import BilibiliApi
+
+BODY = json.dumps({"code": 0, "message": "0", "data": {"now": 1700000000}}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    rtt = 0.0
+    handshake_rtts = 1
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        # 头部和正文分两次写出，关闭 Nagle 避免与客户端延迟 ACK 叠加出 40ms 等待
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        Handler.connections += 1
+        time.sleep(self.rtt * self.handshake_rtts)
+
+    def do_GET(self):
+        time.sleep(self.rtt)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_cert(directory):
+    """生成 127.0.0.1 的自签名证书，失败时返回 None"""
+    if not shutil.which("openssl"):
+        return None
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1",
+                        "-addext", "subjectAltName=IP:127.0.0.1"],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert, key
+
+
+def start_server(cert, handler=Handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*cert)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def bench(label, api, url, calls):
+    Handler.connections = 0
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        success, res = api._req("GET", url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert success and res["code"] == 0, res
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:>28}: p50={statistics.median(latencies):7.2f}ms  p95={p95:7.2f}ms  "
+          f"max={latencies[-1]:7.2f}ms  connections={Handler.connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.0, help="模拟的网络往返时间 (毫秒)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directory:
+        cert = make_cert(directory)
+        if cert:
+            # 模块级 requests.get 和 Session 都会读取该环境变量来校验证书
+            os.environ["REQUESTS_CA_BUNDLE"] = cert[0]
+        Handler.rtt = args.rtt / 1000
+        Handler.handshake_rtts = 2 if cert else 1
+        server, base = start_server(cert)
+        url = base + "/x/report/click/now"
+        print(f"server={url} calls={args.calls} rtt={args.rtt}ms")
+
+        before = BilibiliApi()
+        before.session = requests  # 旧版：模块级 requests.get / requests.post
+        bench("requests.get (no pooling)", before, url, args.calls)
+
+        after = BilibiliApi()
+        bench("Session (keep-alive pool)", after, url, args.calls)
+
+        after.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+说明：开播 (获取推流地址) 延迟基准
+
+本地 HTTPS 服务器 (见 bench_http_session) 模拟 click/now、getHomePageLiveVersion、startLive 三个接口，
+每个请求等待 --rtt 毫秒，新连接再加握手的 RTT。BilibiliApi 的请求地址被改写到本地服务器。
+对比三种情况从调用 start_live 到拿到推流地址的耗时：
+    legacy     旧版流程：三个请求依次进行，每次新建连接
+    cold       新版，未预热：首次开播仍需三个请求，但复用连接
+    prewarmed  新版，打开开播面板时已预热：只有一次 startLive 请求
+
+用法：python -m benchmarks.bench_start_live [--rtt 30] [--runs 10]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import requests
+
+from backend.bilibili_api import BilibiliApi
+from benchmarks.bench_http_session import Handler, make_cert, start_server
+
+RESPONSES = {
+    "/x/report/click/now": {"code": 0, "data": {"now": int(time.time())}},
+    "/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion":
+        {"code": 0, "data": {"build": 9343, "curr_version": "7.19.0.9343"}},
+    "/room/v1/Room/startLive":
+        {"code": 0, "data": {"rtmp": {"addr": "rtmp://live-push.bilivideo.com/live-bvc/", "code": "?streamname=x"},
+                             "protocols": []}},
+}
+
+
+class LiveHandler(Handler):
+    def _reply(self):
+        time.sleep(self.rtt)
+        if self.command == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(RESPONSES.get(self.path.split("?")[0], {"code": -404})).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+
+class LocalApi(BilibiliApi):
+    """请求地址改写到本地服务器"""
+
+    def __init__(self, base, legacy=False):
+        super().__init__()
+        self.base = base
+        if legacy:
+            self.session = requests  # 旧版：模块级 requests.get / requests.post，不复用连接
+
+    def _req(self, method, url, params=None, data=None):
+        url = url.replace("https://api.bilibili.com", self.base).replace("https://api.live.bilibili.com", self.base)
+        return super()._req(method, url, params=params, data=data)
+
+    def legacy_start_live(self, room_id, area_id, csrf):
+        """旧版 start_live：时间戳、版本、开播三个请求依次进行"""
+        s1, t_resp = self._req("GET", "https://api.bilibili.com/x/report/click/now")
+        ts = t_resp["data"]["now"]
+        v_params = self._appsign({"system_version": 2, "ts": ts})
+        s2, v_resp = self._req("GET",
+                               "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
+                               params=v_params)
+        data = {
+            'room_id': room_id, 'platform': 'pc_link', 'area_v2': area_id, 'backup_stream': '0',
+            'csrf_token': csrf, 'csrf': csrf, 'build': v_resp['data']['build'],
+            'version': v_resp['data']['curr_version'], 'ts': ts
+        }
+        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/startLive", data=self._appsign(data))
+
+
+def measure(start_live):
+    start = time.perf_counter()
+    success, res = start_live(1, 235, "csrf")
+    assert success and res["data"]["rtmp"]["addr"], res
+    return (time.perf_counter() - start) * 1000
+
+
+def report(label, latencies):
+    print(f"{label:>10}: p50={statistics.median(latencies):7.1f}ms  max={max(latencies):7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=30.0, help="模拟的网络往返时间 (毫秒)")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directory:
+        cert = make_cert(directory)
+        if cert:
+            os.environ["REQUESTS_CA_BUNDLE"] = cert[0]
+        LiveHandler.rtt = args.rtt / 1000
+        LiveHandler.handshake_rtts = 2 if cert else 1
+        server, base = start_server(cert, LiveHandler)
+        print(f"server={base} rtt={args.rtt}ms runs={args.runs}")
+
+        # 每次都是新的客户端 (相当于每次启动程序后第一次开播)
+        report("legacy", [measure(LocalApi(base, legacy=True).legacy_start_live) for _ in range(args.runs)])
+        report("cold", [measure(LocalApi(base).start_live) for _ in range(args.runs)])
+        prewarmed = []
+        for _ in range(args.runs):
+            api = LocalApi(base)
+            api.prewarm_live()
+            prewarmed.append(measure(api.start_live))
+        report("prewarmed", prewarmed)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+说明：Wbi 签名基准
+
+1. 签名本身：对比旧版 getMixinKey (reduce 字符串拼接) + encWbi (逐字符 filter lambda)
+   和新版 (预取下标 itemgetter + str.translate)，并校验两者结果一致。
+2. get_w_rid_and_wts：旧版每次调用都请求一次 nav 接口获取 key，新版在有效期内使用缓存。
+   nav 请求用一个等待 --rtt 毫秒的假 Session 代替，不访问网络。
+
+用法：python -m benchmarks.bench_wbi_sign [--signs 100000] [--rtt 30]
+"""
+
+import argparse
+import time
+import urllib.parse
+from functools import reduce
+from hashlib import md5
+
+from backend import get_wbi
+
+IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+NAV = {"data": {"wbi_img": {"img_url": f"https://i0.hdslb.com/bfs/wbi/{IMG_KEY}.png",
+                            "sub_url": f"https://i0.hdslb.com/bfs/wbi/{SUB_KEY}.png"}}}
+
+
+def legacy_mixin_key(orig):
+    return reduce(lambda s, i: s + orig[i], get_wbi.mixinKeyEncTab, '')[:32]
+
+
+def legacy_enc_wbi(params, img_key, sub_key):
+    mixin_key = legacy_mixin_key(img_key + sub_key)
+    params['wts'] = round(time.time())
+    params = dict(sorted(params.items()))
+    params = {k: ''.join(filter(lambda chr: chr not in "!'()*", str(v))) for k, v in params.items()}
+    query = urllib.parse.urlencode(params)
+    params['w_rid'] = md5((query + mixin_key).encode()).hexdigest()
+    return params
+
+
+class FakeNavSession:
+    """代替 requests.Session，get 时等待 rtt 秒后返回 nav 数据"""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        time.sleep(self.rtt)
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return NAV
+
+
+def bench(label, func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    per_call = (time.perf_counter() - start) / n * 1e6
+    print(f"{label:>36}: {per_call:9.2f} us/call")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signs", type=int, default=100000)
+    parser.add_argument("--calls", type=int, default=50, help="get_w_rid_and_wts 调用次数")
+    parser.add_argument("--rtt", type=float, default=30.0, help="模拟 nav 请求耗时 (毫秒)")
+    args = parser.parse_args()
+
+    params = {"id": 21452505, "type": 0, "web_location": 444.8, "msg": "主播好!(*'▽'*)"}
+    a = legacy_enc_wbi(dict(params), IMG_KEY, SUB_KEY)
+    b = get_wbi.encWbi(dict(params), IMG_KEY, SUB_KEY)
+    assert a == b, (a, b)
+
+    print(f"signs={args.signs}")
+    old = bench("legacy getMixinKey", lambda: legacy_mixin_key(IMG_KEY + SUB_KEY), args.signs)
+    new = bench("getMixinKey", lambda: get_wbi.getMixinKey(IMG_KEY + SUB_KEY), args.signs)
+    print(f"{'':>36}  {old / new:.1f}x")
+    old = bench("legacy encWbi", lambda: legacy_enc_wbi(dict(params), IMG_KEY, SUB_KEY), args.signs)
+    new = bench("encWbi", lambda: get_wbi.encWbi(dict(params), IMG_KEY, SUB_KEY), args.signs)
+    print(f"{'':>36}  {old / new:.1f}x")
+
+    print(f"calls={args.calls} nav rtt={args.rtt}ms")
+    session = FakeNavSession(args.rtt / 1000)
+
+    def uncached():
+        img_key, sub_key = get_wbi.getWbiKeys(session)
+        return legacy_enc_wbi(dict(params), img_key, sub_key)
+
+    old = bench("get_w_rid_and_wts (fetch every call)", uncached, args.calls)
+    session.requests = 0
+    get_wbi.key_cache.invalidate()
+    new = bench("get_w_rid_and_wts (key cache)", lambda: get_wbi.get_w_rid_and_wts(dict(params), session), args.calls)
+    print(f"{'':>36}  {old / new:.0f}x, nav requests={session.requests}, cache={get_wbi.key_cache.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+说明：本地弹幕服务器 (用于压测 DanmuService，不需要真实直播间)
+
+实现与 B站弹幕服务器相同的协议：16 字节 `!IHHII` 头，op 7 认证 / op 8 回复，op 2 心跳 / op 3 人气值回复，
+op 5 命令以 protover 2 (zlib) 或 3 (brotli) 压缩合并成帧推送。
+每个连接按目标速率推送命令，命令构成可配置，每条命令带有发送时间 `_ts` (unix 秒) 用于计算端到端延迟。
+
+用法：python -m benchmarks.fake_danmu_server [--port 18765] [--rate 1000] [--protover 3]
+                                             [--mix DANMU_MSG=20,SEND_GIFT=5,INTERACT_WORD_V2=50,ENTRY_EFFECT=5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+from aiohttp import web
+
+from backend import danmu_protocol
+from benchmarks import samples
+
+logger = logging.getLogger("FakeDanmuServer")
+
+DEFAULT_MIX = 'DANMU_MSG=20,SEND_GIFT=6,INTERACT_WORD_V2=40,ENTRY_EFFECT=4,ONLINE_RANK_COUNT=10,WATCHED_CHANGE=8'
+
+
+def parse_mix(text):
+    """DANMU_MSG=20,SEND_GIFT=5 -> [('DANMU_MSG', 20), ('SEND_GIFT', 5)]"""
+    mix = []
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+class CommandPool:
+    """预先生成并序列化的命令模板，发送时只拼接 _ts，避免服务端成为瓶颈"""
+
+    def __init__(self, mix, size=2000, seed=0):
+        rng = random.Random(seed)
+        names = [c for c, _ in mix]
+        weights = [w for _, w in mix]
+        self.templates = []
+        for cmd in rng.choices(names, weights, k=size):
+            command = samples.random_command(rng, cmd)
+            head = '{"cmd":' + json.dumps(command['cmd']) + ',"_ts":'
+            rest = json.dumps({k: v for k, v in command.items() if k != 'cmd'}, ensure_ascii=False)
+            tail = (',' + rest[1:]) if rest != '{}' else '}'
+            self.templates.append((head, tail))
+        self.index = 0
+
+    def next_packets(self, n, ts):
+        out = []
+        templates = self.templates
+        for _ in range(n):
+            head, tail = templates[self.index]
+            self.index = (self.index + 1) % len(templates)
+            out.append(danmu_protocol.pack(danmu_protocol.OP_COMMAND, f"{head}{ts!r}{tail}",
+                                           proto_ver=danmu_protocol.PROTO_JSON))
+        return out
+
+
+class FakeDanmuServer:
+    def __init__(self, rate=1000, proto_ver=3, mix=DEFAULT_MIX, tick=0.05, popularity=12345, token=None):
+        """
+        :param rate: 每个连接每秒推送的命令数，0 表示尽可能快
+        :param tick: 推送间隔 (秒)，每个间隔把这段时间的命令合并成一帧
+        :param token: 不为 None 时校验认证包中的 key
+        """
+        self.rate = rate
+        self.proto_ver = proto_ver
+        self.mix = parse_mix(mix) if isinstance(mix, str) else mix
+        self.tick = tick
+        self.popularity = popularity
+        self.token = token
+        self.connections = set()
+        self.sent_commands = 0
+        self.runner = None
+
+    async def ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections.add(ws)
+        push_task = None
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.BINARY:
+                    continue
+                for operation, body in danmu_protocol.iter_packets(msg.data):
+                    if operation == danmu_protocol.OP_AUTH:
+                        auth = json.loads(bytes(body))
+                        if self.token is not None and auth.get('key') != self.token:
+                            await ws.send_bytes(danmu_protocol.pack(danmu_protocol.OP_AUTH_REPLY, b'{"code":-101}'))
+                            await ws.close()
+                            break
+                        await ws.send_bytes(danmu_protocol.pack(danmu_protocol.OP_AUTH_REPLY, b'{"code":0}'))
+                        if push_task is None:
+                            push_task = asyncio.create_task(self._push_loop(ws, auth.get('roomid', 0)))
+                    elif operation == danmu_protocol.OP_HEARTBEAT:
+                        await ws.send_bytes(danmu_protocol.pack(danmu_protocol.OP_HEARTBEAT_REPLY,
+                                                                self.popularity.to_bytes(4, 'big')))
+        finally:
+            if push_task:
+                push_task.cancel()
+            self.connections.discard(ws)
+        return ws
+
+    async def _push_loop(self, ws, room_id):
+        pool = CommandPool(self.mix, seed=room_id)
+        per_tick = self.rate * self.tick
+        carry = 0.0
+        next_tick = time.monotonic()
+        try:
+            while not ws.closed:
+                if self.rate:
+                    carry += per_tick
+                    n = int(carry)
+                    carry -= n
+                else:
+                    n = 200
+                if n:
+                    # brotli 使用较低的压缩等级，避免压缩成为服务端瓶颈
+                    frame = samples.pack_frame(pool.next_packets(n, time.time()), self.proto_ver, brotli_quality=4)
+                    await ws.send_bytes(frame)
+                    self.sent_commands += n
+                if self.rate:
+                    next_tick += self.tick
+                    await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+                else:
+                    await asyncio.sleep(0)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def host_info(self, port):
+        """与 getDanmuInfo 返回结构一致的主机信息"""
+        return {'host': '127.0.0.1', 'port': port, 'ws_port': port, 'wss_port': port}
+
+    async def start(self, host='127.0.0.1', port=18765):
+        app = web.Application()
+        app.router.add_get('/sub', self.ws_handler)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"Fake danmu server listening on ws://{host}:{port}/sub")
+
+    async def stop(self):
+        for ws in list(self.connections):
+            await ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def serve(args):
+    server = FakeDanmuServer(args.rate, args.protover, args.mix, args.tick)
+    await server.start(args.host, args.port)
+    print(f"READY ws://{args.host}:{args.port}/sub", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--rate', type=float, default=1000, help='每个连接每秒推送的命令数，0 表示尽可能快')
+    parser.add_argument('--protover', type=int, default=3, choices=[0, 2, 3])
+    parser.add_argument('--tick', type=float, default=0.05)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
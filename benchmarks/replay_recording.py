@@ -0,0 +1,57 @@
+"""
+说明：离线回放弹幕录制文件
+
+把 DanmuService 录制的原始帧 (.bldr / .bldr.gz) 送入解码和命令处理流程，不需要网络。
+可用于离线复现线上问题，以及用真实流量测试解码和命令处理的吞吐。
+
+用法：
+    python -m benchmarks.replay_recording recordings/123_20250101_200000.bldr.gz            # 尽可能快
+    python -m benchmarks.replay_recording recordings/123_20250101_200000.bldr.gz --speed 1  # 原速
+    python -m benchmarks.replay_recording FILE --speed 10 --print                            # 10 倍速并打印事件
+"""
+
+import argparse
+import asyncio
+import collections
+import logging
+
+from backend.bilibili_api import BilibiliApi
+from backend.state import SessionState
+from backend.danmu_recorder import FrameReplayer
+from backend.services.danmu_service import DanmuService
+
+
+async def replay(path, speed, print_events):
+    service = DanmuService(BilibiliApi(), SessionState())
+    counts = collections.Counter()
+
+    def on_event(event):
+        counts[event.get('type')] += 1
+        if print_events:
+            print(event)
+
+    service.set_callback(on_event)
+    stats = await FrameReplayer(service, path, speed).run()
+    elapsed = stats['elapsed'] or 1e-9
+    events = sum(counts.values())
+    print(f"frames={stats['frames']} bytes={stats['bytes']} events={events} elapsed={elapsed:.3f}s")
+    print(f"throughput: {stats['frames'] / elapsed:.0f} frames/s  {events / elapsed:.0f} events/s  "
+          f"{stats['bytes'] / elapsed / 1024 / 1024:.2f} MiB/s")
+    print(f"events by type: {dict(counts)}")
+    print(f"decode stats: {service.decode_stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=0, help='回放倍速，0 表示尽可能快')
+    parser.add_argument('--print', dest='print_events', action='store_true', help='打印每条事件')
+    args = parser.parse_args()
+
+    if not args.print_events:
+        logging.disable(logging.INFO)
+    asyncio.run(replay(args.path, args.speed, args.print_events))
+
+
+if __name__ == '__main__':
+    main()
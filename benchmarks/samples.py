@@ -0,0 +1,153 @@
+"""
+说明：基准测试用的弹幕样本数据
+
+按线上抓包的结构构造命令和帧：一帧通常是一个 protover 3 (brotli) 包，内部合并了若干个 op 5 命令包。
+"""
+
+import base64
+import json
+import random
+import time
+import zlib
+
+import brotli
+
+from backend import dm_pb2
+from backend import danmu_protocol
+
+
+def danmu_msg(uid, uname, text, face=''):
+    """DANMU_MSG (V15 结构，带头像)"""
+    extra = {'user': {'uid': uid, 'base': {'name': uname, 'face': face}}}
+    info = [
+        [0, 1, 25, 16777215, int(time.time() * 1000), 0, 0, '', 0, 0, 0, '', 0, '{}', '{}', extra],
+        text,
+        [uid, uname, 0, 0, 0, 10000, 1, ''],
+        [], [0, 0, 9868950, '>50000', 0], ['', ''], 0, 0, None,
+        {'ts': int(time.time()), 'ct': 'ABCDEF01'}, 0, 0, None, None, 0, 105, [0], None,
+    ]
+    return {'cmd': 'DANMU_MSG:4:0:2:2:2:0', 'info': info, 'dm_v2': ''}
+
+
+def send_gift(uid, uname, gift_name='小心心', num=1, face=''):
+    return {
+        'cmd': 'SEND_GIFT',
+        'data': {
+            'uid': uid, 'uname': uname, 'face': face, 'giftName': gift_name, 'giftId': 30607,
+            'num': num, 'action': '投喂', 'price': 0, 'coin_type': 'silver', 'timestamp': int(time.time()),
+        },
+    }
+
+
+def combo_send(uid, uname, gift_name='小心心', combo_num=1):
+    return {
+        'cmd': 'COMBO_SEND',
+        'data': {'uid': uid, 'uname': uname, 'gift_name': gift_name, 'combo_num': combo_num, 'action': '投喂'},
+    }
+
+
+def interact_word_v2(uid, uname, msg_type=1):
+    pb = dm_pb2.InteractWordV2()
+    pb.uid = uid
+    pb.uname = uname
+    pb.msg_type = msg_type
+    pb.timestamp = int(time.time())
+    return {'cmd': 'INTERACT_WORD_V2', 'data': {'dmscore': 0, 'pb': base64.b64encode(pb.SerializeToString()).decode()}}
+
+
+def entry_effect(uid, uname):
+    return {
+        'cmd': 'ENTRY_EFFECT',
+        'data': {'id': 4, 'uid': uid, 'copy_writing': f'欢迎 <%{uname}%> 进入直播间', 'privilege_type': 0},
+    }
+
+
+def online_rank_count(count):
+    return {'cmd': 'ONLINE_RANK_COUNT', 'data': {'count': count, 'count_text': str(count), 'online_count': count}}
+
+
+def watched_change(num):
+    return {'cmd': 'WATCHED_CHANGE', 'data': {'num': num, 'text_small': str(num), 'text_large': f'{num}人看过'}}
+
+
+def like_info_update(click_count):
+    return {'cmd': 'LIKE_INFO_V3_UPDATE', 'data': {'click_count': click_count}}
+
+
+def stop_live_room_list(n=50):
+    return {'cmd': 'STOP_LIVE_ROOM_LIST', 'data': {'room_id_list': list(range(1000000, 1000000 + n))}}
+
+
+# 繁忙直播间的消息构成 (命令生成函数, 权重)
+BUSY_ROOM_MIX = [
+    ('INTERACT_WORD_V2', 40),
+    ('DANMU_MSG', 20),
+    ('ONLINE_RANK_COUNT', 10),
+    ('WATCHED_CHANGE', 8),
+    ('LIKE_INFO_V3_UPDATE', 8),
+    ('SEND_GIFT', 6),
+    ('ENTRY_EFFECT', 4),
+    ('COMBO_SEND', 2),
+    ('STOP_LIVE_ROOM_LIST', 2),
+]
+
+
+def random_command(rng, cmd):
+    uid = rng.randint(10000, 10000 + 5000)
+    uname = f'用户{uid}'
+    if cmd == 'DANMU_MSG':
+        return danmu_msg(uid, uname, rng.choice(['666', '哈哈哈哈', '主播好', '[dog]', '这波可以', '?????']),
+                         face=f'https://i0.hdslb.com/bfs/face/{uid}.jpg')
+    if cmd == 'SEND_GIFT':
+        return send_gift(uid, uname, rng.choice(['小心心', '辣条', '小花花']), rng.randint(1, 10),
+                         face=f'https://i0.hdslb.com/bfs/face/{uid}.jpg')
+    if cmd == 'COMBO_SEND':
+        return combo_send(uid, uname, combo_num=rng.randint(1, 50))
+    if cmd == 'INTERACT_WORD_V2':
+        return interact_word_v2(uid, uname, rng.choice([1, 1, 1, 2, 3]))
+    if cmd == 'ENTRY_EFFECT':
+        return entry_effect(uid, uname)
+    if cmd == 'ONLINE_RANK_COUNT':
+        return online_rank_count(rng.randint(100, 5000))
+    if cmd == 'WATCHED_CHANGE':
+        return watched_change(rng.randint(10000, 90000))
+    if cmd == 'LIKE_INFO_V3_UPDATE':
+        return like_info_update(rng.randint(1000, 90000))
+    return stop_live_room_list()
+
+
+def random_commands(n, mix=BUSY_ROOM_MIX, seed=0):
+    """按权重生成 n 条命令"""
+    rng = random.Random(seed)
+    names = [c for c, _ in mix]
+    weights = [w for _, w in mix]
+    return [random_command(rng, cmd) for cmd in rng.choices(names, weights, k=n)]
+
+
+def command_packet(command):
+    """单个 op 5 命令包"""
+    return danmu_protocol.pack(danmu_protocol.OP_COMMAND, json.dumps(command, ensure_ascii=False),
+                               proto_ver=danmu_protocol.PROTO_JSON)
+
+
+def build_frame(commands, proto_ver=danmu_protocol.PROTO_BROTLI):
+    """把若干命令合并压缩成一帧"""
+    return pack_frame([command_packet(c) for c in commands], proto_ver)
+
+
+def pack_frame(packets, proto_ver=danmu_protocol.PROTO_BROTLI, brotli_quality=11):
+    """把已打包的数据包合并压缩成一帧"""
+    inner = b''.join(packets)
+    if proto_ver == danmu_protocol.PROTO_BROTLI:
+        body = brotli.compress(inner, quality=brotli_quality)
+    elif proto_ver == danmu_protocol.PROTO_ZLIB:
+        body = zlib.compress(inner)
+    else:
+        return inner
+    return danmu_protocol.pack(danmu_protocol.OP_COMMAND, body, proto_ver=proto_ver)
+
+
+def build_frames(n_frames, per_frame=20, proto_ver=danmu_protocol.PROTO_BROTLI, seed=0):
+    """生成 n_frames 个多包帧"""
+    commands = random_commands(n_frames * per_frame, seed=seed)
+    return [build_frame(commands[i:i + per_frame], proto_ver) for i in range(0, len(commands), per_frame)]
@@ -103,6 +103,11 @@ export const useBridge = () => {
       return res.code === 0 ? res.data : {};
     },
 
+    // 预热开播所需的数据 (时钟偏差、版本信息、连接)，开播时只需一次请求
+    async prewarmLive() {
+      return await callPy('prewarm_live');
+    },
+
     async updateSettings(type, val1, val2) {
       log(`正在更新${type}...`);
       let res;
@@ -124,10 +129,11 @@ export const useBridge = () => {
     async toggleLive(isStarting, p_name, s_name) {
       if (isStarting) {
         log('正在获取推流码...');
+        const start = performance.now();
         // 传递分区参数给后端
         const res = await callPy('start_live', p_name, s_name);
         if (res.code === 0) {
-          log('获取成功，已开播！');
+          log(`获取成功，已开播！(${Math.round(performance.now() - start)}ms)`);
           return { success: true, data: res.data };
         } else if (res.code === 60024) {
           log('⚠️ 需要人脸验证');
@@ -183,11 +189,62 @@ export const useBridge = () => {
       return await callPy('stop_danmu_monitor');
     },
 
+    // 多直播间监听 (事件中带 room_id)
+    async startRoomMonitor(roomId) {
+      return await callPy('start_room_monitor', roomId);
+    },
+    async stopRoomMonitor(roomId) {
+      return await callPy('stop_room_monitor', roomId);
+    },
+    async getRoomMonitors() {
+      const res = await callPy('get_room_monitors');
+      return res.code === 0 ? res.data : [];
+    },
+
+    // 人气值 / 看过人数 / 高能榜人数序列 (用于实时图表)
+    async getDanmuSeries(roomId = null, points = 120) {
+      const res = await callPy('get_danmu_series', roomId, points);
+      return res.code === 0 ? res.data : null;
+    },
+
+    // 弹幕实时统计 (1 分钟 / 5 分钟 / 全程)
+    async getDanmuAnalytics(roomId = null, top = 10) {
+      const res = await callPy('get_danmu_analytics', roomId, top);
+      return res.code === 0 ? res.data : null;
+    },
+
+    // 弹幕关键词屏蔽 / 高亮 / 标签规则
+    async getKeywordRules() {
+      const res = await callPy('get_keyword_rules');
+      return res.code === 0 ? res.data : {};
+    },
+    async setKeywordRules(rules) {
+      return await callPy('set_keyword_rules', rules);
+    },
+
+    // 弹幕历史 (分页：下一页传入上一页返回的 next_before_id)
+    async getHistorySessions(beforeId = null, limit = 20) {
+      const res = await callPy('get_history_sessions', beforeId, limit);
+      return res.code === 0 ? res.data : { items: [], next_before_id: null };
+    },
+    async getHistoryEvents(sessionId = null, type = null, uid = null, beforeId = null, limit = 50) {
+      const res = await callPy('get_history_events', sessionId, type, uid, beforeId, limit);
+      return res.code === 0 ? res.data : { items: [], next_before_id: null };
+    },
+    async searchHistory(keyword, sessionId = null, beforeId = null, limit = 50) {
+      const res = await callPy('search_history', keyword, sessionId, beforeId, limit);
+      return res.code === 0 ? res.data : { items: [], next_before_id: null };
+    },
+
     // 发送弹幕
     async sendDanmu(msg) {
       const res = await callPy('send_danmu', msg);
       return res;
     },
+    // 提交到发送队列，立即返回 { code, data: { ticket } }，结果通过 send_result 事件推送
+    async submitDanmu(msg, roomId = null) {
+      return await callPy('submit_danmu', msg, roomId);
+    },
 
     // App 配置
     async getAppConfig() {
@@ -44,6 +44,10 @@ def get_html_path():
     return os.path.join(os.getcwd(), 'frontend', 'dist', 'index.html')
 
 if __name__ == '__main__':
+    # 打包后使用进程池解码弹幕帧时需要
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     api = ApiService()
     window_width = 1000
     window_height = 720
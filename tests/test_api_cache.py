@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+from backend.api_cache import ResponseCache
+
+POLICIES = {"area_list": (3600, True), "user_info": (30, False)}
+OK = (True, {"code": 0, "data": {"value": 1}})
+
+
+class Fetcher:
+    """计数的 fetch，可阻塞到 release 后再返回"""
+
+    def __init__(self, result=OK, block=False):
+        self.result = result
+        self.calls = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+        if not block:
+            self.released.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.released.wait(5)
+        return self.result
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(time, "time", lambda: Clock.now)
+    return Clock
+
+
+def test_single_flight_under_concurrency():
+    cache = ResponseCache(POLICIES)
+    fetch = Fetcher(block=True)
+    results = []
+
+    def call():
+        results.append(cache.get_or_fetch("area_list", None, None, fetch))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    threads[0].start()
+    assert fetch.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # 等待其余线程都进入等待
+    deadline = time.monotonic() + 5
+    while cache.get_stats()["coalesced"] < 9 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    fetch.released.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fetch.calls == 1
+    assert results == [OK] * 10
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["coalesced"], stats["inflight"]) == (1, 9, 0)
+    # 之后的调用命中缓存
+    assert cache.get_or_fetch("area_list", None, None, fetch) == OK
+    assert fetch.calls == 1 and cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("result", [
+    (True, {"code": -101, "message": "账号未登录"}),
+    (False, {"code": -1, "msg": "timeout"}),
+    (True, "not a dict"),
+])
+def test_only_code_zero_is_cached(result):
+    cache = ResponseCache(POLICIES)
+    fetch = Fetcher(result)
+    assert cache.get_or_fetch("user_info", None, "1", fetch) == result
+    assert cache.get_or_fetch("user_info", None, "1", fetch) == result
+    assert fetch.calls == 2
+    assert cache.get_stats()["size"] == 0
+
+
+def test_fetch_exception_is_returned_as_error():
+    cache = ResponseCache(POLICIES)
+
+    def fetch():
+        raise ConnectionError("boom")
+    success, res = cache.get_or_fetch("user_info", None, "1", fetch)
+    assert not success and res == {"code": -1, "msg": "boom"}
+    assert cache.get_stats()["inflight"] == 0
+
+
+def test_expiry(clock):
+    cache = ResponseCache(POLICIES)
+    fetch = Fetcher()
+    cache.get_or_fetch("user_info", None, "1", fetch)
+    clock.now += 29
+    cache.get_or_fetch("user_info", None, "1", fetch)
+    assert fetch.calls == 1
+    clock.now += 1
+    cache.get_or_fetch("user_info", None, "1", fetch)
+    assert fetch.calls == 2
+
+
+def test_scoping_force_and_invalidate():
+    cache = ResponseCache(POLICIES)
+    fetch = Fetcher()
+    cache.get_or_fetch("user_info", None, "1", fetch)
+    cache.get_or_fetch("user_info", None, "2", fetch)            # 其他账户
+    cache.get_or_fetch("user_info", {"a": 1}, "1", fetch)        # 其他参数
+    assert fetch.calls == 3
+    cache.get_or_fetch("user_info", None, "1", fetch, force=True)
+    assert fetch.calls == 4
+    cache.invalidate(account="1")
+    assert cache.get_stats()["size"] == 1
+    cache.get_or_fetch("user_info", None, "2", fetch)
+    assert fetch.calls == 4
+    cache.invalidate()
+    assert cache.get_stats()["size"] == 0
+
+
+def test_uncached_endpoint_and_copies():
+    cache = ResponseCache(POLICIES)
+    fetch = Fetcher()
+    cache.get_or_fetch("other", None, None, fetch)
+    cache.get_or_fetch("other", None, None, fetch)
+    assert fetch.calls == 2
+    # 返回副本，调用方修改不影响缓存
+    first = cache.get_or_fetch("area_list", None, None, fetch)
+    first[1]["data"]["value"] = 2
+    assert cache.get_or_fetch("area_list", None, None, fetch) == OK
+
+
+def test_persistence(tmp_path, clock):
+    path = str(tmp_path / "api_cache.json")
+    cache = ResponseCache(POLICIES, path)
+    fetch = Fetcher()
+    cache.get_or_fetch("area_list", None, None, fetch)
+    cache.get_or_fetch("user_info", None, "1", fetch)
+    cache.save()
+
+    loaded = ResponseCache(POLICIES, path)
+    loaded.load()
+    # 只持久化标记为持久化的接口
+    assert loaded.get_stats()["size"] == 1
+    assert loaded.get_or_fetch("area_list", None, None, fetch) == OK
+    assert fetch.calls == 2
+
+    clock.now += 3600
+    expired = ResponseCache(POLICIES, path)
+    expired.load()
+    assert expired.get_stats()["size"] == 0
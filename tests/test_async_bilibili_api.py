@@ -0,0 +1,137 @@
+import asyncio
+import json
+import urllib.parse
+
+import aiohttp
+import pytest
+
+from backend import get_wbi
+from backend.async_bilibili_api import AsyncBilibiliApi
+from backend.bilibili_api import BilibiliApi
+from backend.get_wbi import WbiKeyCache
+
+IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+NAV = {"code": 0, "data": {"isLogin": True, "mid": 1,
+                           "wbi_img": {"img_url": f"https://i0.hdslb.com/bfs/wbi/{IMG_KEY}.png",
+                                       "sub_url": f"https://i0.hdslb.com/bfs/wbi/{SUB_KEY}.png"}}}
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def __aenter__(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return json.dumps(self.body)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """按顺序返回预设的 (状态码, JSON 或异常)，记录每个请求"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, params=None, data=None, cookies=None, **kwargs):
+        self.requests.append((method, url, params, dict(cookies or {})))
+        status, body = self.responses.pop(0) if self.responses else (200, {"code": 0, "data": {}})
+        return FakeResponse(status, body)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待时间，不实际等待"""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return delays
+
+
+def make_client(session, api=None):
+    async def get_session():
+        return session
+    return AsyncBilibiliApi(api or BilibiliApi(), get_session)
+
+
+def test_get_retries_on_502(sleeps):
+    session = FakeSession((502, {}), (503, {}), (200, {"code": 0, "data": {"v": 1}}))
+    success, res = asyncio.run(make_client(session)._req("GET", "https://example.com/x"))
+    assert success and res["data"] == {"v": 1}
+    assert len(session.requests) == 3 and sleeps == [0.3, 0.6]
+
+
+def test_post_is_not_retried(sleeps):
+    session = FakeSession((502, {"code": -1, "message": "bad gateway"}))
+    success, res = asyncio.run(make_client(session)._req("POST", "https://example.com/x"))
+    assert success and res["code"] == -1
+    assert len(session.requests) == 1 and sleeps == []
+
+
+def test_connection_errors_give_up_after_retries(sleeps):
+    error = aiohttp.ClientConnectionError("refused")
+    session = FakeSession((0, error), (0, error), (0, error))
+    success, res = asyncio.run(make_client(session)._req("GET", "https://example.com/x"))
+    assert not success and res == {"code": -1, "msg": "refused"}
+    assert len(session.requests) == 3
+
+
+def test_cookies_follow_account_switch():
+    api = BilibiliApi()
+    session = FakeSession()
+    client = make_client(session, api)
+    api.update_cookies({"DedeUserID": "1", "SESSDATA": "a"})
+    asyncio.run(client._req("GET", "https://example.com/x"))
+    api.update_cookies({"DedeUserID": "2", "SESSDATA": "b"})
+    asyncio.run(client._req("GET", "https://example.com/x"))
+    assert [r[3]["SESSDATA"] for r in session.requests] == ["a", "b"]
+
+
+def test_get_user_info_primes_wbi_keys(monkeypatch):
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    session = FakeSession((200, NAV))
+    success, res = asyncio.run(make_client(session).get_user_info())
+    assert success and res["data"]["mid"] == 1
+    assert get_wbi.key_cache.get() == get_wbi.getMixinKey(IMG_KEY + SUB_KEY)
+
+
+def test_get_danmu_info_refreshes_keys_once_on_sign_error(monkeypatch):
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    session = FakeSession(
+        (200, NAV),                                   # 首次签名前获取 key
+        (200, {"code": -352, "message": "风控校验失败"}),
+        (200, NAV),                                   # 签名被拒绝后重新获取 key
+        (200, {"code": -352, "message": "风控校验失败"}),
+    )
+    success, res = asyncio.run(make_client(session).get_danmu_info(100))
+    # 只重试一次，第二次失败直接返回
+    assert success and res["code"] == -352
+    urls = [urllib.parse.urlparse(r[1]).path for r in session.requests]
+    assert urls == ["/x/web-interface/nav", "/xlive/web-room/v1/index/getDanmuInfo"] * 2
+    signed = session.requests[1][2]
+    assert signed["id"] == "100" and "w_rid" in signed and "wts" in signed
+    assert get_wbi.key_cache.stats["invalidations"] == 1
+
+
+def test_get_danmu_info_uses_cached_key(monkeypatch):
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    get_wbi.key_cache.set(IMG_KEY, SUB_KEY)
+    session = FakeSession((200, {"code": 0, "data": {"token": "t", "host_list": []}}))
+    success, res = asyncio.run(make_client(session).get_danmu_info(100))
+    assert res["data"]["token"] == "t" and len(session.requests) == 1
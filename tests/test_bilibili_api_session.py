@@ -0,0 +1,106 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend import util
+from backend.bilibili_api import BilibiliApi
+
+
+class Handler(BaseHTTPRequestHandler):
+    """返回 B 站格式的 JSON；statuses 中的状态码依次用于前几个请求，记录请求数和新建连接数"""
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    statuses = []
+    requests = []
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        # 头部和正文分两次写出，关闭 Nagle 避免与客户端延迟 ACK 叠加出 40ms 等待
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        Handler.connections += 1
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        Handler.requests.append((self.command, self.path, self.headers.get("Cookie")))
+        status = Handler.statuses.pop(0) if Handler.statuses else 200
+        body = json.dumps({"code": 0 if status == 200 else -1, "data": {}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.path.startswith("/login"):
+            self.send_header("Set-Cookie", "server_side=1; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.statuses = []
+    Handler.requests = []
+    Handler.connections = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_reuse_one_connection(server):
+    api = BilibiliApi()
+    for _ in range(10):
+        success, res = api._req("GET", f"{server}/x")
+        assert success and res["code"] == 0
+    assert Handler.connections == 1
+    api.close()
+
+
+def test_get_retried_on_503_post_not_retried(server):
+    session = util.create_session(retries=2)
+    Handler.statuses = [503, 503]
+    assert session.get(f"{server}/get", timeout=5).status_code == 200
+    assert [r[0] for r in Handler.requests] == ["GET"] * 3
+
+    Handler.requests = []
+    Handler.statuses = [503]
+    assert session.post(f"{server}/post", timeout=5).status_code == 503
+    assert [r[0] for r in Handler.requests] == ["POST"]
+    session.close()
+
+
+def test_sessions_per_account(server):
+    api = BilibiliApi()
+    anonymous = api.session
+    api.update_cookies({"DedeUserID": "1", "SESSDATA": "a"})
+    first = api.session
+    api.update_cookies({"DedeUserID": "2", "SESSDATA": "b"})
+    second = api.session
+    assert len({id(anonymous), id(first), id(second)}) == 3
+    api.update_cookies({"DedeUserID": "1", "SESSDATA": "a"})
+    assert api.session is first
+
+    # 服务端下发的 cookie 只保存在该账户的 Session 中
+    api._req("GET", f"{server}/login")
+    api._req("GET", f"{server}/x")
+    api.update_cookies({"DedeUserID": "2", "SESSDATA": "b"})
+    api._req("GET", f"{server}/x")
+    cookies = [r[2] for r in Handler.requests]
+    assert "server_side=1" in cookies[1] and "SESSDATA=a" in cookies[1]
+    assert "server_side" not in cookies[2] and "SESSDATA=b" in cookies[2]
+
+    # 退出登录关闭该账户的 Session，当前账户退回匿名 Session
+    api.close_session(2)
+    assert "2" not in api.sessions and api.session is anonymous
+    api.close()
+    assert api.sessions == {}
@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from backend.danmu_analytics import DanmuAnalytics, HyperLogLog, TopCounter, WindowCounter, extract_words
+
+
+def danmu(uid, msg="你好", uname=None):
+    return {"type": "danmu", "uid": uid, "uname": uname or f"u{uid}", "msg": msg}
+
+
+def gift(name, num=1):
+    return {"type": "gift", "uid": 1, "gift_name": name, "num": num}
+
+
+def test_window_expiry():
+    counter = WindowCounter(window=60, bucket=10)
+    counter.add("a", 1, now=0.0)
+    counter.add("a", 2, now=15.0)
+    counter.add("b", 1, now=35.0)
+    counter.expire(now=59.0)
+    assert counter.count == 4 and counter.totals == {"a": 3, "b": 1}
+    # 第一个桶 (0~10 秒) 过期
+    counter.expire(now=60.0)
+    assert counter.count == 3 and counter.totals == {"a": 2, "b": 1}
+    counter.expire(now=95.0)
+    assert counter.count == 0 and not counter.totals and not counter.buckets
+
+
+def test_window_max_keys_counts_total_only():
+    counter = WindowCounter(window=60, max_keys=2)
+    for key in "abc":
+        counter.add(key, 1, now=0.0)
+    assert counter.count == 3 and set(counter.totals) == {"a", "b"}
+    counter.expire(now=60.0)
+    assert counter.count == 0 and not counter.totals
+
+
+def test_top_n():
+    counter = WindowCounter(window=60)
+    for key, n in [("a", 5), ("b", 9), ("c", 1), ("d", 7)]:
+        counter.add(key, n, now=0.0)
+    assert counter.top(2) == [("b", 9), ("d", 7)]
+    top = TopCounter(max_keys=2)
+    for key, n in [("a", 5), ("b", 9), ("c", 1), ("d", 7), ("e", 2)]:
+        top.add(key, n)
+    # 超过 2 * max_keys 个 key 时裁剪低频 key，高频 key 的计数保持准确
+    assert top.top(2) == [("b", 9), ("d", 7)]
+    assert len(top.counts) <= 4
+
+
+@pytest.mark.parametrize("n", [100, 10000, 200000])
+def test_hyperloglog_error_bound(n):
+    hll = HyperLogLog(p=12)
+    for uid in range(1, n + 1):
+        hll.add(uid)
+        hll.add(uid)  # 重复的值不影响结果
+    # p=12 时标准误差约 1.6%，取 4 倍
+    assert abs(hll.count() - n) <= max(2, 0.065 * n)
+
+
+def test_extract_words():
+    assert extract_words("哈哈哈哈哈[doge]") == ["[doge]", "哈哈哈"]
+    assert extract_words("这条弹幕比较长所以只提取 GG 和 666") == ["gg", "666"]
+    assert extract_words("") == []
+
+
+def test_snapshot():
+    analytics = DanmuAnalytics(cache_ttl=0)
+    for uid in (1, 1, 2):
+        analytics.add(danmu(uid, "666"))
+    analytics.add(gift("小心心", 3))
+    analytics.add({"type": "interact", "uid": 3})
+    snapshot = analytics.snapshot(top=5)
+    for name in ("1m", "5m"):
+        assert snapshot[name]["messages"] == 3
+        assert snapshot[name]["chatters"] == 2
+        assert snapshot[name]["top_senders"][0] == {"uid": 1, "uname": "u1", "count": 2}
+        assert snapshot[name]["top_gifts"] == [{"gift_name": "小心心", "num": 3}]
+        assert snapshot[name]["top_words"] == [{"word": "666", "count": 3}]
+    assert snapshot["session"]["messages"] == 3
+    assert snapshot["session"]["chatters"] == 2
+    assert snapshot["session"]["gifts"] == 3
+
+
+def test_concurrent_add_and_snapshot():
+    # add 在弹幕事件循环线程，snapshot 在 pywebview 线程
+    analytics = DanmuAnalytics(max_keys=50, cache_ttl=0)
+    # 缩短窗口，运行期间桶持续过期 (add 和 snapshot 都会触发过期)
+    for window in analytics.windows.values():
+        for counter in window.values():
+            counter.window = 0.05
+            counter.bucket = 0.01
+    errors = []
+    done = threading.Event()
+    n = 20000
+
+    def produce():
+        try:
+            for i in range(n):
+                analytics.add(danmu(i % 500, f"词{i % 300}"))
+                analytics.add(gift(f"礼物{i % 20}"))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def consume():
+        try:
+            while not done.is_set():
+                analytics.snapshot()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=produce)] + [threading.Thread(target=consume) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not errors
+    assert analytics.messages == n and analytics.gifts == n
+    # 窗口合计与各 key 计数一致 (桶没有被重复扣减)
+    for window in analytics.windows.values():
+        counter = window["gifts"]
+        assert counter.count == sum(counter.totals.values()) >= 0
+        assert counter.count == sum(sum(c.values()) for _, c in counter.buckets)
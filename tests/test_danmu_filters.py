@@ -0,0 +1,127 @@
+from backend.danmu_filters import GiftAggregator, InteractDeduper
+
+
+def test_dedup_within_window():
+    deduper = InteractDeduper(window=10.0)
+    key = (1, 100, "entry")
+    assert not deduper.seen(key, now=0.0)
+    assert deduper.seen(key, now=5.0)
+    assert deduper.seen(key, now=9.9)
+    # 其他直播间 / 用户 / 种类不受影响
+    assert not deduper.seen((2, 100, "entry"), now=1.0)
+    assert not deduper.seen((1, 101, "entry"), now=1.0)
+    assert not deduper.seen((1, 100, "follow"), now=1.0)
+    assert deduper.hits == 2 and deduper.misses == 4
+
+
+def test_window_counts_from_first_occurrence():
+    deduper = InteractDeduper(window=10.0)
+    key = (1, 100, "entry")
+    assert not deduper.seen(key, now=0.0)
+    # 命中不刷新时间，第一次出现 10 秒后过期
+    assert deduper.seen(key, now=9.0)
+    assert not deduper.seen(key, now=10.0)
+    assert deduper.seen(key, now=15.0)
+
+
+def test_expired_keys_are_removed():
+    deduper = InteractDeduper(window=10.0)
+    for i in range(100):
+        deduper.seen(i, now=float(i) / 100)
+    assert deduper.get_stats()["size"] == 100
+    deduper.seen("new", now=20.0)
+    assert deduper.get_stats()["size"] == 1
+
+
+def test_eviction_at_max_size():
+    deduper = InteractDeduper(window=10.0, max_size=3)
+    for key in "abcd":
+        assert not deduper.seen(key, now=0.0)
+    stats = deduper.get_stats()
+    assert stats["size"] == 3 and stats["evictions"] == 1
+    # 最早的 a 被淘汰，窗口内再次出现不再算重复
+    assert not deduper.seen("a", now=1.0)
+    assert deduper.seen("d", now=1.0)
+
+
+def test_disabled():
+    deduper = InteractDeduper(window=0)
+    assert not deduper.seen("a", now=0.0)
+    assert not deduper.seen("a", now=0.0)
+
+
+def gift(num=1):
+    return {"type": "gift", "uid": 1, "uname": "a", "gift_name": "小心心", "num": num}
+
+
+def test_combo_merges_within_window():
+    aggregator = GiftAggregator(window=3.0, update_interval=0.5)
+    key = (1, 1, "小心心")
+    first = aggregator.add(key, gift(), 1, now=0.0)
+    assert first["num"] == 1 and first["final"] is False
+    # update_interval 内的礼物只累计，不立即推送
+    assert aggregator.add(key, gift(), 1, now=0.1) is None
+    assert aggregator.add(key, gift(2), 2, now=0.2) is None
+    update = aggregator.add(key, gift(), 1, now=0.6)
+    assert update["num"] == 5 and update["combo_id"] == first["combo_id"] and update["final"] is False
+    # 首个事件已推送，之后的累计不会修改它
+    assert first["num"] == 1
+    assert aggregator.flush(now=1.0) == []
+    assert aggregator.pending == 1
+
+
+def test_combo_final_after_window():
+    aggregator = GiftAggregator(window=3.0, update_interval=0.5)
+    key = (1, 1, "小心心")
+    aggregator.add(key, gift(), 1, now=0.0)
+    aggregator.add(key, gift(), 1, now=0.1)
+    # 窗口从最后一个礼物开始计算：3.05 秒时连击仍在进行，只推送累计数量
+    assert [(e["num"], e["final"]) for e in aggregator.flush(now=3.05)] == [(2, False)]
+    assert aggregator.pending == 1
+    events = aggregator.flush(now=3.2)
+    assert [(e["num"], e["combo_count"], e["final"]) for e in events] == [(2, 2, True)]
+    assert aggregator.pending == 0
+    # 窗口结束后同一礼物开始新的连击
+    assert aggregator.add(key, gift(), 1, now=4.0)["combo_id"] != events[0]["combo_id"]
+
+
+def test_flush_pushes_pending_update():
+    aggregator = GiftAggregator(window=3.0, update_interval=0.5)
+    key = (1, 1, "小心心")
+    aggregator.add(key, gift(), 1, now=0.0)
+    aggregator.add(key, gift(), 1, now=0.1)
+    events = aggregator.flush(now=0.6)
+    assert [(e["num"], e["final"]) for e in events] == [(2, False)]
+    assert aggregator.flush(now=0.7) == []
+
+
+def test_cumulative_combo_num():
+    aggregator = GiftAggregator(window=3.0)
+    key = (1, 1, "小心心")
+    aggregator.add(key, gift(), 1, now=0.0)
+    # COMBO_SEND 的 combo_num 为累计数量，可能与 SEND_GIFT 重复计数，取最大值
+    aggregator.add(key, gift(), 3, cumulative=True, now=0.1)
+    aggregator.add(key, gift(), 2, cumulative=True, now=0.2)
+    assert [e["num"] for e in aggregator.flush(now=10.0)] == [3]
+
+
+def test_force_flush_ends_all_combos():
+    aggregator = GiftAggregator(window=3.0)
+    aggregator.add((1, 1, "a"), gift(), 1, now=0.0)
+    aggregator.add((1, 2, "a"), gift(), 2, now=0.0)
+    aggregator.add((2, 1, "b"), gift(), 3, now=0.0)
+    events = aggregator.flush(now=0.1, force=True)
+    assert sorted(e["num"] for e in events) == [1, 2, 3]
+    assert all(e["final"] for e in events)
+    assert aggregator.pending == 0 and aggregator.flush(now=10.0, force=True) == []
+
+
+def test_max_combos_evicts_oldest():
+    aggregator = GiftAggregator(window=3.0, max_combos=2)
+    first = aggregator.add((1, 1, "a"), gift(), 1, now=0.0)
+    aggregator.add((1, 2, "a"), gift(), 1, now=0.1)
+    aggregator.add((1, 3, "a"), gift(), 1, now=0.2)
+    assert aggregator.pending == 3  # 2 个进行中 + 1 个已结束待推送
+    events = aggregator.flush(now=0.3)
+    assert [(e["combo_id"], e["final"]) for e in events] == [(first["combo_id"], True)]
+    assert aggregator.get_stats()["evicted"] == 1 and aggregator.pending == 2
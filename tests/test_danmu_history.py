@@ -0,0 +1,145 @@
+import os
+import random
+import sqlite3
+
+import pytest
+
+from backend.danmu_history import DanmuHistory
+
+
+def danmu(msg, uid=1, uname="观众", room_id=100):
+    return {"type": "danmu", "room_id": room_id, "uid": uid, "uname": uname, "msg": msg}
+
+
+def gift(num, final=True, uid=2):
+    return {"type": "gift", "room_id": 100, "uid": uid, "uname": "老板", "gift_name": "小心心", "num": num,
+            "final": final}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = DanmuHistory(str(tmp_path / "history.db"), interval=0.01, max_batch=3)
+    yield history
+    history.close()
+
+
+def flush(history):
+    """停止写入线程 (写完队列中剩余的事件) 后重新启动"""
+    history.stop()
+    history.start()
+
+
+def msgs(page):
+    return [item["msg"] for item in page["items"]]
+
+
+def test_batching_and_sessions(history):
+    history.start()
+    for i in range(5):
+        history.record(danmu(f"第{i}条"))
+    history.start_session(100, "标题", "分区")
+    history.record(danmu("开播后"))
+    history.record({"type": "interact", "room_id": 100, "uid": 3, "uname": "c", "msg": "进入直播间"})
+    history.end_session()
+    history.record(danmu("下播后"))
+    flush(history)
+
+    stats = history.get_stats()
+    assert stats["written"] == 8
+    assert stats["batches"] >= 3  # max_batch=3
+    sessions = history.list_sessions()["items"]
+    # 未开播时的事件自动归入一个场次；新的在前
+    assert [(s["title"], s["danmu_count"], s["interact_count"]) for s in sessions] == [
+        ("", 1, 0), ("标题", 1, 1), ("", 5, 0)]
+    assert all(s["ended_at"] for s in sessions)
+    assert msgs(history.query_events(session_id=sessions[1]["id"])) == ["进入直播间", "开播后"]
+
+
+def test_only_final_gifts_are_stored(history):
+    history.start()
+    history.record(gift(1, final=False))
+    history.record(gift(3, final=False))
+    history.record(gift(5, final=True))
+    history.record({"type": "gift", "room_id": 100, "uid": 4, "gift_name": "辣条", "num": 2})  # 未合并的礼物
+    history.record({"type": "system", "msg": "不记录"})
+    flush(history)
+    items = history.query_events(event_type="gift")["items"]
+    assert [(i["gift_name"], i["num"]) for i in items] == [("辣条", 2), ("小心心", 5)]
+    assert history.list_sessions()["items"][0]["gift_count"] == 2
+
+
+def test_search(history):
+    history.start()
+    for msg in ["主播好", "主播晚上好呀", "哈哈哈哈", "666", "GG wp", "好耶!", "笑死😀", '他说"你好"']:
+        history.record(danmu(msg))
+    history.record(danmu("普通弹幕", uname="主播的粉丝"))
+    flush(history)
+    assert msgs(history.search("晚上好")) == ["主播晚上好呀"]                    # trigram
+    assert msgs(history.search("主播")) == ["普通弹幕", "主播晚上好呀", "主播好"]  # 2 个字，含用户名
+    assert msgs(history.search("好")) == ['他说"你好"', "好耶!", "主播晚上好呀", "主播好"]
+    assert msgs(history.search("gg")) == ["GG wp"]                             # 不区分大小写
+    assert msgs(history.search("6")) == ["666"]
+    assert msgs(history.search("!")) == ["好耶!"]
+    assert msgs(history.search("😀")) == ["笑死😀"]
+    assert msgs(history.search('"')) == ['他说"你好"']
+    assert msgs(history.search("不存在")) == [] and msgs(history.search("无")) == []
+    assert msgs(history.search("  ")) == []
+
+
+def test_short_keyword_index_matches_substring_scan(history):
+    rng = random.Random(0)
+    chars = "主播好哈6!😀ab "
+    texts = [''.join(rng.choice(chars) for _ in range(rng.randint(1, 8))) for _ in range(300)]
+    history.start()
+    for text in texts:
+        history.record(danmu(text, uname="u"))
+    flush(history)
+    for keyword in ["主", "主播", "哈哈", "6!", "😀a", "b", "!"]:
+        expected = [t for t in reversed(texts) if keyword in t.lower()]
+        assert msgs(history.search(keyword, limit=1000)) == expected, keyword
+
+
+def test_before_id_paging(history):
+    history.start()
+    for i in range(25):
+        history.record(danmu(f"主播{i:02d}"))
+    flush(history)
+    for query in (lambda before: history.search("主播", before_id=before, limit=10),
+                  lambda before: history.search("主播0", before_id=before, limit=10),
+                  lambda before: history.query_events(event_type="danmu", before_id=before, limit=10)):
+        seen = []
+        before = None
+        while True:
+            page = query(before)
+            seen += msgs(page)
+            before = page["next_before_id"]
+            if before is None:
+                break
+        assert seen == sorted(seen, reverse=True)
+        assert len(seen) == len(set(seen)) and seen[0].startswith("主播")
+    assert len(msgs(history.search("主播", limit=100))) == 25
+    assert history.list_sessions(limit=1)["next_before_id"] is not None
+
+
+def test_grams_backfilled_for_existing_database(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = DanmuHistory(path, interval=0.01)
+    history.start()
+    history.record(danmu("主播好"))
+    history.close()
+    # 模拟旧版本创建的数据库
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TRIGGER events_grams_insert; DROP TRIGGER events_grams_delete; DROP TABLE events_grams;")
+    conn.close()
+    history = DanmuHistory(path)
+    try:
+        assert msgs(history.search("播")) == ["主播好"]
+    finally:
+        history.close()
+
+
+def test_indexes_used(history):
+    plan = " ".join(row[3] for row in history.reader.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM events WHERE type = 'gift' ORDER BY id DESC LIMIT 50"))
+    assert "idx_events_type" in plan
+    assert os.path.exists(history.path)
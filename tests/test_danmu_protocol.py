@@ -0,0 +1,95 @@
+import json
+import struct
+import zlib
+
+import brotli
+import pytest
+
+from backend import danmu_protocol
+from backend.danmu_protocol import (OP_COMMAND, OP_HEARTBEAT_REPLY, PROTO_BROTLI, PROTO_INT, PROTO_JSON, PROTO_ZLIB,
+                                    PacketError, iter_packets, pack, split_frame)
+
+
+def command(cmd, **data):
+    return pack(OP_COMMAND, json.dumps({"cmd": cmd, "data": data}, ensure_ascii=False), proto_ver=PROTO_JSON)
+
+
+def compressed(proto_ver, *packets):
+    inner = b''.join(packets)
+    body = zlib.compress(inner) if proto_ver == PROTO_ZLIB else brotli.compress(inner)
+    return pack(OP_COMMAND, body, proto_ver=proto_ver)
+
+
+def reference_decode(data):
+    """逐层切片、递归解压的朴素解析，作为 iter_packets 的对照"""
+    out = []
+    offset = 0
+    while offset < len(data):
+        packet_len, header_len, proto_ver, operation, _ = struct.unpack('!IHHII', data[offset:offset + 16])
+        body = data[offset + header_len:offset + packet_len]
+        if proto_ver == PROTO_ZLIB:
+            out.extend(reference_decode(zlib.decompress(body)))
+        elif proto_ver == PROTO_BROTLI:
+            out.extend(reference_decode(brotli.decompress(body)))
+        else:
+            out.append((operation, body))
+        offset += packet_len
+    return out
+
+
+def decoded(data):
+    return [(operation, bytes(body)) for operation, body in iter_packets(data)]
+
+
+FRAMES = {
+    "plain": command("DANMU_MSG", text="a") + pack(OP_HEARTBEAT_REPLY, struct.pack('!I', 42), proto_ver=PROTO_INT),
+    "brotli": compressed(PROTO_BROTLI, *(command("DANMU_MSG", text=str(i)) for i in range(20))),
+    "zlib": compressed(PROTO_ZLIB, *(command("SEND_GIFT", num=i) for i in range(20))),
+    # 外层 brotli 中嵌套 zlib，压缩包前后都有普通包
+    "nested": compressed(
+        PROTO_BROTLI,
+        command("DANMU_MSG", text="前"),
+        compressed(PROTO_ZLIB, command("INTERACT_WORD", uname="中"), compressed(PROTO_BROTLI, command("LIKE", n=1))),
+        command("DANMU_MSG", text="后"),
+    ),
+    # 一帧内多个压缩包和普通包交替
+    "mixed": command("A") + compressed(PROTO_ZLIB, command("B"), command("C")) + command("D")
+             + compressed(PROTO_BROTLI, command("E")) + pack(OP_HEARTBEAT_REPLY, b'\x00\x00\x00\x01', PROTO_INT),
+}
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_iter_packets_matches_reference(name):
+    frame = FRAMES[name]
+    expected = reference_decode(frame)
+    assert decoded(frame) == expected
+    assert decoded(bytearray(frame)) == expected
+    assert decoded(memoryview(frame)) == expected
+    assert split_frame(frame, copy=True) == expected
+
+
+def test_nested_order():
+    cmds = [danmu_protocol.peek_cmd(body) for _, body in iter_packets(FRAMES["nested"])]
+    assert cmds == ["DANMU_MSG", "INTERACT_WORD", "LIKE", "DANMU_MSG"]
+    cmds = [danmu_protocol.peek_cmd(body) for _, body in iter_packets(FRAMES["mixed"])]
+    assert cmds == ["A", "B", "C", "D", "E", None]
+
+
+@pytest.mark.parametrize("name", ["brotli", "zlib"])
+def test_inflate_frame_single_compressed_packet(name):
+    frame = FRAMES[name]
+    inner = danmu_protocol.inflate_frame(frame)
+    assert inner != frame
+    assert decoded(inner) == decoded(frame)
+    # 多个数据包的帧原样返回
+    assert danmu_protocol.inflate_frame(FRAMES["mixed"]) is FRAMES["mixed"]
+
+
+@pytest.mark.parametrize("data", [
+    FRAMES["plain"][:10],                        # 头部不完整
+    FRAMES["plain"][:-3],                        # 包体不完整
+    struct.pack('!IHHII', 8, 16, 0, 5, 1),       # packet_len 小于 header_len
+])
+def test_malformed_frames(data):
+    with pytest.raises(PacketError):
+        decoded(data)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backend.bilibili_api import BilibiliApi
+from backend.danmu_protocol import OP_COMMAND, PROTO_JSON, pack
+from backend.danmu_recorder import FrameRecorder, FrameReplayer, read_frames, read_header
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+
+def frame(i):
+    command = {"cmd": "ENTRY_EFFECT", "data": {"uid": i, "copy_writing": f"欢迎 <%u{i}%> 进入直播间"}}
+    return pack(OP_COMMAND, json.dumps(command, ensure_ascii=False), proto_ver=PROTO_JSON)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, compress):
+    recorder = FrameRecorder.for_room(str(tmp_path), 42, compress)
+    frames = [frame(i) for i in range(100)]
+    for data in frames:
+        recorder.write(data)
+    recorder.close()
+    assert recorder.path.endswith(".bldr.gz" if compress else ".bldr")
+    assert read_header(recorder.path)[0] == 42
+    recorded = list(read_frames(recorder.path))
+    assert [data for _, data in recorded] == frames
+    times = [ts for ts, _ in recorded]
+    assert times == sorted(times)
+    assert (recorder.frames, recorder.bytes, recorder.dropped) == (100, sum(map(len, frames)), 0)
+
+
+def test_write_does_not_touch_file(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / "a.bldr"), flush_interval=60)
+    calls = []
+    real_write = recorder.file.write
+    recorder.file.write = lambda data: (calls.append(threading.current_thread()), real_write(data))[1]
+    for i in range(10):
+        recorder.write(frame(i))
+    # 写入线程在间隔到达或 close 之前不写文件，write 只入队
+    assert calls == [] and len(recorder.queue) == 10
+    recorder.close()
+    assert calls and all(thread is recorder.thread for thread in calls)
+    assert len(list(read_frames(recorder.path))) == 10
+
+
+def test_queue_drops_oldest_when_full(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / "a.bldr"), flush_interval=60, max_queue=5)
+    for i in range(8):
+        recorder.write(frame(i))
+    recorder.close()
+    assert recorder.dropped == 3
+    assert [data for _, data in read_frames(recorder.path)] == [frame(i) for i in range(3, 8)]
+
+
+def test_truncated_tail_ignored(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / "a.bldr"))
+    for i in range(3):
+        recorder.write(frame(i))
+    recorder.close()
+    with open(recorder.path, 'ab') as f:
+        f.write(b'\x00' * 5)
+    assert len(list(read_frames(recorder.path))) == 3
+
+
+def test_replay(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / "a.bldr"), room_id=7)
+    for i in range(20):
+        recorder.write(frame(i))
+    recorder.close()
+
+    service = DanmuService(BilibiliApi(), SessionState())
+    events = []
+    service.set_callback(events.append)
+    stats = asyncio.run(FrameReplayer(service, recorder.path, speed=None).run())
+    assert stats["frames"] == 20
+    assert [(e["uid"], e["room_id"]) for e in events] == [(i, 7) for i in range(20)]
+    # 回放结束后恢复头像获取
+    assert service.face_fetch_enabled
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import random
+import time
+
+import brotli
+import pytest
+
+from backend.bilibili_api import BilibiliApi
+from backend import danmu_protocol
+from backend.danmu_protocol import OP_COMMAND, PROTO_BROTLI, PROTO_JSON, pack
+from backend.services.danmu_service import DECODE_INLINE, DECODE_THREAD, DanmuAuthError, DanmuRoom, DanmuService
+from backend.state import SessionState
+
+
+def make_service():
+    service = DanmuService(BilibiliApi(), SessionState())
+    service.face_fetch_enabled = False
+    events = []
+    service.set_callback(events.append)
+    return service, events
+
+
+def entry_effect(uid, uname):
+    return {"cmd": "ENTRY_EFFECT", "data": {"uid": uid, "copy_writing": f"欢迎 <%{uname}%> 进入直播间"}}
+
+
+def run(service, commands, room_id=1):
+    async def handle():
+        for command in commands:
+            await service._handle_command(command, room_id)
+    asyncio.run(handle())
+
+
+def test_anonymous_entry_effect_dedup():
+    # 未登录时 uid 为 0，用文案中的名字去重
+    service, events = make_service()
+    run(service, [entry_effect(0, "abc"), entry_effect(0, "abc"), entry_effect(0, "xyz")])
+    assert [e["msg"] for e in events] == ["欢迎 abc 进入直播间", "欢迎 xyz 进入直播间"]
+    assert all("_who" not in e for e in events)
+
+
+def test_entry_effect_dedup_by_uid():
+    service, events = make_service()
+    run(service, [entry_effect(100, "abc"), entry_effect(100, "abc")])
+    run(service, [entry_effect(100, "abc")], room_id=2)
+    assert [(e["uid"], e["room_id"]) for e in events] == [(100, 1), (100, 2)]
+
+
+def send_gift(uid, num=1):
+    return {"cmd": "SEND_GIFT", "data": {"uid": uid, "uname": "a", "giftName": "小心心", "num": num}}
+
+
+def test_gift_flush_loop_runs_without_rooms():
+    service, events = make_service()
+    service.gift_aggregator.window = 0.05
+    service.gift_flush_interval = 0.01
+
+    async def handle():
+        for _ in range(3):
+            await service._handle_command(send_gift(1), 1)
+        assert service.gift_flush_task and not service.gift_flush_task.done()
+        await asyncio.sleep(0.2)
+        # 全部连击结束后循环退出
+        assert service.gift_flush_task.done()
+    asyncio.run(handle())
+    assert [(e["num"], e["final"]) for e in events] == [(1, False), (3, True)]
+
+
+def test_flush_gifts_ends_pending_combos():
+    service, events = make_service()
+
+    async def handle():
+        await service._handle_command(send_gift(1, 2), 1)
+        await service._handle_command(send_gift(2, 5), 1)
+        service.flush_gifts()
+    asyncio.run(handle())
+    finals = [(e["uid"], e["num"]) for e in events if e["final"]]
+    assert sorted(finals) == [(1, 2), (2, 5)]
+    assert service.gift_aggregator.pending == 0 and service.gift_flush_task is None
+
+
+def merged_frame(start, n):
+    """模拟礼物连击时合并的大帧：brotli 压缩的多个命令包，夹杂没有处理函数的命令"""
+    packets = []
+    for i in range(start, start + n):
+        if i % 3 == 0:
+            command = {"cmd": "WATCHED_CHANGE", "data": {"num": i}}
+        elif i % 3 == 1:
+            command = entry_effect(i, f"u{i}")
+        else:
+            command = {"cmd": "UNKNOWN_CMD", "data": {"i": i}}
+        packets.append(pack(OP_COMMAND, json.dumps(command, ensure_ascii=False), proto_ver=PROTO_JSON))
+    return pack(OP_COMMAND, brotli.compress(b''.join(packets)), proto_ver=PROTO_BROTLI)
+
+
+def test_thread_offload_matches_inline():
+    frames = [merged_frame(i * 500, 500) for i in range(4)]
+    results = {}
+    for mode in (DECODE_INLINE, DECODE_THREAD):
+        service, events = make_service()
+        service.set_decode_offload(mode, threshold=0)
+        service.yield_every = 7
+
+        async def decode():
+            for frame in frames:
+                await service._decode_packet(frame, 1)
+        try:
+            asyncio.run(decode())
+        finally:
+            service.set_decode_offload(DECODE_INLINE)
+        results[mode] = events
+        offloaded = service.decode_stats['offloaded_frames']
+        assert offloaded == (len(frames) if mode == DECODE_THREAD else 0)
+        assert service.decode_stats['skipped'] == 666
+    assert [e["uid"] for e in results[DECODE_INLINE]] == list(range(1, 2000, 3))
+    assert results[DECODE_THREAD] == results[DECODE_INLINE]
+
+
+def test_registered_handler_receives_suffixed_commands():
+    service, events = make_service()
+    seen = []
+
+    def on_custom(command):
+        seen.append(command["cmd"])
+        return {"type": "system", "msg": command["data"]["text"]}
+    service.register_handler("CUSTOM_CMD", on_custom)
+    run(service, [{"cmd": "CUSTOM_CMD", "data": {"text": "a"}},
+                  {"cmd": "CUSTOM_CMD:4:0:2", "data": {"text": "b"}},
+                  {"cmd": "OTHER_CMD", "data": {"text": "c"}}])
+    assert seen == ["CUSTOM_CMD", "CUSTOM_CMD:4:0:2"]
+    assert [(e["msg"], e["room_id"]) for e in events] == [("a", 1), ("b", 1)]
+
+
+def test_register_and_unregister_invalidate_dispatch_cache():
+    service, events = make_service()
+    run(service, [{"cmd": "CUSTOM_CMD:1", "data": {}}])
+    assert service._get_handler("CUSTOM_CMD:1") is None
+
+    service.register_handler("CUSTOM_CMD", lambda command: {"type": "system", "msg": "first"})
+    service.register_handler("CUSTOM_CMD:2", lambda command: {"type": "system", "msg": "second"})
+    run(service, [{"cmd": "CUSTOM_CMD:1", "data": {}}])
+    # 注册时同样去掉 :suffix，后注册的覆盖先注册的
+    assert [e["msg"] for e in events] == ["second"]
+
+    service.unregister_handler("CUSTOM_CMD")
+    run(service, [{"cmd": "CUSTOM_CMD:1", "data": {}}])
+    assert len(events) == 1
+
+
+def test_handler_returning_none_emits_nothing():
+    service, events = make_service()
+    service.register_handler("ENTRY_EFFECT", lambda command: None)
+    run(service, [entry_effect(1, "abc"), {"cmd": "UNKNOWN_CMD"}])
+    assert events == []
+
+
+def test_unhandled_commands_skip_json_parsing(monkeypatch):
+    service, events = make_service()
+    parsed = []
+    loads = danmu_protocol.loads
+    monkeypatch.setattr(danmu_protocol, "loads", lambda body: parsed.append(bytes(body)) or loads(body))
+    bodies = [
+        # 没有处理函数：只预读 cmd，包体不是合法 JSON 也不会出错
+        b'{"cmd":"UNKNOWN_CMD","data":{not json',
+        b'{"cmd":"STOP_LIVE_ROOM_LIST","data":{"room_id_list":[1,2,3]}}',
+        json.dumps(entry_effect(1, "abc"), ensure_ascii=False).encode(),
+        # cmd 不在开头时无法预读，按原流程解析
+        json.dumps({"data": {"uid": 2, "copy_writing": "欢迎 <%xyz%> 进入直播间"}, "cmd": "ENTRY_EFFECT"},
+                   ensure_ascii=False).encode(),
+    ]
+    frame = b''.join(pack(OP_COMMAND, body, proto_ver=PROTO_JSON) for body in bodies)
+    asyncio.run(service._decode_packet(frame, 1))
+    assert parsed == bodies[2:]
+    assert [e["uid"] for e in events] == [1, 2]
+    stats = service.decode_stats
+    assert (stats["skipped"], stats["parsed"]) == (2, 2)
+    assert stats["skipped_bytes"] == len(bodies[0]) + len(bodies[1])
+
+
+class FakeWs:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def host(name, delay=0.0, error=None):
+    return {"host": name, "wss_port": 443, "ws_port": 2244, "delay": delay, "error": error}
+
+
+def race(service, hosts):
+    """用假的握手 (按 delay 等待后成功或抛出 error) 运行 _race_hosts，返回 (结果, 启动过的主机, 全部连接)"""
+    started = []
+    sockets = []
+
+    async def handshake(h, auth_data):
+        started.append(h["host"])
+        await asyncio.sleep(h["delay"])
+        if h["error"]:
+            raise h["error"]
+        ws = FakeWs(h["host"])
+        sockets.append(ws)
+        return ws, h["host"]
+    service._handshake = handshake
+    return asyncio.run(service._race_hosts(hosts, {})), started, sockets
+
+
+def test_race_prefers_fastest_host():
+    service, _ = make_service()
+    service.race_stagger = 0.05
+    (ws, url), started, sockets = race(service, [host("slow", 1.0), host("fast", 0.01), host("unused")])
+    # 第一个主机超过 race_stagger 未完成时启动第二个，第二个先完成认证后不再启动第三个
+    assert url == "fast" and started == ["slow", "fast"]
+    assert [s.name for s in sockets] == ["fast"] and not ws.closed
+
+
+def test_race_starts_next_host_immediately_on_failure():
+    service, _ = make_service()
+    service.race_stagger = 10
+    (ws, url), started, _ = race(service, [host("a", error=ConnectionError("refused")), host("b")])
+    assert url == "b" and started == ["a", "b"]
+
+
+def test_race_raises_auth_error_first():
+    service, _ = make_service()
+    service.race_stagger = 0
+    hosts = [host("a", 0.01, DanmuAuthError("bad token")), host("b", 0.02, ConnectionError("refused"))]
+    with pytest.raises(DanmuAuthError):
+        race(service, hosts)
+
+
+def test_race_closes_simultaneous_winners():
+    service, _ = make_service()
+    service.race_stagger = 0
+    (ws, url), started, sockets = race(service, [host("a", 0.02), host("b", 0.02), host("c", 0.02)])
+    assert len(started) == 3
+    assert [s.closed for s in sockets].count(False) == 1 and not ws.closed
+
+
+def test_order_hosts_by_latency_then_unknown_then_failed():
+    service, _ = make_service()
+    hosts = [host(name) for name in ("failed", "unknown1", "slow", "fast", "unknown2")]
+    by_name = {h["host"]: h for h in hosts}
+    service._record_host(by_name["failed"])
+    service._record_host(by_name["slow"], 80.0)
+    service._record_host(by_name["fast"], 50.0)
+    assert [h["host"] for h in service._order_hosts(hosts)] == ["fast", "slow", "unknown1", "unknown2", "failed"]
+    # 失败次数多的主机降权 (50ms 的主机失败 9 次后按 95ms 排序)
+    for _ in range(9):
+        service._record_host(by_name["fast"])
+    assert [h["host"] for h in service._order_hosts(hosts)][:2] == ["slow", "fast"]
+    # 延迟为指数滑动平均
+    service._record_host(by_name["slow"], 100.0)
+    assert service.host_stats["failed:443"] == {"success": 0, "fail": 1, "latency_ms": 0.0}
+    assert service.host_stats["slow:443"]["latency_ms"] == pytest.approx(86.0)
+
+
+def test_backoff_delay_bounds_and_jitter():
+    service, _ = make_service()
+    service.reconnect_delay = 1
+    service.max_reconnect_delay = 30
+    room = DanmuRoom(1, reconnect_delay=1)
+    random.seed(0)
+    for attempt in range(1, 10):
+        room.reconnect_attempts = attempt
+        delay = min(30, 2 ** (attempt - 1))
+        samples = [service._backoff_delay(room) for _ in range(200)]
+        # 抖动范围 [delay / 2, delay]，不超过 max_reconnect_delay
+        assert all(delay / 2 <= d <= delay for d in samples)
+        assert max(samples) - min(samples) > delay / 4
+
+
+def test_first_reconnect_is_immediate_only_with_fresh_token():
+    service, _ = make_service()
+    room = DanmuRoom(1, reconnect_delay=1)
+    room.reconnect_attempts = 1
+    assert service._backoff_delay(room) >= 0.5
+    service.danmu_info_cache[1] = ({"token": "t"}, time.monotonic())
+    assert service._backoff_delay(room) == 0.0
+    # 之后的重连仍然退避
+    room.reconnect_attempts = 2
+    assert service._backoff_delay(room) >= 1.0
+    # token 过期后第一次重连也退避
+    room.reconnect_attempts = 1
+    service.danmu_info_cache[1] = ({"token": "t"}, time.monotonic() - service.danmu_info_ttl - 1)
+    assert service._backoff_delay(room) >= 0.5
+
+
+def test_reconnect_reuses_cached_token_until_auth_fails():
+    service, _ = make_service()
+    service.api.cookies["buvid3"] = "buvid3"
+    service.state.uid = 1
+    fetched = []
+    auth_errors = []
+
+    async def fetch_danmu_info(room_id):
+        fetched.append(room_id)
+        return {"token": f"token{len(fetched)}", "host_list": [host("a")]}
+
+    async def race_hosts(host_list, auth_data):
+        if auth_errors:
+            raise auth_errors.pop()
+        return FakeWs("a"), auth_data["key"]
+
+    async def idle(room):
+        await asyncio.sleep(3600)
+    service._fetch_danmu_info = fetch_danmu_info
+    service._race_hosts = race_hosts
+    service._heartbeat_loop = service._receive_loop = idle
+
+    async def scenario():
+        room = DanmuRoom(7)
+        room.running = True
+        service.rooms[7] = room
+        assert await service._connect_internal(room)
+        # 重连时复用缓存的 token，不再请求 getDanmuInfo
+        room.reconnect_attempts = 1
+        assert await service._connect_internal(room)
+        assert (fetched, room.ws_url) == ([7], "token1")
+        # 认证失败后丢弃缓存，下次重连重新获取
+        auth_errors.append(DanmuAuthError("bad token"))
+        room.reconnect_attempts = 1
+        assert not await service._connect_internal(room)
+        assert 7 not in service.danmu_info_cache
+        room.reconnect_task.cancel()
+        room.reconnect_attempts = 1
+        assert await service._connect_internal(room)
+        assert (fetched, room.ws_url) == ([7, 7], "token2")
+        await service._close_room(room)
+    asyncio.run(scenario())
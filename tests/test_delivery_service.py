@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from backend.services.delivery_service import (DeliveryService, POLICY_DROP_INTERACT_FIRST, POLICY_DROP_NEWEST,
+                                               POLICY_DROP_OLDEST)
+
+
+class FakeWindow:
+    """记录每次 send_to_frontend 推送的一帧"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def send_to_frontend(self, function_name, batch):
+        time.sleep(self.delay)
+        with self.lock:
+            self.frames.append(batch)
+
+    def events(self):
+        with self.lock:
+            return [e for frame in self.frames for e in frame]
+
+
+def event(event_type, i):
+    return {"type": event_type, "i": i}
+
+
+def queued(delivery):
+    """不启动推送线程，按推送顺序取出队列中的事件"""
+    return [delivery._pop_oldest()[2]["i"] for _ in range(delivery.size)]
+
+
+MIXED = [event("danmu", 0), event("interact", 1), event("gift", 2), event("danmu", 3), event("interact", 4),
+         event("danmu", 5), event("gift", 6)]
+
+
+@pytest.mark.parametrize("policy, kept, dropped", [
+    (POLICY_DROP_INTERACT_FIRST, [0, 2, 3, 5, 6], {"interact": 2}),
+    (POLICY_DROP_OLDEST, [2, 3, 4, 5, 6], {"danmu": 1, "interact": 1}),
+    (POLICY_DROP_NEWEST, [1, 2, 3, 4, 6], {"danmu": 2}),
+])
+def test_overflow_policies(policy, kept, dropped):
+    delivery = DeliveryService(FakeWindow(), max_queue=5, overflow_policy=policy)
+    for e in MIXED:
+        delivery.push(e)
+    assert delivery.size == 5
+    assert queued(delivery) == kept
+    assert delivery.get_stats()["dropped_by_type"] == dropped
+
+
+@pytest.mark.parametrize("policy", [POLICY_DROP_INTERACT_FIRST, POLICY_DROP_OLDEST, POLICY_DROP_NEWEST])
+def test_gifts_are_never_dropped(policy):
+    window = FakeWindow()
+    delivery = DeliveryService(window, interval=0.01, max_queue=10, overflow_policy=policy)
+    for i in range(50):
+        delivery.push(event("gift", i))
+    # 队列中全是礼物时礼物超出上限，非礼物事件丢弃
+    delivery.push(event("danmu", 50))
+    assert delivery.size == 50
+    assert delivery.get_stats()["dropped_by_type"] == {"danmu": 1}
+    delivery.start()
+    delivery.stop(timeout=5)
+    assert [e["i"] for e in window.events()] == list(range(50))
+    assert delivery.get_stats()["dropped_on_stop"] == 0
+
+
+def test_non_gift_events_stay_bounded_with_gifts_over_limit():
+    delivery = DeliveryService(FakeWindow(), max_queue=5)
+    for i in range(8):
+        delivery.push(event("gift", i))
+    for i in range(8, 12):
+        delivery.push(event("danmu", i))
+    assert queued(delivery) == list(range(8))
+
+
+def test_stop_reports_undelivered_events():
+    window = FakeWindow(delay=0.3)
+    delivery = DeliveryService(window, interval=0.0, max_batch=10)
+    delivery.start()
+    for i in range(100):
+        delivery.push(event("danmu", i))
+    time.sleep(0.05)
+    delivery.stop(timeout=0.1)
+    stats = delivery.get_stats()
+    assert stats["queue_depth"] == 0 and stats["dropped_on_stop"] > 0
+    # 等待超时时正在推送的一帧完成，之后不再推送
+    time.sleep(0.4)
+    assert len(window.events()) + stats["dropped_on_stop"] == 100
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_events_within_interval_coalesce_in_order():
+    window = FakeWindow()
+    delivery = DeliveryService(window, interval=0.2)
+    delivery.start()
+    try:
+        for e in MIXED:
+            delivery.push(e)
+        assert wait_for(lambda: window.frames)
+    finally:
+        delivery.stop()
+    # 一个时间窗口内的不同类型事件合并成一帧，保持入队顺序
+    assert [[e["i"] for e in frame] for frame in window.frames] == [list(range(len(MIXED)))]
+    stats = delivery.get_stats()
+    assert (stats["frames"], stats["events"], stats["max_frame_size"]) == (1, len(MIXED), len(MIXED))
+
+
+def test_first_event_waits_for_interval():
+    window = FakeWindow()
+    delivery = DeliveryService(window, interval=0.1)
+    delivery.start()
+    try:
+        start = time.monotonic()
+        delivery.push(event("danmu", 0))
+        assert wait_for(lambda: window.frames)
+        assert time.monotonic() - start >= 0.09
+    finally:
+        delivery.stop()
+
+
+def test_full_batches_are_sent_without_waiting():
+    window = FakeWindow()
+    delivery = DeliveryService(window, interval=10.0, max_batch=100)
+    for i in range(250):
+        delivery.push(event("danmu", i))
+    delivery.start()
+    try:
+        # 凑满 max_batch 的帧立即推送，剩余 50 条等待时间窗口
+        assert wait_for(lambda: len(window.frames) == 2)
+        time.sleep(0.05)
+        assert [len(frame) for frame in window.frames] == [100, 100]
+    finally:
+        delivery.stop()
+    # 停止时不再等待时间窗口，剩余事件推送完
+    assert [len(frame) for frame in window.frames] == [100, 100, 50]
+    assert [e["i"] for e in window.events()] == list(range(250))
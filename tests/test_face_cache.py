@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+from backend.bilibili_api import BilibiliApi
+from backend.face_cache import FaceCache
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+
+def test_lru_eviction():
+    cache = FaceCache(max_size=3)
+    for uid in (1, 2, 3):
+        cache.put(uid, f"face{uid}")
+    # 读取刷新最近使用顺序，淘汰最久未使用的 uid 2
+    assert cache.get(1) == "face1"
+    cache.put(4, "face4")
+    assert cache.get(2) is None
+    assert [cache.get(uid) for uid in (1, 3, 4)] == ["face1", "face3", "face4"]
+    stats = cache.get_stats()
+    assert (stats["size"], stats["evictions"], stats["learned"], stats["hits"], stats["misses"]) == (3, 1, 4, 4, 1)
+
+
+def test_ignores_empty_and_unchanged_faces():
+    cache = FaceCache()
+    cache.put(0, "face")
+    cache.put(1, "")
+    assert cache.get_stats()["size"] == 0 and not cache.dirty
+    cache.put(1, "face1")
+    cache.dirty = False
+    cache.put(1, "face1")
+    assert not cache.dirty and cache.stats["learned"] == 1
+    cache.put(1, "face1b", fetched=True)
+    assert cache.dirty and cache.get(1) == "face1b" and cache.stats["fetched"] == 1
+
+
+def test_should_fetch_respects_miss_ttl():
+    cache = FaceCache(miss_ttl=600)
+    cache.put(1, "face1")
+    assert not cache.should_fetch(0) and not cache.should_fetch(1)
+    assert cache.should_fetch(2)
+    cache.mark_missing(2)
+    assert not cache.should_fetch(2)
+    cache._misses[2] -= 601
+    assert cache.should_fetch(2)
+    # 之后学到头像时清除失败记录
+    cache.mark_missing(3)
+    cache.put(3, "face3")
+    assert 3 not in cache._misses
+
+
+def test_save_and_load_keep_recent_order(tmp_path):
+    path = str(tmp_path / "face_cache.json")
+    cache = FaceCache(path)
+    cache.save()  # 没有变化时不写文件
+    assert not (tmp_path / "face_cache.json").exists()
+    for uid in (1, 2, 3):
+        cache.put(uid, f"face{uid}")
+    cache.get(1)
+    cache.save()
+    assert not cache.dirty
+    with open(path, encoding='utf-8') as f:
+        assert list(json.load(f)) == ["2", "3", "1"]
+
+    # 加载时超出 max_size 的部分按最久未使用淘汰
+    loaded = FaceCache(path, max_size=2)
+    loaded.load()
+    assert (loaded.get(2), loaded.get(3), loaded.get(1)) == (None, "face3", "face1")
+
+
+def test_load_corrupt_file(tmp_path):
+    path = tmp_path / "face_cache.json"
+    path.write_text("{not json", encoding='utf-8')
+    cache = FaceCache(str(path))
+    cache.load()
+    assert cache.get_stats()["size"] == 0
+
+
+def test_service_fills_faces_and_batches_missing():
+    service = DanmuService(BilibiliApi(), SessionState())
+    service.face_batch_delay = 0.01
+    service.face_batch_size = 2
+    events = []
+    service.set_callback(events.append)
+    batches = []
+
+    async def fetch_faces(uids):
+        batches.append(uids)
+        return {uid: f"face{uid}" for uid in uids if uid != 13}
+    service._fetch_faces = fetch_faces
+
+    async def scenario():
+        learned = {"uid": 10, "face": "face10"}
+        service._fill_face(learned)
+        filled = {"uid": 10, "face": ""}
+        service._fill_face(filled)
+        assert filled["face"] == "face10"
+        for uid in (11, 12, 11, 13):
+            service._fill_face({"uid": uid, "face": ""})
+        await service.face_fetch_task
+    asyncio.run(scenario())
+    # 缺失的 uid 去重后按 face_batch_size 分批获取，获取到的推送 face 事件
+    assert batches == [[11, 12], [13]]
+    assert [(e["type"], e["uid"], e["face"]) for e in events] == [("face", 11, "face11"), ("face", 12, "face12")]
+    assert service.face_cache.get(12) == "face12"
+    assert not service.face_cache.should_fetch(13)
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import socket
+import time
+
+from backend import danmu_protocol
+from benchmarks.bench_danmu_throughput import LocalDanmuService
+from benchmarks.fake_danmu_server import CommandPool, FakeDanmuServer, parse_mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_parse_mix():
+    assert parse_mix("DANMU_MSG=20, SEND_GIFT=5,LIKE") == [("DANMU_MSG", 20.0), ("SEND_GIFT", 5.0), ("LIKE", 1.0)]
+
+
+def test_command_pool_packets_carry_send_time():
+    pool = CommandPool(parse_mix("DANMU_MSG=1,SEND_GIFT=1"), size=10)
+    packets = pool.next_packets(25, 123.5)
+    commands = [json.loads(bytes(body)) for packet in packets for _, body in danmu_protocol.iter_packets(packet)]
+    assert len(commands) == 25
+    assert {c["cmd"].partition(":")[0] for c in commands} == {"DANMU_MSG", "SEND_GIFT"}
+    assert all(c["_ts"] == 123.5 for c in commands)
+    # 模板循环使用
+    assert commands[10] == commands[0]
+
+
+async def receive(port, rate, token=None, duration=0.5):
+    server = FakeDanmuServer(rate=rate, tick=0.02, mix="SEND_GIFT=1,ENTRY_EFFECT=1,WATCHED_CHANGE=1", token=token)
+    await server.start(port=port)
+    service = LocalDanmuService(port)
+    service.max_reconnect_attempts = 0
+    service.gift_aggregator.window = 0
+    events = []
+    service.set_callback(events.append)
+    try:
+        connected = await service.start_room(1)
+        await asyncio.sleep(duration)
+        sent = server.sent_commands
+        await service.stop()
+    finally:
+        await server.stop()
+    return connected, sent, events
+
+
+def test_local_server_end_to_end():
+    start = time.monotonic()
+    connected, sent, events = asyncio.run(receive(free_port(), rate=1000))
+    assert connected
+    assert sent >= 200
+    types = {e["type"] for e in events}
+    assert {"gift", "interact", "system"} <= types
+    # 看过人数只记录到时间序列，约三分之一的命令为礼物或进场
+    received = [e for e in events if e["type"] in ("gift", "interact")]
+    assert 0 < len(received) <= sent
+    assert time.monotonic() - start < 5
+
+
+def test_local_server_rejects_wrong_token():
+    connected, sent, events = asyncio.run(receive(free_port(), rate=1000, token="other", duration=0.1))
+    assert not connected and sent == 0
+    assert not any(e["type"] in ("gift", "interact") for e in events)
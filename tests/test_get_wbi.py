@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import get_wbi
+from backend.get_wbi import MAX_KEY_TTL, WbiKeyCache
+
+BEIJING = timezone(timedelta(hours=8))
+IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+NAV = {"data": {"wbi_img": {"img_url": f"https://i0.hdslb.com/bfs/wbi/{IMG_KEY}.png",
+                            "sub_url": f"https://i0.hdslb.com/bfs/wbi/{SUB_KEY}.png"}}}
+
+
+def beijing(*args):
+    return datetime(*args, tzinfo=BEIJING).timestamp()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可设置的 time.time"""
+    class Clock:
+        now = 0.0
+    monkeypatch.setattr(time, "time", lambda: Clock.now)
+    return Clock
+
+
+class FakeNavSession:
+    def __init__(self, block=False):
+        self.requests = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+        if not block:
+            self.released.set()
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        self.started.set()
+        self.released.wait(5)
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return NAV
+
+
+@pytest.mark.parametrize("now, expected", [
+    (beijing(2026, 10, 18, 0, 0, 0), beijing(2026, 10, 19)),
+    (beijing(2026, 10, 18, 7, 59, 59), beijing(2026, 10, 19)),   # UTC 23:59:59 前一天
+    (beijing(2026, 10, 18, 8, 0, 0), beijing(2026, 10, 19)),     # UTC 0 点
+    (beijing(2026, 10, 18, 23, 59, 59), beijing(2026, 10, 19)),
+    (beijing(2026, 12, 31, 23, 0, 0), beijing(2027, 1, 1)),
+])
+def test_next_rotation_is_beijing_midnight(now, expected):
+    assert WbiKeyCache.next_rotation(now) == expected
+
+
+def test_key_expires_at_beijing_midnight(clock):
+    cache = WbiKeyCache()
+    clock.now = beijing(2026, 10, 18, 23, 50)
+    mixin_key = cache.set(IMG_KEY, SUB_KEY)
+    assert mixin_key == get_wbi.getMixinKey(IMG_KEY + SUB_KEY)
+    clock.now = beijing(2026, 10, 18, 23, 59, 59)
+    assert cache.get() == mixin_key
+    clock.now = beijing(2026, 10, 19)
+    assert cache.get() is None
+
+
+def test_key_ttl_is_capped(clock):
+    cache = WbiKeyCache()
+    clock.now = beijing(2026, 10, 18, 1, 0)
+    cache.set(IMG_KEY, SUB_KEY)
+    clock.now += MAX_KEY_TTL - 1
+    assert cache.get()
+    clock.now += 1
+    assert cache.get() is None
+
+
+def test_invalidate(clock):
+    cache = WbiKeyCache()
+    clock.now = beijing(2026, 10, 18, 12, 0)
+    cache.set(IMG_KEY, SUB_KEY)
+    cache.invalidate()
+    assert cache.get() is None
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_get_w_rid_and_wts_fetches_once_per_rotation(clock, monkeypatch):
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    session = FakeNavSession()
+    clock.now = beijing(2026, 10, 18, 20, 0)
+    for _ in range(10):
+        get_wbi.get_w_rid_and_wts({"id": 1}, session)
+    assert session.requests == 1
+    clock.now = beijing(2026, 10, 19, 0, 0, 1)
+    get_wbi.get_w_rid_and_wts({"id": 1}, session)
+    assert session.requests == 2
+
+
+def test_prime_from_nav(clock, monkeypatch):
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    clock.now = beijing(2026, 10, 18, 20, 0)
+    get_wbi.prime_from_nav(NAV)
+    assert get_wbi.key_cache.get() == get_wbi.getMixinKey(IMG_KEY + SUB_KEY)
+    # 格式不对时忽略
+    get_wbi.prime_from_nav({"code": -101})
+
+
+def test_sign_matches_documented_example(clock):
+    clock.now = 1702204169
+    signed = get_wbi.encWbi({"foo": "114", "bar": "514", "zab": 1919810}, IMG_KEY, SUB_KEY)
+    assert signed["wts"] == "1702204169"
+    assert signed["w_rid"] == "8f6f2b5b3d485fe1886cec6a0be8c5d4"
+
+
+def test_sign_filters_characters(clock):
+    clock.now = 1702204169
+    signed = get_wbi.encWbi({"msg": "主播好!(*'▽'*)"}, IMG_KEY, SUB_KEY)
+    assert signed["msg"] == "主播好▽"
+
+
+def test_slow_fetch_does_not_block_set_or_invalidate(monkeypatch):
+    # 同步线程获取 key 的网络请求进行中时，事件循环调用 set / invalidate 不应等待
+    monkeypatch.setattr(get_wbi, "key_cache", WbiKeyCache())
+    session = FakeNavSession(block=True)
+    callers = [threading.Thread(target=get_wbi.get_w_rid_and_wts, args=({"id": 1}, session)) for _ in range(5)]
+    for thread in callers:
+        thread.start()
+    assert session.started.wait(5)
+
+    def loop_side():
+        get_wbi.key_cache.invalidate()
+        get_wbi.key_cache.set(IMG_KEY, SUB_KEY)
+    thread = threading.Thread(target=loop_side)
+    start = time.monotonic()
+    thread.start()
+    thread.join(1)
+    assert not thread.is_alive() and time.monotonic() - start < 0.5
+
+    session.released.set()
+    for thread in callers:
+        thread.join(5)
+    # 并发的同步调用只发起一次请求
+    assert session.requests == 1
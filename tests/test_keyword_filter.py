@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from backend.keyword_filter import AhoCorasick, KeywordFilter
+
+
+def naive_search(patterns, text):
+    text = text.lower()
+    return {i for i, p in enumerate(patterns) if p and p.lower() in text}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_naive_search(seed):
+    # 小字母表让模式串大量重叠 (互为前缀 / 后缀 / 子串)，覆盖失配指针和输出合并
+    rng = random.Random(seed)
+    alphabet = "abcAB弹幕"
+    patterns = list({''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(200)})
+    automaton = AhoCorasick(patterns)
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet + "xyz") for _ in range(rng.randint(0, 40)))
+        assert automaton.search(text) == naive_search(patterns, text), text
+
+
+def test_overlapping_and_case_insensitive():
+    patterns = ["he", "she", "his", "hers", "HE", ""]
+    automaton = AhoCorasick(patterns)
+    assert automaton.search("uSHErs") == {0, 1, 3, 4}
+    assert automaton.search("ahishers") == {0, 1, 2, 3, 4}
+    assert automaton.search("") == set()
+    assert len(automaton) == 6
+
+
+def test_keyword_filter_actions():
+    keyword_filter = KeywordFilter()
+    keyword_filter.set_rules({"hide": ["广告"], "highlight": ["主播"], "tags": {"问题": ["怎么", "为什么"]}})
+    assert keyword_filter.apply({"type": "danmu", "msg": "加群领广告"}) is None
+    event = keyword_filter.apply({"type": "danmu", "msg": "主播为什么怎么样"})
+    assert event["highlight"] is True
+    assert event["tags"] == ["问题"]
+    assert event["keywords"] == sorted(["主播", "为什么", "怎么"])
+    event = keyword_filter.apply({"type": "danmu", "msg": "你好"})
+    assert "keywords" not in event and "highlight" not in event
+    stats = keyword_filter.stats
+    assert (stats["checked"], stats["matched"], stats["hidden"], stats["highlighted"], stats["tagged"]) == (3, 2, 1, 1, 1)
+
+
+def test_no_rules_passes_through():
+    keyword_filter = KeywordFilter()
+    keyword_filter.set_rules({})
+    event = {"type": "danmu", "msg": "广告"}
+    assert keyword_filter.apply(event) is event
+
+
+@pytest.mark.parametrize("rules", [
+    None,
+    ["a"],
+    {"hide": "abc"},
+    {"hide": ["a", 1]},
+    {"highlight": [None]},
+    {"tags": ["a"]},
+    {"tags": {"t": "abc"}},
+    {"tags": {"t": [["a"]]}},
+    {"tags": {"": ["a"]}},
+])
+def test_malformed_rules_keep_current(rules):
+    keyword_filter = KeywordFilter()
+    keyword_filter.set_rules({"hide": ["广告"]})
+    with pytest.raises(ValueError):
+        keyword_filter.set_rules(rules)
+    assert keyword_filter.rules == {"hide": ["广告"]}
+    assert keyword_filter.apply({"msg": "看广告"}) is None
+    assert keyword_filter.stats["patterns"] == 1
@@ -0,0 +1,72 @@
+import sys
+import threading
+
+from backend.room_series import RoomSeries
+
+
+def test_sample_records_latest_values():
+    series = RoomSeries(capacity=10)
+    series.update("watched", 5)
+    series.sample(100, ts=1.0)
+    series.update("online_rank", 7)
+    series.sample(200, ts=2.0)
+    assert series.get_series() == {"ts": [1.0, 2.0], "popularity": [100, 200], "watched": [5, 5],
+                                   "online_rank": [0, 7]}
+
+
+def test_ring_buffer_keeps_latest_samples():
+    series = RoomSeries(capacity=4)
+    for i in range(10):
+        series.sample(i, ts=float(i))
+    result = series.get_series()
+    assert result["ts"] == [6.0, 7.0, 8.0, 9.0]
+    assert result["popularity"] == [6, 7, 8, 9]
+
+
+def test_downsampling():
+    series = RoomSeries(capacity=100)
+    for i in range(10):
+        series.sample(i, ts=float(i))
+    result = series.get_series(points=3)
+    # 等分为 [0..2] [3..5] [6..9]，时间取段内最后一个
+    assert result["ts"] == [2.0, 5.0, 9.0]
+    assert result["popularity"] == [1, 4, 8]
+    assert len(series.get_series(points=0)["ts"]) == 10
+
+
+def test_concurrent_sample_and_get_series():
+    # sample 在弹幕事件循环线程，get_series 在 pywebview 线程；各序列始终对齐
+    series = RoomSeries(capacity=64)
+    done = threading.Event()
+    errors = []
+
+    def produce():
+        for i in range(50000):
+            series.update("watched", i)
+            series.update("online_rank", i)
+            series.sample(i, ts=float(i))
+        done.set()
+
+    def consume():
+        try:
+            while not done.is_set():
+                result = series.get_series(points=0)
+                assert result["popularity"] == [int(t) for t in result["ts"]]
+                assert result["watched"] == result["popularity"] == result["online_rank"]
+                assert result["popularity"] == sorted(result["popularity"])
+        except AssertionError as e:
+            errors.append(e)
+            done.set()
+
+    # 频繁切换线程，让读取落在写入采样点的中途
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
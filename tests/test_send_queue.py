@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.send_queue import CODE_RATE_LIMITED, DanmuSendQueue, TokenBucket
+
+
+def acquire_times(bucket, n):
+    async def acquire():
+        start = time.monotonic()
+        times = []
+        for _ in range(n):
+            await bucket.acquire()
+            times.append(time.monotonic() - start)
+        return times
+    return asyncio.run(acquire())
+
+
+def test_token_bucket_burst_then_rate():
+    times = acquire_times(TokenBucket(rate=20, burst=3), 13)
+    # 前 burst 个立即获得，之后每 1/rate 秒一个
+    assert times[2] < 0.02
+    assert 0.45 <= times[-1] < 0.75
+
+
+def test_token_bucket_drain():
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.drain()
+    times = acquire_times(bucket, 1)
+    assert 0.09 <= times[0] < 0.3
+
+
+class FakeDanmuService:
+    """按预设的返回码依次返回发送结果，记录发送的弹幕和推送的事件"""
+
+    def __init__(self, codes=()):
+        self.codes = list(codes)
+        self.sent = []
+        self.events = []
+        self.lock = threading.Lock()
+
+    def send_danmu(self, msg, room_id):
+        with self.lock:
+            self.sent.append((msg, room_id))
+            code = self.codes.pop(0) if self.codes else 0
+        return {"code": code, "msg": "频率过高" if code == CODE_RATE_LIMITED else ""}
+
+    def _emit(self, event):
+        with self.lock:
+            self.events.append(event)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+
+    async def cancel_tasks():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_retries_rate_limited_sends(loop):
+    service = FakeDanmuService([CODE_RATE_LIMITED, CODE_RATE_LIMITED])
+    queue = DanmuSendQueue(service, loop, rate=100, burst=1, retry_delay=0.01)
+    result = queue.submit("hi", 1, wait=True)
+    assert (result["code"], result["attempts"], result["ticket"]) == (0, 3, 1)
+    assert service.sent == [("hi", 1)] * 3
+    stats = queue.get_stats()
+    assert (stats["sent"], stats["retries"], stats["rate_limited"], stats["queue_depth"]) == (1, 2, 2, 0)
+    assert service.events[-1]["type"] == "send_result" and service.events[-1]["attempts"] == 3
+
+
+def test_gives_up_after_max_retries(loop):
+    service = FakeDanmuService([CODE_RATE_LIMITED] * 10)
+    queue = DanmuSendQueue(service, loop, rate=100, burst=1, max_retries=2, retry_delay=0.01)
+    result = queue.submit("hi", 1, wait=True)
+    assert (result["code"], result["attempts"]) == (CODE_RATE_LIMITED, 3)
+    assert queue.get_stats()["failed"] == 1
+
+
+def test_sends_in_order_at_rate(loop):
+    service = FakeDanmuService()
+    queue = DanmuSendQueue(service, loop, rate=20, burst=1)
+    start = time.monotonic()
+    tickets = [queue.submit(f"m{i}", 1)["data"]["ticket"] for i in range(6)]
+    deadline = time.monotonic() + 5
+    while len(service.events) < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    assert [msg for msg, _ in service.sent] == [f"m{i}" for i in range(6)]
+    assert [e["ticket"] for e in service.events] == tickets
+    assert 0.2 <= elapsed < 1.0
+
+
+def test_rejects_when_full(loop):
+    service = FakeDanmuService()
+    queue = DanmuSendQueue(service, loop, rate=0.5, burst=1, max_queue=3)
+    results = [queue.submit(f"m{i}", 1) for i in range(5)]
+    assert [r["code"] for r in results] == [0, 0, 0, -1, -1]
+    assert [r["data"]["queue_depth"] for r in results[:3]] == [1, 2, 3]
+    assert queue.get_stats()["rejected"] == 2
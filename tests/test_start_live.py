@@ -0,0 +1,100 @@
+import threading
+import time
+
+from backend.bilibili_api import BilibiliApi
+
+OFFSET = 100.0  # 服务器时间比本地快 100 秒
+
+
+class FakeLiveApi(BilibiliApi):
+    """替换 _req，按接口返回固定结果，记录请求的接口"""
+
+    def __init__(self, fail=()):
+        super().__init__()
+        self.fail = set(fail)
+        self.calls = []
+        self.calls_lock = threading.Lock()
+        self.version_gate = threading.Event()  # 清除后版本信息请求阻塞到再次 set
+        self.version_gate.set()
+
+    def _req(self, method, url, params=None, data=None):
+        endpoint = url.rsplit('/', 1)[1]
+        with self.calls_lock:
+            self.calls.append(endpoint)
+        if endpoint in self.fail:
+            return False, {"code": -1, "msg": "timeout"}
+        if endpoint == "now":
+            return True, {"code": 0, "data": {"now": int(time.time() + OFFSET)}}
+        if endpoint == "getHomePageLiveVersion":
+            self.version_gate.wait(5)
+            return True, {"code": 0, "data": {"build": 9000, "curr_version": "7.0.0"}}
+        return True, {"code": 0, "data": dict(data or {})}
+
+
+def test_cold_start_then_single_post():
+    api = FakeLiveApi()
+    success, res = api.start_live(1, 2, "csrf")
+    assert success and api.calls == ["now", "getHomePageLiveVersion", "startLive"]
+    assert (res["data"]["build"], res["data"]["version"]) == (9000, "7.0.0")
+    assert abs(res["data"]["ts"] - (time.time() + OFFSET)) <= 2
+    assert "sign" in res["data"]
+
+    api.calls.clear()
+    success, res = api.start_live(1, 2, "csrf")
+    assert success and api.calls == ["startLive"]
+    assert abs(res["data"]["ts"] - (time.time() + OFFSET)) <= 2
+
+
+def test_prewarm_makes_start_a_single_post():
+    api = FakeLiveApi()
+    version, err = api.prewarm_live()
+    assert version == (9000, "7.0.0") and err is None
+    api.calls.clear()
+    success, _ = api.start_live(1, 2, "csrf")
+    assert success and api.calls == ["startLive"]
+
+
+def test_stale_version_refreshes_in_background():
+    api = FakeLiveApi()
+    api.prewarm_live()
+    api.calls.clear()
+    # 超过有效期一半：开播不等待 (后台刷新阻塞时也能完成)，使用旧的版本信息
+    api.version_fetched_at -= api.version_ttl * 0.6
+    api.version_gate.clear()
+    success, _ = api.start_live(1, 2, "csrf")
+    assert success and "startLive" in api.calls and api.version_refreshing
+    api.version_gate.set()
+    deadline = time.monotonic() + 5
+    while (api.version_refreshing or "getHomePageLiveVersion" not in api.calls) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(api.calls) == ["getHomePageLiveVersion", "startLive"]
+    assert time.monotonic() - api.version_fetched_at < 5
+
+    # 超过有效期：同步获取后开播
+    api.calls.clear()
+    api.version_fetched_at -= api.version_ttl
+    api.start_live(1, 2, "csrf")
+    assert api.calls == ["getHomePageLiveVersion", "startLive"]
+
+
+def test_wall_clock_jump_reestimates_offset():
+    api = FakeLiveApi()
+    api.prewarm_live()
+    api.calls.clear()
+    wall, mono = api.clock_estimated_at
+    api.clock_estimated_at = (wall - 60, mono)
+    api.start_live(1, 2, "csrf")
+    assert api.calls == ["now", "startLive"]
+
+
+def test_prewarm_failure_does_not_block_start():
+    api = FakeLiveApi(fail={"now"})
+    version, err = api.prewarm_live()
+    assert version is None and err["msg"] == "timeout"
+    success, res = api.start_live(1, 2, "csrf")
+    assert not success and "startLive" not in api.calls
+
+    api.fail.clear()
+    api.calls.clear()
+    success, _ = api.start_live(1, 2, "csrf")
+    assert success and api.calls == ["now", "getHomePageLiveVersion", "startLive"]